@@ -16,12 +16,34 @@ Made with love by ZcraftElite :3
 
 import os
 import logging
+import functools
 from dotenv import load_dotenv
 from pathlib import Path
-from PIL import Image, ImageOps
-from flask import Flask, render_template, jsonify, request, make_response, send_file, send_from_directory, url_for, redirect, session
+from flask import Flask, render_template, jsonify, request, make_response, url_for, redirect, session, abort
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-import json, random, requests, secrets
+import json, random, requests, secrets, hashlib, gzip, mimetypes, math
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from artindex import ArtIndex
+from avatars import AVATAR_NEGATIVE_TTL, AVATAR_TTL, DISCORD_API_BASE, DISCORD_API_CLIENT, DISCORD_CDN_BASE, DISCORD_CDN_CLIENT, LOOKUP_CONCURRENCY, AvatarLookupError, AvatarMirror, AvatarPrefetch, DiscordAvatarCache, lookup_discord_avatar, valid_discord_id
+from artquery import ArtQueryIndex, build_facets
+from artsearch import ArtSearchIndex
+from catalog import Catalog
+from storage import open_storage
+from changefeed import ChangeFeed
+from perceptual import NEAR_DUPLICATE_DISTANCE, build_tree, describe_pairs, near_duplicates
+from contentstore import items_by_file, shared_files, staged_upload, store_upload
+from jobqueue import JobQueue
+from sprites import build_atlas
+from offload import DEFAULT_ACCEL_PREFIX, FileOffload
+from httpclient import UpstreamClient
+from pagecache import PAGE_CACHE_SIZE, PageCache
+from thumbnails import ImageProfile, ThumbnailWarmup, apply_records, asset_fingerprints, iter_images, pending_thumbnails, render_thumbnail, thumb_path
 
 app = Flask(__name__)
 
@@ -37,12 +59,53 @@ STATIC_IMAGES_DIR = BASE_DIR / "static" / "images"
 THUMBS_DIR = STATIC_IMAGES_DIR / "thumbs"
 THUMBS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Responsive derivatives for srcset (IMAGE_DERIVATIVE_WIDTHS / IMAGE_DERIVATIVE_FORMATS, see thumbnails.py)
+DERIVED_DIR = STATIC_IMAGES_DIR / "derived"
+DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+IMAGE_PROFILE = ImageProfile.from_env(DERIVED_DIR)
+
+# Thumbnail sprite atlases (homepage preview strip, see sprites.py)
+SPRITES_DIR = STATIC_IMAGES_DIR / "sprites"
+SPRITES_DIR.mkdir(parents=True, exist_ok=True)
+
 ARTISTS_DIR = STATIC_IMAGES_DIR / "artists"
 ARTISTS_DIR.mkdir(parents=True, exist_ok=True)
 
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp', 'svg'}
 
+# Short max-age so the several fetches per page share one copy; after that the ETag makes revalidation a 304
+JSON_DATABASE_CACHE_CONTROL = 'public, max-age=60, stale-while-revalidate=300'
+# Images requested with their current fingerprint (?v=, see image_url()) never change under that URL
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Static directories whose file names end in a version (sprite atlases, mirrored avatars)
+CONTENT_NAMED_STATIC_DIRS = ('images/sprites/', 'images/artists/discord/')
+
+# Let the front proxy send the files under static/images: 'off', 'nginx' (X-Accel-Redirect to
+# FILE_OFFLOAD_PREFIX, an internal location aliased to static/) or 'sendfile' (X-Sendfile), see offload.py
+FILE_OFFLOAD = FileOffload(
+    os.getenv('FILE_OFFLOAD', 'off'), BASE_DIR / "static",
+    os.getenv('FILE_OFFLOAD_PREFIX', DEFAULT_ACCEL_PREFIX)
+)
+
+ART_QUERY_DEFAULT_LIMIT = 60
+ART_QUERY_MAX_LIMIT = 200
+
 DISCORD_API_KEY = os.getenv('DISCORD_API_KEY')
+DISCORD_API_URL = os.getenv('DISCORD_API_URL', DISCORD_API_BASE)
+DISCORD_CDN_URL = os.getenv('DISCORD_CDN_URL', DISCORD_CDN_BASE)
+
+# Avatar lookups are cached per Discord user (see avatars.py); unknown users for the shorter negative TTL
+DISCORD_AVATARS = DiscordAvatarCache(
+    lambda discord_id: lookup_discord_avatar(discord_id, DISCORD_API_KEY, DISCORD_API_URL, DISCORD_CDN_URL),
+    ttl=int(os.getenv('DISCORD_AVATAR_TTL', str(AVATAR_TTL))),
+    negative_ttl=int(os.getenv('DISCORD_AVATAR_NEGATIVE_TTL', str(AVATAR_NEGATIVE_TTL)))
+)
+# Browsers reuse an avatar answer for a few minutes, so reopening the viewer doesn't ask again
+DISCORD_AVATAR_CACHE_CONTROL = 'private, max-age=300'
+# Local WebP copies of the avatars, served from our own origin (downloaded by a background job)
+DISCORD_AVATAR_MIRROR = AvatarMirror(ARTISTS_DIR / "discord")
+# Most users one batch avatar request may ask for
+DISCORD_AVATAR_BATCH_MAX = 100
 
 OIDC_AUTHORIZATION_ENDPOINT = os.getenv('OIDC_AUTHORIZATION_ENDPOINT')
 OIDC_TOKEN_ENDPOINT = os.getenv('OIDC_TOKEN_ENDPOINT')
@@ -51,77 +114,239 @@ OIDC_REDIRECT_URI = os.getenv('OIDC_REDIRECT_URI')
 OIDC_CLIENT_ID = os.getenv('OIDC_CLIENT_ID')
 OIDC_CLIENT_SECRET = os.getenv('OIDC_CLIENT_SECRET')
 VERIFY_SSL = False
+# Keep-alive connections to the OIDC provider, with timeouts and a circuit breaker (see httpclient.py)
+OIDC_CLIENT = UpstreamClient("oidc", verify=VERIFY_SSL)
+
+# ---- Catalog Caches ----
+# Milliseconds to batch back-to-back admin saves into one write (0 = write every save immediately)
+CATALOG_WRITE_COALESCE_MS = int(os.getenv('CATALOG_WRITE_COALESCE_MS', '0'))
+
+# 'json' (data/*.json) or 'sqlite' (CATALOG_DB, filled with `artmgr.py db-import`)
+CATALOG_BACKEND = os.getenv('CATALOG_BACKEND', 'json')
+CATALOG_DB = os.getenv('CATALOG_DB', str(BASE_DIR / "data" / "catalog.db"))
+
+ART_CATALOG = Catalog(
+    index_factory=ArtIndex,
+    coalesce=CATALOG_WRITE_COALESCE_MS / 1000,
+    storage=open_storage("art", BASE_DIR / "data" / "art.json", 4, CATALOG_BACKEND, CATALOG_DB)
+)
+CHARACTER_CATALOG = Catalog(
+    coalesce=CATALOG_WRITE_COALESCE_MS / 1000,
+    storage=open_storage("characters", BASE_DIR / "data" / "characters.json", 2, CATALOG_BACKEND, CATALOG_DB)
+)
+
+ART_FEED = ChangeFeed(BASE_DIR / "data" / "art.changes.json")
+ART_CATALOG.add_listener(ART_FEED.sync)
+
+ART_SEARCH = ArtSearchIndex()
+ART_CATALOG.add_listener(ART_SEARCH.sync)
 
 # ---- FUNCTIONS ----
 # --- IMAGE LOADER ---
 def load_images():
     """
     Loads the JSON data from the art.json file.
+
+    The list is cached per worker and shared between requests, so only mutate it
+    if you pass it straight back to `save_images()`.
     """
-    with open('data/art.json') as f:
-        return json.load(f)
+    return ART_CATALOG.get()
 
 # --- IMAGE SAVER ---
 def save_images(images):
-    """Saves the art list back to art.json."""
-    with open('data/art.json', 'w', encoding='utf-8') as f:
-        json.dump(images, f, indent=4, ensure_ascii=False)
+    """Saves the art list back to art.json and updates the cached copy."""
+    ART_CATALOG.save(images)
+    ART_CATALOG.derive("json-variants", build_json_variants)
 
 # --- CHARACTER LOADER ---
 def load_characters():
-    """Loads the JSON data from characters.json."""
-    with open('data/characters.json', encoding='utf-8') as f:
-        return json.load(f)
+    """Loads the JSON data from characters.json (cached, see `load_images()`)."""
+    return CHARACTER_CATALOG.get()
 
 # --- CHARACTER SAVER ---
 def save_characters(chars):
-    """Saves the character list back to characters.json."""
-    with open('data/characters.json', 'w', encoding='utf-8') as f:
-        json.dump(chars, f, indent=2, ensure_ascii=False)
+    """Saves the character list back to characters.json and updates the cached copy."""
+    CHARACTER_CATALOG.save(chars)
+    CHARACTER_CATALOG.derive("json-variants", build_json_variants)
 
 # --- ALLOWED FILE CHECK ---
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
 
-# --- FIND ENTRY BY ID (searches top-level and nested alternates) ---
-def find_by_id(art_list, target_id):
+# --- CATALOG TRANSACTION DECORATOR ---
+def catalog_transaction(catalog):
     """
-    Returns (parent_entry, alt_entry_or_None).
-    Accepts:
-    - An integer or plain integer string  → top-level entry
-    - 'NNNNN-001' composite string        → alternate '001' under parent NNNNN
-    Returns (None, None) if not found.
+    Runs a view inside `catalog.transaction()`, so its load → modify → save cycle
+    can't interleave with saves from other threads, workers or artmgr.
     """
-    target_str = str(target_id)
-    if '-' in target_str:
-        parts = target_str.rsplit('-', 1)
-        try:
-            parent_int = int(parts[0])
-            alt_sub    = parts[1]          # e.g. "001"
-        except ValueError:
-            return None, None
-        for entry in art_list:
-            if entry.get("id") == parent_int:
-                for alt in entry.get("alternates", []):
-                    if str(alt.get("id")) == alt_sub:
-                        return entry, alt
-        return None, None
-    # Plain integer → top-level
-    try:
-        target_int = int(target_str)
-    except ValueError:
-        return None, None
-    for entry in art_list:
-        if entry.get("id") == target_int:
-            return entry, None
-    return None, None
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with catalog.transaction():
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- ART ID INDEX ---
+def load_art_index():
+    """
+    Returns the `ArtIndex` for the cached art list.
+
+    Lookups (`find`, `get`) are constant time; add and remove entries through the
+    index (`add`, `add_alternate`, `remove`) and then pass `index.art_list` to
+    `save_images()` so the list and the index stay in sync.
+    """
+    return ART_CATALOG.get_index()
+
+# --- ART QUERY INDEX ---
+def load_art_query_index():
+    """Returns the `ArtQueryIndex` for the current art list (rebuilt only when the catalog changes)."""
+    return ART_CATALOG.derive("query", ArtQueryIndex)
+
+# --- ART SEARCH INDEX ---
+def load_art_search():
+    """Returns the full-text `ArtSearchIndex`, kept in sync with the catalog through its listener."""
+    load_images()
+    return ART_SEARCH
+
+# --- FINGERPRINTED IMAGE URLS ---
+def image_url(item, kind='original', external=False):
+    """
+    Returns the static URL of an artwork's (or alternate's) image, with its fingerprint
+    as ?v= so the response can be cached as immutable. Also available in templates.
+
+    :param item: The art entry or alternate.
+    :param kind: 'original' or 'thumb'.
+    :param external: Return an absolute URL (for meta tags).
+    """
+    if kind == 'thumb':
+        filename = f"images/thumbs/{item['strippedFilename']}.webp"
+    else:
+        filename = f"images/{item['filename']}"
+    if item.get('fingerprint'):
+        return url_for('static', filename=filename, v=item['fingerprint'], _external=external)
+    return url_for('static', filename=filename, _external=external)
+
+app.add_template_global(image_url)
+
+def load_asset_fingerprints():
+    """Returns {static path: fingerprint} for every catalog image, thumbnail and derivative."""
+    return ART_CATALOG.derive("asset_fingerprints", asset_fingerprints)
+
+@app.after_request
+def cache_fingerprinted_assets(response):
+    """
+    Marks static images requested with their current fingerprint as immutable. A stale or
+    unknown ?v= keeps Flask's default no-cache, so an old URL never pins new contents.
+    """
+    if request.endpoint != 'static' or response.status_code not in (200, 206, 304):
+        return response
+    version = request.args.get('v')
+    filename = request.view_args.get('filename')
+    if filename.startswith(CONTENT_NAMED_STATIC_DIRS):
+        # Named after their contents ('<name>-<version>.webp'), so any existing file is immutable
+        current = Path(filename).stem.rpartition('-')[2]
+    else:
+        current = load_asset_fingerprints().get(filename)
+    if version and current == version:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+# --- STATIC FILES ---
+def send_static_file(filename):
+    """
+    Serves /static/<filename>. With FILE_OFFLOAD on, images are handed to the front proxy
+    (an empty response with X-Accel-Redirect / X-Sendfile) instead of being streamed by
+    the worker; everything else goes through Flask as usual.
+    """
+    if not FILE_OFFLOAD.enabled or not filename.startswith('images/'):
+        return app.send_static_file(filename)
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    response = make_response(b'')
+    response.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response.headers.update(FILE_OFFLOAD.headers(path))
+    # Same default as Flask's own static files; cache_fingerprinted_assets() may upgrade it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+app.view_functions['static'] = send_static_file
+
+# --- TRI-STATE QUERY PARAM ---
+def parse_tri_state(value):
+    """Maps 'true'/'false' to True/False; anything else (including missing) means "either"."""
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value == 'true':
+        return True
+    if value == 'false':
+        return False
+    return None
+
+# --- JSON ENCODER (FOR CACHED RESPONSES) ---
+def encode_json(obj):
+    """
+    Serializes `obj` to compact UTF-8 JSON.
+
+    :return: (body_bytes, etag) where the ETag is a hash of the body.
+    """
+    body = json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()[:32]
 
+# --- CONDITIONAL RESPONSE ---
+def conditional_response(body, etag, mimetype='application/json', cache_control='no-cache'):
+    """
+    Builds a response with a strong ETag, answering 304 when the client's copy matches.
+
+    :param body: The response bytes.
+    :param etag: Strong ETag for `body` (unquoted).
+    :param cache_control: Cache-Control header value.
+    """
+    response = make_response(body)
+    response.mimetype = mimetype
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+# --- PRECOMPRESSED JSON VARIANTS ---
+def build_json_variants(data):
+    """
+    Minifies `data` and precompresses it once, so the JSON databases are never encoded per request.
 
-def find_next_alt_id(parent_entry):
-    """Returns the next 3-digit zero-padded string alt ID unique within a parent."""
-    existing = [a.get("id") for a in parent_entry.get("alternates", [])]
-    max_num  = max((int(x) for x in existing if str(x).isdigit()), default=0)
-    return f"{max_num + 1:03d}"
+    :return: dict mapping a Content-Encoding ('identity', 'gzip' and 'br' if brotli is installed)
+        to (body_bytes, etag). Each encoding gets its own strong ETag.
+    """
+    body, etag = encode_json(data)
+    variants = {
+        "identity": (body, etag),
+        "gzip": (gzip.compress(body, compresslevel=9, mtime=0), f"{etag}-gz"),
+    }
+    if brotli is not None:
+        variants["br"] = (brotli.compress(body, quality=11), f"{etag}-br")
+    return variants
+
+# --- SEND JSON DATABASE ---
+def send_json_database(catalog):
+    """
+    Sends a catalog as minified JSON, picking the best precompressed variant the client accepts.
+
+    :param catalog: The `Catalog` to send.
+    """
+    variants = catalog.derive("json-variants", build_json_variants)
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    body, etag = variants[encoding]
+    response = conditional_response(body, etag, cache_control=JSON_DATABASE_CACHE_CONTROL)
+    if encoding != 'identity' and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
 # --- SET COOKIE ---
 def set_cookie(response, key, value, days=7):
@@ -146,53 +371,213 @@ def get_cookie(key):
 # --- CREATE THUMBNAIL ---
 def create_thumbnails(images, thumb_size=(280, 0), force=False):
     """
-    Generate thumbnails for each image in images list.
-    Saves thumbnails as WebP in THUMBS_DIR with the same base filename.
+    Generate thumbnails (and responsive derivatives) for each image in images list, in this process.
+    Saves thumbnails as WebP in THUMBS_DIR with the same base filename and records them
+    in the thumbnail manifest (pass the result to `record_thumbnails()` to update art.json).
     
     :param images: list of dicts from art.json with 'filename' keys
     :param thumb_size: tuple (width, height) for thumbnails. Height=0 keeps aspect ratio.
-    :param force: if True, regenerate even if thumbnail exists
-    """
-    created = []
-    for img in images:
-        src_file = Path("static/images") / img["filename"]
-        thumb_file = THUMBS_DIR / (Path(img["filename"]).stem + ".webp")
-
-        if not src_file.exists():
-            continue
-        if thumb_file.exists() and not force:
-            continue
-
-        with Image.open(src_file) as im:
-            im = ImageOps.exif_transpose(im)  # respect EXIF orientation
-            if thumb_size[1] == 0:
-                wpercent = thumb_size[0] / float(im.width)
-                hsize = int(float(im.height) * float(wpercent))
-                im = im.resize((thumb_size[0], hsize), Image.LANCZOS)
-            else:
-                im.thumbnail(thumb_size, Image.LANCZOS)
-            im.save(thumb_file, format="WEBP", quality=85)
-            created.append(thumb_file.name)
-    return created
+    :param force: if True, regenerate even if the thumbnail is up to date
+    :return: {thumbnail name: manifest record} for the given images
+    """
+    manifest = THUMBNAIL_WARMUP.manifest
+    profile = ImageProfile(thumb_size, DERIVED_DIR, IMAGE_PROFILE.widths, IMAGE_PROFILE.formats)
+    jobs, records = pending_thumbnails(images, STATIC_IMAGES_DIR, THUMBS_DIR, force, manifest, profile)
+    for job in jobs:
+        records[job[1].name] = render_thumbnail(*job)
+    manifest.update(records)
+    return records
+
+# --- RECORD THUMBNAIL RESULTS IN THE CATALOG ---
+def record_thumbnails(records):
+    """Copies the derivative sets, image info and fingerprints from the thumbnail manifest into art.json (only saves if something changed)."""
+    with ART_CATALOG.transaction():
+        index = load_art_index()
+        changed = apply_records(index.art_list, records)
+        for entry_id in changed:
+            index.touch(entry_id)
+        if changed:
+            save_images(index.art_list)
 
 # ---- THUMBNAIL AUTOGENERATION ----
-try:
-    images = load_images()
-    created_thumbs = create_thumbnails(images)
-    if created_thumbs:
-        print(f"Generated {len(created_thumbs)} thumbnails")
-except Exception as e:
-    logging.exception("Failed to generate thumbnails at startup")
+# Runs on a background thread so workers serve right away; the lock file in data/
+# makes sure only one worker (or `artmgr.py thumbs`) renders, fanned out over a process pool.
+# Set THUMBNAIL_WARMUP=off when thumbnails are built by `artmgr.py thumbs` during deploys.
+THUMBNAIL_WARMUP = ThumbnailWarmup(
+    STATIC_IMAGES_DIR, THUMBS_DIR, BASE_DIR / "data",
+    workers=int(os.getenv('THUMBNAIL_WORKERS', '0')) or None,
+    profile=IMAGE_PROFILE
+)
+
+# The pool's spawned children re-import the main script as __mp_main__; they must not warm up again
+if os.getenv('THUMBNAIL_WARMUP', 'background') != 'off' and __name__ != '__mp_main__':
+    THUMBNAIL_WARMUP.start(lambda: list(iter_images(load_images())), on_done=record_thumbnails)
+
+# ---- NEAR-DUPLICATE LOOKUPS ----
+def load_duplicate_index():
+    """Returns (BK-tree, {filename: hash}) over the thumbnails' perceptual hashes, rebuilt when the manifest changes."""
+    return THUMBNAIL_WARMUP.manifest.derive("near-duplicates", build_tree)
+
+def similar_images(filename, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    Returns the other catalog files that look like `filename`, closest first.
+
+    :return: [{"filename", "items", "distance"}] (empty if the file has no hash yet)
+    """
+    tree, hashes = load_duplicate_index()
+    if filename not in hashes:
+        return []
+    by_file = ART_CATALOG.derive("items_by_file", items_by_file)
+    return [
+        {"filename": other, "items": by_file[other], "distance": distance}
+        for distance, other in tree.search(hashes[filename], max_distance)
+        if other != filename and other in by_file
+    ]
+
+# ---- HOMEPAGE PREVIEW ATLAS ----
+# Fields the preview cards show; opening one fetches the full entry from /api/v1/art/<id>
+PREVIEW_TILE_FIELDS = ('id', 'title', 'artName', 'shapeshiftForm', 'artist', 'characters', 'isDiscEmoji')
+
+def build_preview_atlas(art_list):
+    """
+    Packs the thumbnails of every SFW, non-AI artwork into one sprite atlas and encodes
+    its coordinate map for /api/v1/art/preview-atlas (called while handling that request).
+
+    :return: (body_bytes, etag) of the JSON map (see `preview_atlas()`).
+    """
+    entries = {
+        entry['id']: entry for entry in art_list
+        if not entry.get('isNSFW') and not entry.get('isAI') and not entry.get('webLink') and entry.get('filename')
+    }
+    atlas = build_atlas(
+        [(entry_id, thumb_path(THUMBS_DIR, entry['filename'])) for entry_id, entry in entries.items()],
+        SPRITES_DIR
+    )
+    if atlas is None:
+        return encode_json({"image": None, "tiles": []})
+
+    tiles = []
+    for tile in atlas['tiles']:
+        entry = entries[tile['id']]
+        alternates = entry.get('alternates', [])
+        tiles.append({
+            **{field: entry.get(field) for field in PREVIEW_TILE_FIELDS},
+            "column": tile['column'],
+            "row": tile['row'],
+            "sfwAlternates": sum(1 for alt in alternates if not alt.get('isNSFW')),
+            "alternates": len(alternates),
+        })
+    return encode_json({
+        "image": url_for('static', filename=f"images/sprites/{atlas['file']}", v=atlas['key']),
+        "columns": atlas['columns'],
+        "rows": atlas['rows'],
+        "tileWidth": atlas['tileWidth'],
+        "tileHeight": atlas['tileHeight'],
+        "tiles": tiles,
+    })
+
+# ---- BACKGROUND JOBS ----
+# Uploads queue their thumbnail rendering here instead of blocking the request. The queue
+# is persisted in data/jobs.json and shared by every worker; each worker runs one job thread.
+JOB_QUEUE = JobQueue(BASE_DIR / "data" / "jobs.json")
+
+def thumbnail_job(image_id):
+    """
+    Job handler: renders the thumbnail and derivatives of one uploaded artwork or alternate
+    and records the derivatives and image info in art.json.
+
+    :param image_id: The artwork ID, or 'NNNNN-001' for an alternate.
+    """
+    parent, alt = load_art_index().find(image_id)
+    if not parent:
+        # Also hit when another worker's coalesced save hasn't landed yet; the queue retries
+        raise LookupError(f"Artwork {image_id} not found")
+    item = alt if alt is not None else parent
+    records = create_thumbnails([item], force=True)
+    record_thumbnails(records)
+    return {"thumbnails": sorted(records), "similar": similar_images(item["filename"])}
+
+JOB_QUEUE.register("thumbnails", thumbnail_job)
+
+def avatar_mirror_job(avatar):
+    """
+    Job handler: downloads a Discord avatar into the local mirror (see `AvatarMirror.mirror()`).
+
+    :param avatar: The avatar dict from the avatar cache.
+    """
+    return {"files": DISCORD_AVATAR_MIRROR.mirror(avatar)}
+
+JOB_QUEUE.register("avatar-mirror", avatar_mirror_job)
+
+def reuse_thumbnails(item, stored):
+    """
+    Copies the derivatives and image info onto a new entry or alternate whose upload
+    reused an existing file, if that file's thumbnail is already recorded.
+
+    :param item: The new entry or alternate (before it is saved).
+    :param stored: The `StoredUpload` the file came from.
+    :return: True if nothing is left to render.
+    """
+    return stored.duplicate and bool(apply_records([item], THUMBNAIL_WARMUP.manifest.records()))
+
+if __name__ != '__mp_main__':
+    JOB_QUEUE.start()
+
+def queue_avatar_mirror(avatar):
+    """
+    Returns an avatar's mirrored files, queueing their download if they don't exist yet
+    (see `AvatarMirror.ensure()`).
+    """
+    return DISCORD_AVATAR_MIRROR.ensure(avatar, lambda a: JOB_QUEUE.enqueue("avatar-mirror", avatar=a))
+
+def catalog_discord_ids():
+    """Returns the distinct Discord IDs of the catalog's artists."""
+    return list(ART_CATALOG.derive("discord-ids", lambda data: tuple(dict.fromkeys(
+        item["discordID"] for item in iter_images(data) if item.get("discordID")
+    ))))
+
+# Warms the avatar cache (and mirror) for every artist, again shortly before the entries expire.
+# Only one worker runs each pass (see AvatarPrefetch); the rest skip it and use its mirrored avatars.
+# Set DISCORD_AVATAR_PREFETCH=off to only look avatars up when they are asked for.
+DISCORD_AVATAR_PREFETCH = AvatarPrefetch(
+    DISCORD_AVATARS,
+    concurrency=int(os.getenv('DISCORD_AVATAR_PREFETCH_CONCURRENCY', str(LOOKUP_CONCURRENCY))),
+    on_avatar=queue_avatar_mirror,
+    state_dir=BASE_DIR / "data"
+)
+if DISCORD_API_KEY and os.getenv('DISCORD_AVATAR_PREFETCH', 'background') != 'off' and __name__ != '__mp_main__':
+    DISCORD_AVATAR_PREFETCH.start(catalog_discord_ids, interval=DISCORD_AVATARS.ttl * 0.9)
 
 # ---- OPENGRAPH METADATA ADAPTATION ----
-def adapt_meta_desc(meta, text):
+def meta_audience():
+    """Returns which flavour of OpenGraph text the client gets: 'discord' or 'default'."""
     ua = request.headers.get("User-Agent", "").lower()
-    if "discordbot" in ua:
+    return "discord" if "discordbot" in ua else "default"
+
+def adapt_meta_desc(meta, text):
+    if meta_audience() == "discord":
         meta["description"] += f"\n{text}"
     else:
         meta["description"] += f" ~ {text}"
     return meta
 
+# ---- RENDERED PAGE CACHE ----
+# Share and embed pages are hit by every unfurl bot whenever a link is posted; their HTML is
+# kept per image (and audience), and rendered again after any catalog change (see pagecache.py)
+PAGE_CACHE = PageCache(int(os.getenv('PAGE_CACHE_SIZE', str(PAGE_CACHE_SIZE))))
+
+def send_cached_page(key, version, render):
+    """
+    Sends a page from `PAGE_CACHE`, rendering it on a miss, with an ETag (304 when it matches).
+
+    :param key: What the page depends on besides the host (e.g. page name, image ID, audience).
+    :param version: The art catalog version the page is rendered from (read before the lookup).
+    :param render: Callable returning the page HTML.
+    """
+    # Absolute URLs in the meta tags depend on the host the page was requested through
+    body, etag = PAGE_CACHE.get_or_render((request.host_url, *key), version, render)
+    return conditional_response(body, etag, mimetype='text/html')
+
 
 # ---- ROUTES ----
 # --- HOMEPAGE ---
@@ -218,41 +603,47 @@ def favs():
 # --- SPECIFIC IMAGE VIEW PAGE ---
 @app.route('/view/<image_id>')
 def view_image(image_id):
-    images = load_images()
-
-    parent, alt = find_by_id(images, image_id)
+    load_images()
+    version = ART_CATALOG.version
+    parent, alt = load_art_index().find(image_id)
     if not parent:
         return render_template("404.html"), 404
 
     # Use the alternate's own fields (filename, flags) when present, fall back to parent
     display = alt if alt else parent
 
-    meta = {
-        "title": f"Z's World - Art - {parent.get('artName') or parent.get('shapeshiftForm', '')}",
-        "description": "",
-        "url": f"https://zcraftelite.net/view/{image_id}",
-        "image": url_for("static", filename=f"images/thumbs/{display['strippedFilename']}.webp", _external=True),
-        "redirect": url_for("library", id=image_id, _external=True)
-    }
+    def render():
+        meta = {
+            "title": f"Z's World - Art - {parent.get('artName') or parent.get('shapeshiftForm', '')}",
+            "description": "",
+            "url": f"https://zcraftelite.net/view/{image_id}",
+            "image": image_url(display, 'thumb', external=True),
+            "redirect": url_for("library", id=image_id, _external=True)
+        }
 
-    if display.get('isAI'):
-        meta["description"] = f"Generated by {parent.get('artist', 'Unknown')}"
-        meta = adapt_meta_desc(meta, f"Generated using {display.get('aiModel', 'Unknown Model')}")
-    else:
-        meta["description"] = f"Created by {parent.get('artist', 'Unknown')}"
+        if display.get('isAI'):
+            meta["description"] = f"Generated by {parent.get('artist', 'Unknown')}"
+            meta = adapt_meta_desc(meta, f"Generated using {display.get('aiModel', 'Unknown Model')}")
+        else:
+            meta["description"] = f"Created by {parent.get('artist', 'Unknown')}"
 
-    meta = adapt_meta_desc(meta, f"Created on {parent.get('creationDate', 'Unknown Date')}")
+        meta = adapt_meta_desc(meta, f"Created on {parent.get('creationDate', 'Unknown Date')}")
 
-    return render_template("share.html", meta=meta, image=display)
+        return render_template("share.html", meta=meta, image=display)
+
+    response = send_cached_page(("view", image_id, meta_audience()), version, render)
+    response.vary.add('User-Agent')
+    return response
 
 @app.route('/embed/<image_id>')
 def embed_image(image_id):
-    images = load_images()
-
-    parent, _ = find_by_id(images, image_id)
+    load_images()
+    version = ART_CATALOG.version
+    parent, _ = load_art_index().find(image_id)
     if not parent:
         return render_template("404.html"), 404
-    return render_template("embed.html", ID=image_id, image=parent)
+    return send_cached_page(("embed", image_id), version,
+                            lambda: render_template("embed.html", ID=image_id, image=parent))
 
 # --- LOGOUT ---
 @app.route('/logout', methods=['POST'])
@@ -266,18 +657,19 @@ def logout():
 def admin():
     if not session.get('username'):
         return redirect(url_for('index'))
-    images = load_images()
-    characters = load_characters()
+    index = load_art_index()
+    images = index.art_list
+    # Copy the character dicts so the template-only '_thumbSrc' never leaks into the cache
+    characters = [dict(c) for c in load_characters()]
     artist_files = sorted(
         f.name for f in ARTISTS_DIR.iterdir()
         if f.is_file() and allowed_file(f.name)
     )
     # Pre-compute featured art thumbnail paths for the character management grid
-    art_by_id = {img['id']: img for img in images}
     for char in characters:
-        featured = art_by_id.get(char.get('featuredArtId'))
+        featured = index.get(char.get('featuredArtId'))
         char['_thumbSrc'] = (
-            '/static/images/thumbs/' + featured['strippedFilename'] + '.webp'
+            image_url(featured, 'thumb')
             if featured and featured.get('strippedFilename') else None
         )
     return render_template('admin.html', images=images, artist_files=artist_files, characters=characters)
@@ -303,25 +695,30 @@ def admin_upload():
     if not allowed_file(file.filename):
         return jsonify({"error": "File type not allowed. Use PNG, JPG, GIF, WebP, BMP, or SVG."}), 400
 
-    filename = secure_filename(file.filename)
-    filepath = STATIC_IMAGES_DIR / filename
+    # Streamed to disk while hashing before the catalog lock is taken, so a large upload
+    # doesn't hold up other catalog writers
+    with staged_upload(file.stream, STATIC_IMAGES_DIR) as staged:
+        return add_uploaded_artwork(file, staged)
 
-    # Avoid overwriting existing files by appending a counter
-    if filepath.exists():
-        stem = Path(filename).stem
-        ext = Path(filename).suffix
-        counter = 1
-        while filepath.exists():
-            filename = f"{stem}_{counter}{ext}"
-            filepath = STATIC_IMAGES_DIR / filename
-            counter += 1
+@catalog_transaction(ART_CATALOG)
+def add_uploaded_artwork(file, staged):
+    """
+    Places a staged upload and adds it to the catalog as an artwork or alternate
+    (the form fields of the current upload request describe it).
 
-    file.save(str(filepath))
+    :param file: The uploaded `FileStorage` (for its name and content type).
+    :param staged: The `StagedUpload` holding its contents.
+    """
+    # Identical contents reuse the existing file (and its thumbnails),
+    # otherwise a counter is appended to the name so nothing gets overwritten
+    stored = store_upload(staged, STATIC_IMAGES_DIR, secure_filename(file.filename), THUMBNAIL_WARMUP.manifest)
+    filename = stored.filename
 
     stripped = Path(filename).stem
     filetype = file.content_type or f"image/{Path(filename).suffix.lstrip('.')}"
 
-    art_list = load_images()
+    index = load_art_index()
+    art_list = index.art_list
 
     is_ai = request.form.get('isAI') == 'true'
     is_nsfw = request.form.get('isNSFW') == 'true'
@@ -332,8 +729,7 @@ def admin_upload():
         ai_model = None
 
     # Only top-level IDs contribute to the global pool; alts use their own 3-digit counter
-    all_ids = [e["id"] for e in art_list]
-    new_id = max(all_ids, default=999999) + 1
+    new_id = index.next_id()
 
     # --- Upload as alternate of an existing artwork ---
     parent_id_raw = request.form.get('parentId', '').strip()
@@ -343,11 +739,11 @@ def admin_upload():
         except ValueError:
             return jsonify({"error": "parentId must be an integer"}), 400
 
-        parent_entry, _ = find_by_id(art_list, parent_id)
+        parent_entry = index.get(parent_id)
         if not parent_entry:
             return jsonify({"error": f"Parent artwork {parent_id} not found"}), 404
 
-        alt_id = find_next_alt_id(parent_entry)
+        alt_id = index.next_alt_id(parent_id)
         alt_entry = {
             "id": alt_id,
             "filename": filename,
@@ -361,18 +757,17 @@ def admin_upload():
             "aiModel": ai_model,
         }
 
-        if "alternates" not in parent_entry:
-            parent_entry["alternates"] = []
-        parent_entry["alternates"].append(alt_entry)
+        index.add_alternate(parent_entry, alt_entry)
+        reused = reuse_thumbnails(alt_entry, stored)
         save_images(art_list)
 
-        try:
-            create_thumbnails([{"filename": filename, "strippedFilename": stripped}], force=True)
-        except Exception as e:
-            logging.warning(f"Thumbnail generation failed for alternate: {e}")
-
         full_alt_id = f"{parent_id}-{alt_id}"
-        return jsonify({"success": True, "id": full_alt_id, "entry": alt_entry, "parentId": parent_id})
+        job_id = None if reused else JOB_QUEUE.enqueue("thumbnails", image_id=full_alt_id)["id"]
+
+        return jsonify({
+            "success": True, "id": full_alt_id, "entry": alt_entry, "parentId": parent_id,
+            "jobId": job_id, "duplicateOf": stored.filename if stored.duplicate else None
+        })
 
     # --- Standard top-level upload ---
     characters_raw = request.form.get('characters', '')
@@ -409,18 +804,20 @@ def admin_upload():
         "id": new_id
     }
 
-    art_list.append(new_entry)
+    index.add(new_entry)
+    reused = reuse_thumbnails(new_entry, stored)
     save_images(art_list)
 
-    try:
-        create_thumbnails([new_entry], force=True)
-    except Exception as e:
-        logging.warning(f"Thumbnail generation failed for uploaded file: {e}")
+    job_id = None if reused else JOB_QUEUE.enqueue("thumbnails", image_id=str(new_entry["id"]))["id"]
 
-    return jsonify({"success": True, "id": new_entry["id"], "entry": new_entry})
+    return jsonify({
+        "success": True, "id": new_entry["id"], "entry": new_entry,
+        "jobId": job_id, "duplicateOf": stored.filename if stored.duplicate else None
+    })
 
 # --- EDIT ARTWORK ---
 @app.route('/api/v1/admin/edit/<image_id>', methods=['POST'])
+@catalog_transaction(ART_CATALOG)
 def admin_edit(image_id):
     if not session.get('username'):
         return jsonify({"error": "Unauthorized"}), 401
@@ -429,8 +826,9 @@ def admin_edit(image_id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    art_list = load_images()
-    parent, alt = find_by_id(art_list, image_id)
+    index = load_art_index()
+    art_list = index.art_list
+    parent, alt = index.find(image_id)
 
     if not parent:
         return jsonify({"error": f"Artwork {image_id} not found"}), 404
@@ -443,6 +841,7 @@ def admin_edit(image_id):
                 alt[field] = data[field]
         if not alt.get('isAI'):
             alt['aiModel'] = None
+        index.touch(parent["id"])
         save_images(art_list)
         return jsonify({"success": True, "entry": alt})
 
@@ -465,6 +864,7 @@ def admin_edit(image_id):
     if target.get('recievalMethod') != 'Commission':
         target['recievalPrice'] = None
 
+    index.touch(target["id"])
     save_images(art_list)
     return jsonify({"success": True, "entry": target})
 
@@ -478,30 +878,27 @@ def admin_artist_files():
 
 
 @app.route('/api/v1/admin/delete/<image_id>', methods=['POST'])
+@catalog_transaction(ART_CATALOG)
 def admin_delete(image_id):
     if not session.get('username'):
         return jsonify({"error": "Unauthorized"}), 401
 
-    art_list = load_images()
-    parent, alt = find_by_id(art_list, image_id)
+    index = load_art_index()
+    parent, alt = index.find(image_id)
 
     if not parent:
         return jsonify({"error": f"Artwork {image_id} not found"}), 404
 
-    if alt is not None:
-        # Remove alternate from parent's alternates list (compare 3-digit string IDs)
-        alt_sub = str(alt.get("id"))
-        parent["alternates"] = [a for a in parent.get("alternates", []) if str(a["id"]) != alt_sub]
-    else:
-        # Remove top-level entry
-        art_list = [a for a in art_list if a["id"] != parent["id"]]
+    # Removes just the alternate when one was targeted, otherwise the whole entry
+    index.remove(parent, alt)
 
-    save_images(art_list)
+    save_images(index.art_list)
     return jsonify({"success": True})
 
 # ---- CHARACTER ADMIN ENDPOINTS ----
 
 @app.route('/api/v1/admin/character', methods=['POST'])
+@catalog_transaction(CHARACTER_CATALOG)
 def admin_character_create():
     if not session.get('username'):
         return jsonify({"error": "Unauthorized"}), 401
@@ -526,6 +923,7 @@ def admin_character_create():
 
 
 @app.route('/api/v1/admin/character/<char_id>', methods=['POST'])
+@catalog_transaction(CHARACTER_CATALOG)
 def admin_character_edit(char_id):
     if not session.get('username'):
         return jsonify({"error": "Unauthorized"}), 401
@@ -547,6 +945,7 @@ def admin_character_edit(char_id):
 
 
 @app.route('/api/v1/admin/character/<char_id>/delete', methods=['POST'])
+@catalog_transaction(CHARACTER_CATALOG)
 def admin_character_delete(char_id):
     if not session.get('username'):
         return jsonify({"error": "Unauthorized"}), 401
@@ -558,16 +957,371 @@ def admin_character_delete(char_id):
     save_characters(chars)
     return jsonify({"success": True})
 
+# --- CATALOG CACHE STATS ---
+@app.route('/api/v1/admin/cache-stats')
+def admin_cache_stats():
+    if not session.get('username'):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({
+        "art": ART_CATALOG.stats(),
+        "characters": CHARACTER_CATALOG.stats(),
+        "thumbnails": THUMBNAIL_WARMUP.status(),
+        "jobs": JOB_QUEUE.stats(),
+        "discordAvatars": DISCORD_AVATARS.stats(),
+        "discordAvatarPrefetch": DISCORD_AVATAR_PREFETCH.status(),
+        "pages": PAGE_CACHE.stats(),
+        "upstreams": {client.name: client.stats() for client in (DISCORD_API_CLIENT, DISCORD_CDN_CLIENT, OIDC_CLIENT)}
+    })
+
+# --- FILES SHARED BY SEVERAL ENTRIES ---
+@app.route('/api/v1/admin/shared-files')
+def admin_shared_files():
+    """
+    Lists the artworks and alternates that show the same image, either because they
+    point at the same file or because their files have identical contents.
+
+    Returns:
+    dict: {
+        "groups": [{"sha256": str, "size": int, "files": list, "items": list}],
+        "total": int
+    }
+    Items are artwork IDs or 'NNNNN-001' alternate IDs.
+
+    Raises:
+        401: Not logged in
+    """
+    if not session.get('username'):
+        return jsonify({"error": "Unauthorized"}), 401
+    groups = shared_files(load_images(), STATIC_IMAGES_DIR, THUMBNAIL_WARMUP.manifest)
+    return jsonify({"groups": groups, "total": len(groups)})
+
+# --- NEAR DUPLICATES ---
+@app.route('/api/v1/admin/near-duplicates')
+def admin_near_duplicates():
+    """
+    Lists images that look alike (re-exports, recompressions, small edits), found by
+    comparing perceptual hashes through a BK-tree.
+
+    Parameters:
+        distance (int): Maximum Hamming distance between the 64-bit hashes, 0-32 (default 10)
+        image (str): Only list the images similar to this artwork or alternate ID
+
+    Returns:
+    dict: {
+        "pairs": [{"distance": int, "images": [{"filename", "items"}, {"filename", "items"}], "sameArtwork": bool}],
+        "total": int
+    }
+    or, with image: {"filename": str, "similar": [{"filename", "items", "distance"}]}
+
+    Raises:
+        400: Invalid distance
+        401: Not logged in
+        404: Unknown image
+    """
+    if not session.get('username'):
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        max_distance = int(request.args.get('distance', NEAR_DUPLICATE_DISTANCE))
+    except ValueError:
+        return jsonify({"error": "distance must be an integer"}), 400
+    if not 0 <= max_distance <= 32:
+        return jsonify({"error": "distance must be between 0 and 32"}), 400
+
+    image_id = request.args.get('image')
+    if image_id:
+        parent, alt = load_art_index().find(image_id)
+        if not parent:
+            return jsonify({"error": f"Artwork {image_id} not found"}), 404
+        filename = (alt if alt is not None else parent).get('filename')
+        return jsonify({"filename": filename, "similar": similar_images(filename, max_distance)})
+
+    tree, hashes = load_duplicate_index()
+    pairs = describe_pairs(near_duplicates(tree, hashes, max_distance), ART_CATALOG.derive("items_by_file", items_by_file))
+    return jsonify({"pairs": pairs, "total": len(pairs)})
+
+# --- BACKGROUND JOB STATUS ---
+@app.route('/api/v1/admin/jobs/<job_id>')
+def admin_job_status(job_id):
+    """
+    Reports the progress of a background job (e.g. the thumbnail rendering queued by an upload).
+
+    Parameters:
+        job_id (str): The "jobId" returned by the upload that queued the job
+
+    Returns:
+    dict: {
+        "id": str,
+        "kind": str,
+        "status": 'queued' | 'running' | 'done' | 'failed',
+        "attempts": int,
+        "createdAt" / "startedAt" / "finishedAt": float (Unix time) or None,
+        "error": str or None,
+        "result": dict or None
+    }
+
+    Raises:
+        401: Not logged in
+        404: Unknown (or expired) job
+    """
+    if not session.get('username'):
+        return jsonify({"error": "Unauthorized"}), 401
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
 # ---- API ENDPOINTS ----
 # --- ART DATABASE ---
 @app.route('/art.json')
 def art_database():
-    return send_file('./data/art.json', mimetype='application/json')
+    return send_json_database(ART_CATALOG)
+
+# --- ART QUERY ---
+@app.route('/api/v1/art')
+def art_query():
+    """
+    Filters, sorts and paginates the art catalog server-side.
+
+    Parameters:
+        artist (str): Exact match on the cleaned artist name (no " (Prompt)")
+        form (str): Exact match on the cleaned form name (no " Form")
+        characters (str, repeatable): Characters that must all be present
+        isNSFW / isAI / isDiscEmoji (str): 'true' or 'false', omit for either
+        artNameQuery (str): Case-insensitive substring of artName
+        order (str): 'random' to shuffle, otherwise pinned forms first then alphabetical
+        seed (int): Shuffle seed for order=random (one is picked if omitted)
+        limit (int): Page size, default 60, max 200
+        cursor (str): The nextCursor of the previous page
+
+    The showAI / showNSFW cookies are applied on top of the filters.
+
+    Returns:
+    dict: {
+        "items": list,
+        "total": int,
+        "nextCursor": str or None,
+        "version": int
+    }
+
+    Raises:
+        400: Invalid limit, seed or cursor
+    """
+    args = request.args
+    filters = {
+        "artist": (args.get('artist') or '').strip() or None,
+        "form": (args.get('form') or '').strip() or None,
+        "characters": [c for c in args.getlist('characters') if c.strip()],
+        "isNSFW": parse_tri_state(args.get('isNSFW')),
+        "isAI": parse_tri_state(args.get('isAI')),
+        "isDiscEmoji": parse_tri_state(args.get('isDiscEmoji')),
+        "artNameQuery": args.get('artNameQuery'),
+    }
+
+    try:
+        limit = min(max(int(args.get('limit', ART_QUERY_DEFAULT_LIMIT)), 1), ART_QUERY_MAX_LIMIT)
+        # Cursor is "<offset>" or "<offset>.<seed>" so random listings keep their order across pages
+        offset_str, _, seed_str = (args.get('cursor') or '0').partition('.')
+        offset = max(int(offset_str), 0)
+        seed = int(seed_str or args.get('seed') or 0) or None
+    except ValueError:
+        return jsonify({"error": "limit, seed and cursor must be integers"}), 400
+
+    if args.get('order') == 'random' and seed is None:
+        seed = random.randrange(1, 2**31)
+    elif args.get('order') != 'random':
+        seed = None
+
+    query_index = load_art_query_index()
+    positions = query_index.match(
+        filters,
+        show_ai=get_cookie('showAI') == 'True',
+        show_nsfw=get_cookie('showNSFW') == 'True'
+    )
+    items, next_offset = query_index.page(positions, offset, limit, seed)
+
+    next_cursor = None
+    if next_offset is not None:
+        next_cursor = f"{next_offset}.{seed}" if seed else str(next_offset)
+
+    return jsonify({
+        "items": items,
+        "total": len(positions),
+        "nextCursor": next_cursor,
+        "version": ART_FEED.version
+    })
+
+# --- ART FACETS ---
+@app.route('/api/v1/art/facets')
+def art_facets():
+    """
+    Returns the artist, form and character filter options with per-value counts.
+
+    Computed once per catalog version and served from memory with a strong ETag.
+
+    Parameters:
+        respectPreferences (str): 'true' to only count art allowed by the showAI / showNSFW cookies
+
+    Returns:
+    dict: {
+        "artists": [{"name": str, "count": int}],
+        "forms": [{"name": str, "count": int}],
+        "characters": [{"name": str, "count": int}]
+    }
+    """
+    respect_prefs = request.args.get('respectPreferences') == 'true'
+    show_ai = not respect_prefs or get_cookie('showAI') == 'True'
+    show_nsfw = not respect_prefs or get_cookie('showNSFW') == 'True'
+
+    body, etag = ART_CATALOG.derive(
+        f"facets:{show_ai}:{show_nsfw}",
+        lambda _: encode_json(build_facets(load_art_query_index(), show_ai, show_nsfw))
+    )
+    response = conditional_response(body, etag)
+    if respect_prefs:
+        response.vary.add('Cookie')
+    return response
+
+# --- ART CHANGE FEED ---
+@app.route('/api/v1/art/changes')
+def art_changes():
+    """
+    Returns only the art entries added, updated or removed since a catalog version.
+
+    Parameters:
+        since (int): The `version` from a previous /api/v1/art or /api/v1/art/changes response
+
+    Returns:
+    dict: {
+        "version": int,
+        "resync": bool,
+        "added": list,
+        "updated": list,
+        "removed": list[int]
+    }
+    When "resync" is true the change log no longer reaches back to `since`,
+    and the client should reload the whole catalog.
+
+    Raises:
+        400: Missing or invalid 'since' parameter
+    """
+    try:
+        since = int(request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Missing or invalid 'since' parameter"}), 400
+
+    index = load_art_index()
+    version, changes = ART_FEED.since(since)
+    if changes is None:
+        return jsonify({"version": version, "resync": True, "added": [], "updated": [], "removed": []})
+
+    result = {"version": version, "resync": False, "added": [], "updated": [], "removed": []}
+    for entry_id, op in changes.items():
+        entry = index.get(entry_id)
+        if op == "removed" or entry is None:
+            result["removed"].append(entry_id)
+        else:
+            result[op].append(entry)
+    return jsonify(result)
+
+# --- HOMEPAGE PREVIEW ATLAS ---
+@app.route('/api/v1/art/preview-atlas')
+def preview_atlas():
+    """
+    Returns the sprite atlas of every SFW, non-AI thumbnail and where each artwork sits in it,
+    so the homepage preview strip needs one image request instead of one per card.
+    Rebuilt when the catalog changes.
+
+    Returns:
+    dict: {
+        "image": str or None (atlas URL, None while no thumbnails exist yet),
+        "columns": int,
+        "rows": int,
+        "tileWidth": int,
+        "tileHeight": int,
+        "tiles": [{"id", "title", "artName", "shapeshiftForm", "artist", "characters",
+                   "isDiscEmoji", "column", "row", "sfwAlternates", "alternates"}]
+    }
+    """
+    body, etag = ART_CATALOG.derive("preview-atlas", build_preview_atlas)
+    return conditional_response(body, etag, cache_control=JSON_DATABASE_CACHE_CONTROL)
+
+# --- SINGLE ART ENTRY ---
+@app.route('/api/v1/art/<image_id>')
+def art_entry(image_id):
+    """
+    Returns one artwork by ID, so pages linking to a single image don't need the whole catalog.
+
+    Parameters:
+        image_id (str): Top-level ID or 'NNNNNNN-001' alternate ID
+
+    Returns:
+    dict: {
+        "entry": dict,
+        "alternate": dict or None
+    }
+
+    Raises:
+        404: Image with ID '{image_id}' not found
+    """
+    parent, alt = load_art_index().find(image_id)
+    if not parent:
+        return jsonify({"error": f"Image with ID '{image_id}' not found"}), 404
+    return jsonify({"entry": parent, "alternate": alt})
+
+# --- ART SEARCH ---
+@app.route('/api/v1/search')
+def art_search():
+    """
+    Full-text search over titles, art names, forms, characters, artists and alternate labels.
+
+    Every word must match, either as a whole word or as the start of one; results
+    are ranked by where the words were found (titles and art names first).
+    The showAI / showNSFW cookies are applied to the results.
+
+    Parameters:
+        q (str): The search query
+        limit (int): Page size, default 60, max 200
+        cursor (str): The nextCursor of the previous page
+
+    Returns:
+    dict: {
+        "items": [{"entry": dict, "score": int}],
+        "total": int,
+        "nextCursor": str or None,
+        "version": int
+    }
+
+    Raises:
+        400: Missing query, or invalid limit or cursor
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "Missing 'q' parameter"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', ART_QUERY_DEFAULT_LIMIT)), 1), ART_QUERY_MAX_LIMIT)
+        offset = max(int(request.args.get('cursor') or 0), 0)
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+
+    show_ai = get_cookie('showAI') == 'True'
+    show_nsfw = get_cookie('showNSFW') == 'True'
+    results = [
+        (entry, score) for entry, score in load_art_search().search(query)
+        if (show_ai or not entry.get('isAI')) and (show_nsfw or not entry.get('isNSFW'))
+    ]
+
+    page = results[offset:offset + limit]
+    return jsonify({
+        "items": [{"entry": entry, "score": score} for entry, score in page],
+        "total": len(results),
+        "nextCursor": str(offset + limit) if offset + limit < len(results) else None,
+        "version": ART_FEED.version
+    })
 
 # --- CHARACTER DATABASE ---
 @app.route('/characters.json')
 def character_database():
-    return send_file('./data/characters.json', mimetype='application/json')
+    return send_json_database(CHARACTER_CATALOG)
 
 # --- OAUTH LOGIN ENDPOINT ---
 @app.route('/api/v1/oauth/login')
@@ -632,9 +1386,9 @@ def oauth_callback():
         return render_template("index.html", error="OAuth callback missing authorization code.")
 
     try:
-        token_response = requests.post(
+        # Not retried: an authorization code can only be redeemed once
+        token_response = OIDC_CLIENT.post(
             OIDC_TOKEN_ENDPOINT,
-            verify=VERIFY_SSL,
             data={
                 'grant_type': 'authorization_code',
                 'code': code,
@@ -656,9 +1410,8 @@ def oauth_callback():
         return redirect(url_for('index'))
 
     try:
-        userinfo_response = requests.get(
+        userinfo_response = OIDC_CLIENT.get(
             OIDC_USERINFO_ENDPOINT,
-            verify=VERIFY_SSL,
             headers={'Authorization': f'Bearer {access_token}'}
         )
         userinfo_response.raise_for_status()
@@ -683,11 +1436,33 @@ def oauth_callback():
     logging.info(f"User {username} successfully logged in via Authentik.")
     return redirect(url_for('index'))
 
+# --- MIRRORED DISCORD AVATARS ---
+def local_avatar_urls(avatar):
+    """
+    Returns the same-origin URLs of an avatar's mirrored copies, queueing their download
+    the first time an avatar (or a changed one) is seen.
+
+    :return: {"localURL": str or None, "localSrcset": str or None}
+    """
+    files = queue_avatar_mirror(avatar)
+    if not files:
+        return {"localURL": None, "localSrcset": None}
+    version = DISCORD_AVATAR_MIRROR.version(avatar)
+    urls = {
+        size: url_for('static', filename=f"images/artists/discord/{path.name}", v=version)
+        for size, path in files.items()
+    }
+    smallest = min(urls)
+    return {
+        "localURL": urls[smallest],
+        "localSrcset": ", ".join(f"{url} {size / smallest:g}x" for size, url in sorted(urls.items())),
+    }
+
 # --- GET DISCORD PROFILE PICTURE ----
 @app.route('/api/v1/fetch/discord-avatar')
 def fetch_discord_avatar():
     """
-    Fetch a Discord user's avatar information.
+    Fetch a Discord user's avatar information (cached per Discord user, see avatars.py).
 
     Parameters:
         id (str): Image ID
@@ -698,22 +1473,24 @@ def fetch_discord_avatar():
         "avatarURL": str,
         "avatarHash": str or None,
         "isAnimated": bool,
-        "note": str or None
+        "note": str or None,
+        "localURL": str or None (same-origin copy, once the background download is done),
+        "localSrcset": str or None (1x / 2x copies for srcset)
     }
 
     Raises:
         400: Missing image 'id' parameter
         401: Discord API key not found or missing
         404: Image with ID '{image_id}' not found
-        429: Rate limit hit on Discord API
+        429: Rate limit hit on Discord API and no earlier answer to serve (with Retry-After)
         500: Internal server error during API request to Discord
+        503: Discord API keeps failing and no earlier answer to serve (with Retry-After)
     """
     image_id = request.args.get('id')
     if not image_id:
         return jsonify({"error": "Missing image 'id' parameter"}), 400
 
-    images = load_images()
-    img = next((i for i in images if str(i.get("id")) == str(image_id)), None)
+    img, _ = load_art_index().find(image_id)
 
     if not img:
         return jsonify({"error": f"Image with ID '{image_id}' not found"}), 404
@@ -723,68 +1500,90 @@ def fetch_discord_avatar():
     if not discord_id:
         return jsonify({"error": f"Image with ID '{image_id}' has no associated discordID"}), 404
 
-    # Discord API endpoint for a User resource
-    DISCORD_API_URL = f"https://discord.com/api/v10/users/{discord_id}"
-    
-    # Headers must include the Authorization header with the bot token
-    headers = {
-        "Authorization": f"Bot {DISCORD_API_KEY}",
-        "User-Agent": "DiscordAvatarFetcher (https://world.zcraftelite.net, v1)"
+    if not DISCORD_API_KEY:
+        return jsonify({"error": "Discord API key not found or missing."}), 401
+
+    try:
+        avatar = DISCORD_AVATARS.get(discord_id)
+    except AvatarLookupError as e:
+        response = jsonify({"error": e.message})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response, e.status
+
+    response = jsonify({**avatar, **local_avatar_urls(avatar)})
+    response.headers['Cache-Control'] = DISCORD_AVATAR_CACHE_CONTROL
+    return response
+
+# --- GET MANY DISCORD PROFILE PICTURES ----
+@app.route('/api/v1/fetch/discord-avatars')
+def fetch_discord_avatars():
+    """
+    Fetch the avatar information of several Discord users in one request, looking up
+    uncached users a few at a time (see `DiscordAvatarCache.get_many()`).
+
+    Only the catalog's artists are looked up: a discordID that no artwork references
+    is answered with a per-ID error and never reaches Discord or the caches.
+
+    Parameters:
+        id (str, repeatable or comma-separated): Image IDs
+        discordID (str, repeatable or comma-separated): Discord user IDs of artists in the catalog
+
+    Returns:
+    dict: {
+        "avatars": {discordID: {...same fields as /api/v1/fetch/discord-avatar}},
+        "images": {imageID: discordID} (for the image IDs asked for),
+        "errors": {imageID or discordID: {"status": int, "error": str}}
+            (400 for a malformed discordID, 404 for one that isn't an artist in the catalog)
     }
 
+    Raises:
+        400: No IDs given, or more than DISCORD_AVATAR_BATCH_MAX of them
+        401: Discord API key not found or missing
+    """
+    def split(name):
+        return [value.strip() for arg in request.args.getlist(name) for value in arg.split(',') if value.strip()]
+
+    image_ids = list(dict.fromkeys(split('id')))
+    discord_ids = list(dict.fromkeys(split('discordID')))
+    if not image_ids and not discord_ids:
+        return jsonify({"error": "Missing 'id' or 'discordID' parameter"}), 400
+    if len(image_ids) + len(discord_ids) > DISCORD_AVATAR_BATCH_MAX:
+        return jsonify({"error": f"At most {DISCORD_AVATAR_BATCH_MAX} IDs per request"}), 400
+
     if not DISCORD_API_KEY:
         return jsonify({"error": "Discord API key not found or missing."}), 401
 
-    try:
-        response = requests.get(DISCORD_API_URL, headers=headers)
-        
-        if response.status_code == 200:
-            user_data = response.json()
-            avatar_hash = user_data.get('avatar')
-            
-            if avatar_hash:
-                # Determine if the avatar is animated (GIF)
-                is_animated = avatar_hash.startswith('a_')
-                
-                # Construct the CDN URL
-                avatar_extension = "gif" if is_animated else "png"
-                avatar_url = f"https://cdn.discordapp.com/avatars/{discord_id}/{avatar_hash}.{avatar_extension}?size=128" # Common size
-                
-                return jsonify({
-                    "discordID": discord_id,
-                    "avatarURL": avatar_url,
-                    "avatarHash": avatar_hash,
-                    "isAnimated": is_animated
-                })
-            else:
-                # User has the default avatar, which is determined by their ID modulo 6
-                # https://cdn.discordapp.com/embed/avatars/0.png through 5.png
-                try:
-                    default_index = int(discord_id) % 6
-                    default_avatar_url = f"https://cdn.discordapp.com/embed/avatars/{default_index}.png"
-                except ValueError:
-                    # Fallback for non-integer discordID (should not happen for User IDs)
-                    default_avatar_url = "https://discord.com/assets/26d246c433c2a637ba23c914b434b9d0.png"
-                
-                return jsonify({
-                    "discordID": discord_id,
-                    "avatarURL": default_avatar_url,
-                    "avatarHash": None,
-                    "isAnimated": False,
-                    "note": "User has the default avatar."
-                })
-
-        elif response.status_code == 404:
-            return jsonify({"error": f"Discord user with ID '{discord_id}' not found."}), 404
-        elif response.status_code == 429:
-            return jsonify({"error": "Rate limit hit on Discord API. Try again later."}), 429
+    images, errors = {}, {}
+    artists = set(catalog_discord_ids())
+    for discord_id in discord_ids:
+        if not valid_discord_id(discord_id):
+            errors[discord_id] = {"status": 400, "error": f"Invalid Discord ID '{discord_id}'"}
+        elif discord_id not in artists:
+            errors[discord_id] = {"status": 404, "error": f"Discord ID '{discord_id}' is not an artist in the catalog"}
+    discord_ids = [discord_id for discord_id in discord_ids if discord_id not in errors]
+
+    index = load_art_index()
+    for image_id in image_ids:
+        img, _ = index.find(image_id)
+        if not img:
+            errors[image_id] = {"status": 404, "error": f"Image with ID '{image_id}' not found"}
+        elif not img.get('discordID'):
+            errors[image_id] = {"status": 404, "error": f"Image with ID '{image_id}' has no associated discordID"}
         else:
-            logging.error(f"Discord API error for ID {discord_id}: {response.status_code} - {response.text}")
-            return jsonify({"error": f"Failed to fetch from Discord API. Status: {response.status_code}"}), 500
-
-    except requests.exceptions.RequestException as e:
-        logging.exception(f"HTTP request failed: {e}")
-        return jsonify({"error": "Internal server error during API request to Discord."}), 500
+            images[image_id] = img['discordID']
+
+    avatars, failures = DISCORD_AVATARS.get_many(discord_ids + list(images.values()))
+    for discord_id, e in failures.items():
+        errors[discord_id] = {"status": e.status, "error": e.message}
+
+    response = jsonify({
+        "avatars": {discord_id: {**avatar, **local_avatar_urls(avatar)} for discord_id, avatar in avatars.items()},
+        "images": images,
+        "errors": errors
+    })
+    response.headers['Cache-Control'] = DISCORD_AVATAR_CACHE_CONTROL
+    return response
 
 
 # ---- MAIN PROGRAM LOOP ----
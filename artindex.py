@@ -0,0 +1,150 @@
+"""
+ID index for the art catalog, shared by app.py and artmgr.py.
+
+Maps top-level integer IDs and 'NNNNNNN-001' composite alternate IDs to their
+entries in constant time, and keeps track of the next free IDs. The index owns
+mutations of the list it was built from, so adding or removing entries through
+it keeps both in sync without rebuilding anything.
+"""
+
+FIRST_ID = 1000000
+
+
+def parse_id(target_id):
+    """
+    Splits an ID into (parent_int, alt_sub_or_None).
+
+    Accepts:
+    - An integer or plain integer string  → (NNNNN, None)
+    - 'NNNNN-001' composite string        → (NNNNN, '001')
+    Returns (None, None) if the ID can't be parsed.
+    """
+    target_str = str(target_id)
+    alt_sub = None
+    if '-' in target_str:
+        target_str, alt_sub = target_str.rsplit('-', 1)
+    try:
+        return int(target_str), alt_sub
+    except ValueError:
+        return None, None
+
+
+def _alt_num(alt_id):
+    return int(alt_id) if str(alt_id).isdigit() else 0
+
+
+class ArtIndex:
+    """
+    Constant-time lookups over an art list.
+
+    :param art_list: The list of top-level entries (e.g. from `load_images()`).
+    """
+
+    def __init__(self, art_list):
+        self.art_list = art_list
+        self._entries = {}
+        self._alts = {}
+        self._alt_max = {}
+        self._max_id = FIRST_ID - 1
+        self._changed = set()
+        self._removed = set()
+        for entry in art_list:
+            self._index_entry(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, target_id):
+        return self.find(target_id)[0] is not None
+
+    # --- INTERNAL BOOKKEEPING ---
+    def _index_entry(self, entry):
+        entry_id = entry["id"]
+        self._entries[entry_id] = entry
+        self._max_id = max(self._max_id, entry_id)
+        self._alt_max[entry_id] = 0
+        for alt in entry.get("alternates", []):
+            self._index_alt(entry_id, alt)
+
+    def _index_alt(self, parent_id, alt):
+        self._alts[(parent_id, str(alt.get("id")))] = alt
+        self._alt_max[parent_id] = max(self._alt_max.get(parent_id, 0), _alt_num(alt.get("id")))
+
+    # --- LOOKUPS ---
+    def get(self, entry_id):
+        """Returns the top-level entry with the given integer ID, or None."""
+        return self._entries.get(entry_id)
+
+    def find(self, target_id):
+        """
+        Returns (parent_entry, alt_entry_or_None).
+        Accepts integer IDs for top-level entries and 'NNNNN-001' composite
+        strings for alternates. Returns (None, None) if not found.
+        """
+        parent_id, alt_sub = parse_id(target_id)
+        parent = self._entries.get(parent_id)
+        if parent is None:
+            return None, None
+        if alt_sub is None:
+            return parent, None
+        alt = self._alts.get((parent_id, alt_sub))
+        if alt is None:
+            return None, None
+        return parent, alt
+
+    def next_id(self):
+        """Returns the next available top-level ID (alternates use their own 3-digit counter)."""
+        return self._max_id + 1
+
+    def next_alt_id(self, parent_id):
+        """Returns the next 3-digit zero-padded string alt ID unique within a parent."""
+        return f"{self._alt_max.get(parent_id, 0) + 1:03d}"
+
+    # --- MUTATIONS ---
+    def touch(self, entry_id):
+        """Marks a top-level entry as edited in place, so the next save rewrites it."""
+        self._changed.add(entry_id)
+        self._removed.discard(entry_id)
+
+    def pop_changes(self):
+        """Returns (changed_ids, removed_ids) since the last call and starts tracking afresh."""
+        changes = (self._changed, self._removed)
+        self._changed, self._removed = set(), set()
+        return changes
+
+    def add(self, entry):
+        """Appends a new top-level entry to the list and indexes it."""
+        self.art_list.append(entry)
+        self._index_entry(entry)
+        self.touch(entry["id"])
+
+    def add_alternate(self, parent, alt):
+        """Appends an alternate to `parent` and indexes it."""
+        parent.setdefault("alternates", []).append(alt)
+        self._index_alt(parent["id"], alt)
+        self.touch(parent["id"])
+
+    def remove(self, parent, alt=None):
+        """
+        Removes a top-level entry (and its alternates), or just `alt` from `parent`.
+        Freed IDs become available again, matching the old max()+1 behaviour.
+        """
+        parent_id = parent["id"]
+        if alt is not None:
+            alt_sub = str(alt.get("id"))
+            parent["alternates"] = [a for a in parent.get("alternates", []) if str(a["id"]) != alt_sub]
+            self._alts.pop((parent_id, alt_sub), None)
+            self.touch(parent_id)
+            if _alt_num(alt_sub) == self._alt_max.get(parent_id):
+                self._alt_max[parent_id] = max((_alt_num(a.get("id")) for a in parent["alternates"]), default=0)
+            return
+
+        self.art_list[:] = [a for a in self.art_list if a["id"] != parent_id]
+        self._entries.pop(parent_id, None)
+        self._alt_max.pop(parent_id, None)
+        self._changed.discard(parent_id)
+        self._removed.add(parent_id)
+        for a in parent.get("alternates", []):
+            self._alts.pop((parent_id, str(a.get("id"))), None)
+        if parent_id == self._max_id:
+            self._max_id = max(self._entries, default=FIRST_ID - 1)
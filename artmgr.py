@@ -1,96 +1,93 @@
 #!/usr/bin/env python3
-import json
 import os
 import argparse
 from pathlib import Path
 
+from artindex import ArtIndex
+from artsearch import ArtSearchIndex
+from catalog import Catalog
+from changefeed import ChangeFeed
+from perceptual import NEAR_DUPLICATE_DISTANCE, build_tree, describe_pairs, near_duplicates
+from contentstore import items_by_file, shared_files
+from storage import JSONStorage, SQLiteStorage, open_storage
+from thumbnails import ImageProfile, ThumbnailManifest, ThumbnailWarmup, apply_records, iter_images, manifest_path
+
 # ---- Constants ----
 DATA_DIR = Path("data")
 ART_FILE = DATA_DIR / "art.json"
+CHARACTERS_FILE = DATA_DIR / "characters.json"
+CHANGES_FILE = DATA_DIR / "art.changes.json"
 IMAGE_DIR = Path("static/images")
+THUMBS_DIR = IMAGE_DIR / "thumbs"
+DERIVED_DIR = IMAGE_DIR / "derived"
+CATALOG_BACKEND = os.getenv("CATALOG_BACKEND", "json")
+CATALOG_DB = Path(os.getenv("CATALOG_DB", DATA_DIR / "catalog.db"))
 
 # ---- Ensure directories exist ----
 DATA_DIR.mkdir(exist_ok=True)
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+# ---- Catalog (shared with the site so its change feed sees CLI edits) ----
+ART_CATALOG = Catalog(
+    index_factory=ArtIndex,
+    storage=open_storage("art", ART_FILE, 4, CATALOG_BACKEND, CATALOG_DB)
+)
+ART_CATALOG.add_listener(ChangeFeed(CHANGES_FILE).sync)
+
 def load_art():
     """
-    Loads the art data from the `ART_FILE`.
+    Loads the art data from the configured catalog backend.
 
     Returns:
-        list: A list of art data dictionaries loaded from the `ART_FILE`.
+        list: A list of art data dictionaries, or an empty list if there is no catalog yet.
     """
-    if ART_FILE.exists():
-        with open(ART_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    try:
+        return ART_CATALOG.get()
+    except FileNotFoundError:
+        return []
 
-def save_art(art_list):
+def load_art_index():
     """
-    Saves the given art data to the `ART_FILE`.
+    Returns the cached `ArtIndex` for the art catalog.
 
-    Args:
-        art_list (list): A list of art data dictionaries to be saved.
+    Edits made through it are tracked, so the SQLite backend only rewrites the
+    touched entries on `save_art()`.
 
     Returns:
-        None
+        ArtIndex: The index (over an empty list if there is no catalog yet).
     """
-    with open(ART_FILE, "w", encoding="utf-8") as f:
-        json.dump(art_list, f, indent=4, ensure_ascii=False)
+    try:
+        return ART_CATALOG.get_index()
+    except FileNotFoundError:
+        return ArtIndex([])
 
-def find_next_id(art_list):
+def save_art(art_list):
     """
-    Finds the next available top-level ID (alternates use their own 3-digit counter).
+    Saves the given art data to the configured catalog backend.
 
     Args:
-        art_list (list): A list of art data dictionaries.
+        art_list (list): A list of art data dictionaries to be saved.
 
     Returns:
-        int: The next available ID.
+        None
     """
-    if not art_list:
-        return 1000000
-    return max(item["id"] for item in art_list) + 1
-
+    ART_CATALOG.save(art_list)
 
-def find_next_alt_id(parent_entry):
-    """Returns the next 3-digit zero-padded string alt ID unique within a parent."""
-    existing = [a.get("id") for a in parent_entry.get("alternates", [])]
-    max_num  = max((int(x) for x in existing if str(x).isdigit()), default=0)
-    return f"{max_num + 1:03d}"
+def changed_fields(original, edited):
+    """
+    Returns the fields of an edited copy that differ from the original.
 
+    Only these are written back, so fields changed by someone else while the
+    prompts were open (a thumbnail job, a web admin edit) are kept.
 
-def find_by_id(art_list, target_id):
-    """
-    Find an entry by ID, searching both top-level and nested alternates.
-    Accepts integer IDs for top-level entries and 'NNNNN-001' composite strings
-    for alternates.
+    Args:
+        original (dict): The entry as it was read before editing.
+        edited (dict): The edited copy.
 
     Returns:
-        tuple: (parent_entry, alt_entry_or_None). (None, None) if not found.
-    """
-    target_str = str(target_id)
-    if '-' in target_str:
-        parts = target_str.rsplit('-', 1)
-        try:
-            parent_int = int(parts[0])
-            alt_sub    = parts[1]
-        except ValueError:
-            return None, None
-        for entry in art_list:
-            if entry.get("id") == parent_int:
-                for alt in entry.get("alternates", []):
-                    if str(alt.get("id")) == alt_sub:
-                        return entry, alt
-        return None, None
-    try:
-        target_int = int(target_str)
-    except ValueError:
-        return None, None
-    for entry in art_list:
-        if entry.get("id") == target_int:
-            return entry, None
-    return None, None
+        dict: The changed (or added) fields and their new values.
+    """
+    return {key: value for key, value in edited.items() if key not in original or original[key] != value}
 
 def validate_filename(filename):
     """
@@ -163,8 +160,6 @@ def add_artwork(args):
     Returns:
         None
     """
-    art_list = load_art()
-
     print("=== Add New Artwork ===")
     filename = prompt_input("Filename (must exist in ./static/images)", required=True)
     validate_filename(filename)
@@ -221,11 +216,15 @@ def add_artwork(args):
         "isNSFW": isNSFW,
         "isDiscEmoji": isDiscEmoji,
         "disableDownload": disableDownload,
-        "id": find_next_id(art_list)
+        "id": None
     }
 
-    art_list.append(new_entry)
-    save_art(art_list)
+    # Re-read under the lock so an upload on the site in the meantime isn't lost
+    with ART_CATALOG.transaction():
+        index = load_art_index()
+        new_entry["id"] = index.next_id()
+        index.add(new_entry)
+        save_art(index.art_list)
     print(f"\n✅ Artwork added with ID: {new_entry['id']}")
 
 def list_artwork(args):
@@ -245,7 +244,8 @@ def list_artwork(args):
 
     filtered = art_list
     if args.id:
-        filtered = [a for a in filtered if a["id"] == args.id]
+        match = ArtIndex(art_list).get(args.id)
+        filtered = [match] if match else []
     if args.artist:
         filtered = [a for a in filtered if args.artist.lower() in a["artist"].lower()]
     if args.title:
@@ -260,6 +260,26 @@ def list_artwork(args):
     for art in filtered:
         print(f"ID: {art['id']} | Title: {art['title']} | Artist: {art['artist']} | AI: {art['isAI']} | NSFW: {art['isNSFW']}")
 
+def search_artwork(args):
+    """
+    Full-text search over titles, art names, forms, characters, artists and alternate labels.
+
+    Args:
+        args (Namespace): The parsed command line arguments (`query`, `limit`).
+
+    Returns:
+        None
+    """
+    results = ArtSearchIndex(load_art()).search(" ".join(args.query))
+    if not results:
+        print("No matching artwork.")
+        return
+
+    for art, score in results[:args.limit]:
+        print(f"[{score:>3}] ID: {art['id']} | Title: {art['title']} | Artist: {art['artist']} | AI: {art['isAI']} | NSFW: {art['isNSFW']}")
+    if len(results) > args.limit:
+        print(f"... and {len(results) - args.limit} more")
+
 def edit_artwork(args):
     """
     Edit an artwork based on the given arguments.
@@ -270,11 +290,13 @@ def edit_artwork(args):
     Returns:
         None
     """
-    art_list = load_art()
-    target = next((a for a in art_list if a["id"] == args.id), None)
+    target = load_art_index().get(args.id)
     if not target:
         print(f"Artwork with ID {args.id} not found.")
         return
+    # Edit a copy; only the fields changed here are merged into a fresh read of the catalog
+    original = dict(target)
+    target = dict(target)
 
     print(f"=== Editing Artwork ID {args.id} ===")
     print("Leave blank to keep current value.")
@@ -327,7 +349,17 @@ def edit_artwork(args):
 
         target["disableDownload"] = yes_no("Disable download?", default="y" if target["disableDownload"] else "n")
 
-        save_art(art_list)
+        with ART_CATALOG.transaction():
+            index = load_art_index()
+            current = index.get(args.id)
+            if not current:
+                print(f"Artwork with ID {args.id} was removed while editing.")
+                return
+            changes = changed_fields(original, target)
+            changes.pop("alternates", None)
+            current.update(changes)
+            index.touch(current["id"])
+            save_art(index.art_list)
         print("✅ Artwork updated.")
     except KeyboardInterrupt:
         print("\nEdit cancelled.")
@@ -339,27 +371,24 @@ def remove_artwork(args):
     Args:
         args (argparse.Namespace): An object containing the ID of the artwork to remove.
     """
-    art_list = load_art()
-    parent, alt = find_by_id(art_list, args.id)
-    if not parent:
-        print(f"Artwork with ID {args.id} not found.")
-        return
-
+    with ART_CATALOG.transaction():
+        index = load_art_index()
+        parent, alt = index.find(args.id)
+        if not parent:
+            print(f"Artwork with ID {args.id} not found.")
+            return
+
+        index.remove(parent, alt)
+        save_art(index.art_list)
     if alt is not None:
-        alt_sub = str(alt.get("id"))
-        parent["alternates"] = [a for a in parent.get("alternates", []) if str(a["id"]) != alt_sub]
-        save_art(art_list)
         print(f"✅ Alternate {args.id} removed from parent #{parent['id']}.")
     else:
-        art_list[:] = [a for a in art_list if a["id"] != parent["id"]]
-        save_art(art_list)
         print(f"✅ Artwork ID {args.id} removed.")
 
 
 def add_alternate(args):
     """Add an alternate version to an existing artwork."""
-    art_list = load_art()
-    parent, _ = find_by_id(art_list, args.parent_id)
+    parent = load_art_index().get(args.parent_id)
     if not parent:
         print(f"❌ Parent artwork ID {args.parent_id} not found.")
         return
@@ -374,11 +403,10 @@ def add_alternate(args):
     is_disc  = yes_no("  Available as Discord Emoji?", default=False)
     no_dl    = yes_no("  Disable download?", default=False)
 
-    alt_id   = find_next_alt_id(parent)
     stripped = Path(filename).stem
 
     alt_entry = {
-        "id":              alt_id,
+        "id":              None,
         "filename":        filename,
         "strippedFilename": stripped,
         "filetype":        f"image/{Path(filename).suffix.lstrip('.')}",
@@ -390,22 +418,29 @@ def add_alternate(args):
         "aiModel":         ai_model,
     }
 
-    if "alternates" not in parent:
-        parent["alternates"] = []
-    parent["alternates"].append(alt_entry)
-    save_art(art_list)
+    with ART_CATALOG.transaction():
+        index = load_art_index()
+        parent = index.get(args.parent_id)
+        if not parent:
+            print(f"❌ Parent artwork ID {args.parent_id} was removed while editing.")
+            return
+        alt_id = alt_entry["id"] = index.next_alt_id(parent["id"])
+        index.add_alternate(parent, alt_entry)
+        save_art(index.art_list)
     full_alt_id = f"{parent['id']}-{alt_id}"
     print(f"✅ Alternate {full_alt_id} added to artwork #{parent['id']}.")
 
 
 def edit_alternate(args):
     """Edit an existing alternate version by ID."""
-    art_list = load_art()
-    parent, alt = find_by_id(art_list, args.id)
+    parent, alt = load_art_index().find(args.id)
 
     if not parent or alt is None:
         print(f"❌ Alternate ID {args.id} not found.")
         return
+    # Edit a copy; only the fields changed here are merged into a fresh read of the catalog
+    original = dict(alt)
+    alt = dict(alt)
 
     print(f"\nEditing alternate [{alt['id']}] '{alt.get('label', '')}' of artwork #{parent['id']}")
 
@@ -416,9 +451,117 @@ def edit_alternate(args):
     alt["isDiscEmoji"]     = yes_no("  Discord Emoji?",           default=alt.get("isDiscEmoji", False))
     alt["disableDownload"] = yes_no("  Disable download?",        default=alt.get("disableDownload", False))
 
-    save_art(art_list)
+    with ART_CATALOG.transaction():
+        index = load_art_index()
+        current_parent, current = index.find(args.id)
+        if current is None:
+            print(f"❌ Alternate ID {args.id} was removed while editing.")
+            return
+        current.update(changed_fields(original, alt))
+        index.touch(current_parent["id"])
+        save_art(index.art_list)
     print(f"✅ Alternate ID {alt['id']} updated.")
 
+def build_thumbnails(args):
+    """
+    Renders missing or stale thumbnails and responsive derivatives over a process pool,
+    sharing the site's warm-up lock, then records the derivatives and image info in the catalog.
+
+    Args:
+        args (Namespace): The parsed command line arguments (`force`, `workers`).
+    """
+    THUMBS_DIR.mkdir(parents=True, exist_ok=True)
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    warmup = ThumbnailWarmup(IMAGE_DIR, THUMBS_DIR, DATA_DIR, workers=args.workers, profile=ImageProfile.from_env(DERIVED_DIR))
+
+    def progress(done, total, name, error):
+        status = f"❌ {error}" if error else "✅"
+        print(f"  [{done}/{total}] {name} {status}")
+
+    status = warmup.run(list(iter_images(load_art())), force=args.force, progress=progress)
+    if status["state"] == "skipped":
+        print("Another process is already generating thumbnails; try again once it finishes.")
+        return
+
+    with ART_CATALOG.transaction():
+        index = load_art_index()
+        changed = apply_records(index.art_list, warmup.manifest.records())
+        for entry_id in changed:
+            index.touch(entry_id)
+        if changed:
+            save_art(index.art_list)
+    print(
+        f"\n✅ {status['created']} thumbnails generated, {status['failed']} failed, "
+        f"{status['refreshed']} re-verified ({status['seconds']}s, {status['workers']} workers)"
+    )
+
+def list_shared_files(args):
+    """
+    Lists the artworks and alternates that show the same image (the same file, or
+    files with identical contents).
+
+    Args:
+        args (Namespace): The parsed command line arguments.
+    """
+    groups = shared_files(load_art(), IMAGE_DIR, ThumbnailManifest(manifest_path(DATA_DIR, THUMBS_DIR)))
+    if not groups:
+        print("No shared images.")
+        return
+
+    for group in groups:
+        print(f"{group['sha256'][:12]} ({group['size'] / 1024:.0f} KiB) used by {', '.join(map(str, group['items']))}")
+        for filename in group["files"]:
+            print(f"    {filename}")
+    print(f"\n{len(groups)} images are shared by more than one entry")
+
+def list_near_duplicates(args):
+    """
+    Lists images that look alike (re-exports, recompressions, small edits) by comparing
+    the perceptual hashes stored in the thumbnail manifest. Run `thumbs` first so every
+    image has a hash.
+
+    Args:
+        args (Namespace): The parsed command line arguments (`distance`, `all`).
+    """
+    tree, hashes = build_tree(ThumbnailManifest(manifest_path(DATA_DIR, THUMBS_DIR)).records())
+    pairs = describe_pairs(near_duplicates(tree, hashes, args.distance), items_by_file(load_art()))
+    if not args.all:
+        pairs = [pair for pair in pairs if not pair["sameArtwork"]]
+    if not pairs:
+        print(f"No likely duplicates among {len(hashes)} hashed images.")
+        return
+
+    for pair in pairs:
+        (a, b), note = pair["images"], " (same artwork)" if pair["sameArtwork"] else ""
+        print(f"[{pair['distance']:>2}/64]{note}")
+        for image in (a, b):
+            print(f"    {', '.join(map(str, image['items']))}: {image['filename']}")
+    print(f"\n{len(pairs)} likely duplicate pairs among {len(hashes)} hashed images")
+
+def db_import(args):
+    """
+    Copies art.json and characters.json into the SQLite catalog database.
+
+    Args:
+        args (Namespace): The parsed command line arguments (`db`).
+    """
+    for kind, json_path, indent in (("art", ART_FILE, 4), ("characters", CHARACTERS_FILE, 2)):
+        data = JSONStorage(json_path, indent).read()
+        SQLiteStorage(args.db, kind).write(data)
+        print(f"✅ Imported {len(data)} {kind} entries from {json_path} into {args.db}")
+
+def db_export(args):
+    """
+    Writes the SQLite catalog database back out as art.json and characters.json.
+
+    Args:
+        args (Namespace): The parsed command line arguments (`db`).
+    """
+    for kind, json_path, indent in (("art", ART_FILE, 4), ("characters", CHARACTERS_FILE, 2)):
+        data = SQLiteStorage(args.db, kind).read()
+        JSONStorage(json_path, indent).write(data)
+        print(f"✅ Exported {len(data)} {kind} entries from {args.db} to {json_path}")
+
 def main():
     parser = argparse.ArgumentParser(description="Manage your art database (art.json)")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -433,6 +576,11 @@ def main():
     list_parser.add_argument("--title", help="Filter by title")
     list_parser.add_argument("--nsfw", type=lambda x: x.lower() == "true", help="Filter by NSFW (true/false)")
 
+    # Search
+    search_parser = subparsers.add_parser("search", help="Full-text search across artwork entries")
+    search_parser.add_argument("query", nargs="+", help="Words to search for (prefixes match too)")
+    search_parser.add_argument("--limit", type=int, default=20, help="Maximum number of results to show")
+
     # Edit
     edit_parser = subparsers.add_parser("edit", help="Edit an existing artwork")
     edit_parser.add_argument("id", type=int, help="ID of the artwork to edit")
@@ -449,12 +597,33 @@ def main():
     alt_edit_parser = subparsers.add_parser("alt-edit", help="Edit an existing alternate version")
     alt_edit_parser.add_argument("id", help="Composite ID of the alternate (e.g. 10000041-001)")
 
+    # Thumbnails
+    thumbs_parser = subparsers.add_parser("thumbs", help="Generate missing or stale thumbnails in parallel")
+    thumbs_parser.add_argument("--force", action="store_true", help="Regenerate thumbnails even if they are up to date")
+    thumbs_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+
+    # Shared files
+    subparsers.add_parser("shared-files", help="List artworks and alternates that show the same image file")
+
+    # Near duplicates
+    dupes_parser = subparsers.add_parser("dupes", help="List images that look like near duplicates")
+    dupes_parser.add_argument("--distance", type=int, default=NEAR_DUPLICATE_DISTANCE, help="Maximum Hamming distance of the 64-bit hashes")
+    dupes_parser.add_argument("--all", action="store_true", help="Also list alternates of the same artwork")
+
+    # SQLite backend
+    db_import_parser = subparsers.add_parser("db-import", help="Copy the JSON files into the SQLite catalog")
+    db_import_parser.add_argument("--db", type=Path, default=CATALOG_DB, help="Path of the SQLite database")
+    db_export_parser = subparsers.add_parser("db-export", help="Write the SQLite catalog back out as JSON files")
+    db_export_parser.add_argument("--db", type=Path, default=CATALOG_DB, help="Path of the SQLite database")
+
     args = parser.parse_args()
 
     if args.command == "add":
         add_artwork(args)
     elif args.command == "list":
         list_artwork(args)
+    elif args.command == "search":
+        search_artwork(args)
     elif args.command == "edit":
         edit_artwork(args)
     elif args.command == "remove":
@@ -463,6 +632,16 @@ def main():
         add_alternate(args)
     elif args.command == "alt-edit":
         edit_alternate(args)
+    elif args.command == "thumbs":
+        build_thumbnails(args)
+    elif args.command == "shared-files":
+        list_shared_files(args)
+    elif args.command == "dupes":
+        list_near_duplicates(args)
+    elif args.command == "db-import":
+        db_import(args)
+    elif args.command == "db-export":
+        db_export(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Server-side filtering, sorting and pagination for the art catalog.
+
+Mirrors the filters `loadGallery()` in viewer.js used to apply in the browser,
+but runs them against set indexes that are built once per catalog version.
+"""
+
+import random
+import re
+
+PINNED_FORMS = ["Main", "True", "Humanoid"]
+TRI_STATE_FLAGS = ("isNSFW", "isAI", "isDiscEmoji")
+
+_PROMPT_SUFFIX = re.compile(r"\s*\(Prompt\)\s*$", re.IGNORECASE)
+_FORM_SUFFIX = re.compile(r"\s*Form\s*$", re.IGNORECASE)
+
+
+# ---- VALUE CLEANING ----
+def clean_artist_name(name):
+    """Removes any trailing "(Prompt)" from an artist name (same as viewer.js)."""
+    if not name:
+        return ""
+    return _PROMPT_SUFFIX.sub("", name).strip()
+
+
+def clean_form_name(name):
+    """Removes any trailing " Form" from a form name (same as viewer.js)."""
+    if not name:
+        return ""
+    return _FORM_SUFFIX.sub("", name).strip()
+
+
+def _form_sort_key(entry):
+    form = clean_form_name(entry.get("shapeshiftForm") or "")
+    if form in PINNED_FORMS:
+        return (0, PINNED_FORMS.index(form), "")
+    return (1, 0, form.casefold())
+
+
+# ---- QUERY INDEX ----
+class ArtQueryIndex:
+    """
+    Set indexes over an art list, in default display order.
+
+    Every index maps a value to the set of positions in `self.entries`, so a
+    query is a handful of set intersections followed by a sort of the survivors.
+
+    :param art_list: The list of top-level entries (e.g. from `load_images()`).
+    """
+
+    def __init__(self, art_list):
+        # Pinned forms first, then alphabetically; sorted() keeps catalog order for ties
+        self.entries = sorted(art_list, key=_form_sort_key)
+        self.by_artist = {}
+        self.by_form = {}
+        self.by_character = {}
+        self.flags = {flag: set() for flag in TRI_STATE_FLAGS}
+        self.art_names = []
+
+        for pos, entry in enumerate(self.entries):
+            artist = clean_artist_name(entry.get("artist"))
+            if artist:
+                self.by_artist.setdefault(artist, set()).add(pos)
+            form = clean_form_name(entry.get("shapeshiftForm"))
+            if form:
+                self.by_form.setdefault(form, set()).add(pos)
+            characters = entry.get("characters") if isinstance(entry.get("characters"), list) else []
+            for char in characters:
+                key = str(char).strip().lower()
+                if key:
+                    self.by_character.setdefault(key, set()).add(pos)
+            for flag in TRI_STATE_FLAGS:
+                if entry.get(flag):
+                    self.flags[flag].add(pos)
+            self.art_names.append(str(entry.get("artName") or "").lower())
+
+        self.all = set(range(len(self.entries)))
+
+    def match(self, filters, show_ai=False, show_nsfw=False):
+        """
+        Returns the positions matching `filters`, in default display order.
+
+        :param filters: dict with any of `artist`, `form` (exact, cleaned),
+            `characters` (list, all required), `isNSFW`/`isAI`/`isDiscEmoji`
+            (True, False or None) and `artNameQuery` (case-insensitive substring).
+        :param show_ai: Whether AI art is visible at all (the showAI cookie).
+        :param show_nsfw: Whether NSFW art is visible at all (the showNSFW cookie).
+        """
+        required = []
+        if filters.get("artist"):
+            required.append(self.by_artist.get(filters["artist"], set()))
+        if filters.get("form"):
+            required.append(self.by_form.get(filters["form"], set()))
+        for char in filters.get("characters") or []:
+            required.append(self.by_character.get(str(char).strip().lower(), set()))
+        for flag in TRI_STATE_FLAGS:
+            if filters.get(flag) is True:
+                required.append(self.flags[flag])
+
+        # Start from the smallest set so the intersection stays cheap
+        required.sort(key=len)
+        result = set(required[0]) if required else set(self.all)
+        for positions in required[1:]:
+            result &= positions
+
+        for flag in TRI_STATE_FLAGS:
+            if filters.get(flag) is False:
+                result -= self.flags[flag]
+        if not show_ai:
+            result -= self.flags["isAI"]
+        if not show_nsfw:
+            result -= self.flags["isNSFW"]
+
+        query = (filters.get("artNameQuery") or "").strip().lower()
+        if query:
+            result = {pos for pos in result if query in self.art_names[pos]}
+
+        return sorted(result)
+
+    def page(self, positions, offset=0, limit=60, seed=None):
+        """
+        Returns (entries, next_offset_or_None) for one page of `positions`.
+
+        :param seed: When set, the positions are shuffled deterministically with
+            this seed so a randomised listing stays stable across pages.
+        """
+        if seed is not None:
+            positions = list(positions)
+            random.Random(seed).shuffle(positions)
+        chunk = positions[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(positions) else None
+        return [self.entries[pos] for pos in chunk], next_offset
+
+
+# ---- FACETS ----
+def build_facets(query_index, show_ai=True, show_nsfw=True):
+    """
+    Returns the filter options with per-value counts, sorted like `getFilterOptions()` did.
+
+    :return: {"artists": [...], "forms": [...], "characters": [...]}, each a list of
+        {"name": str, "count": int}.
+    """
+    visible = query_index.match({}, show_ai=show_ai, show_nsfw=show_nsfw)
+    artists, forms, characters = {}, {}, {}
+    for pos in visible:
+        entry = query_index.entries[pos]
+        artist = clean_artist_name(entry.get("artist"))
+        if artist:
+            artists[artist] = artists.get(artist, 0) + 1
+        form = clean_form_name(entry.get("shapeshiftForm"))
+        if form:
+            forms[form] = forms.get(form, 0) + 1
+        if isinstance(entry.get("characters"), list):
+            for char in entry["characters"]:
+                char = str(char).strip() if char else ""
+                if char:
+                    characters[char] = characters.get(char, 0) + 1
+
+    def as_list(counts):
+        return [{"name": name, "count": counts[name]} for name in sorted(counts, key=str.casefold)]
+
+    return {
+        "artists": as_list(artists),
+        "forms": as_list(forms),
+        "characters": as_list(characters),
+    }
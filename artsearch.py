@@ -0,0 +1,157 @@
+"""
+Full-text search over the art catalog, shared by app.py and artmgr.py.
+
+An inverted index from case-folded tokens to the entries they appear in, with
+per-field weights for ranking and a sorted vocabulary for prefix matching.
+`sync()` only re-tokenizes entries whose searchable text changed, so it can be
+registered as a catalog listener and kept up to date on every save.
+"""
+
+import bisect
+import re
+import threading
+
+from artquery import clean_artist_name, clean_form_name
+
+# How much a token found in each field counts towards an entry's score
+SEARCH_FIELDS = {
+    "title": 3,
+    "artName": 3,
+    "characters": 2,
+    "shapeshiftForm": 2,
+    "artist": 2,
+}
+ALT_LABEL_WEIGHT = 1
+# Whole-word matches count this many times more than prefix matches
+EXACT_MATCH_BONUS = 2
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Splits text into case-folded word tokens."""
+    if not text:
+        return []
+    return _TOKEN.findall(str(text).casefold())
+
+
+def _searchable(entry):
+    """Returns the (weight, text) pairs of an entry that go into the index."""
+    fields = []
+    for field, weight in SEARCH_FIELDS.items():
+        value = entry.get(field)
+        if field == "characters":
+            fields.extend((weight, str(char)) for char in (value if isinstance(value, list) else []) if char)
+        elif field == "artist":
+            fields.append((weight, clean_artist_name(value)))
+        elif field == "shapeshiftForm":
+            fields.append((weight, clean_form_name(value)))
+        elif value:
+            fields.append((weight, str(value)))
+    for alt in entry.get("alternates", []):
+        if alt.get("label"):
+            fields.append((ALT_LABEL_WEIGHT, str(alt["label"])))
+    return tuple(fields)
+
+
+class ArtSearchIndex:
+    """
+    Inverted index over the searchable fields of an art list.
+
+    :param art_list: Optional initial list of top-level entries.
+    """
+
+    def __init__(self, art_list=()):
+        self._lock = threading.Lock()
+        self._postings = {}   # token -> {entry_id: weight}
+        self._vocab = []      # sorted tokens, for prefix lookups
+        self._docs = {}       # entry_id -> (searchable fields, {token: weight})
+        self._entries = {}    # entry_id -> entry
+        self._order = {}      # entry_id -> position in the catalog, for stable ties
+        self.sync(art_list)
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- MAINTENANCE ---
+    def _index(self, entry_id, searchable):
+        weights = {}
+        for weight, text in searchable:
+            for token in set(tokenize(text)):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+            postings[entry_id] = weight
+        self._docs[entry_id] = (searchable, weights)
+
+    def _unindex(self, entry_id):
+        doc = self._docs.pop(entry_id, None)
+        if doc is None:
+            return
+        for token in doc[1]:
+            postings = self._postings[token]
+            postings.pop(entry_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+
+    def sync(self, art_list):
+        """
+        Brings the index in line with `art_list`, re-tokenizing only changed entries.
+        Meant to be registered with `Catalog.add_listener()`.
+        """
+        with self._lock:
+            seen = set()
+            for pos, entry in enumerate(art_list):
+                entry_id = entry["id"]
+                seen.add(entry_id)
+                self._entries[entry_id] = entry
+                self._order[entry_id] = pos
+                searchable = _searchable(entry)
+                doc = self._docs.get(entry_id)
+                if doc is None or doc[0] != searchable:
+                    self._unindex(entry_id)
+                    self._index(entry_id, searchable)
+            for entry_id in [e for e in self._docs if e not in seen]:
+                self._unindex(entry_id)
+                self._entries.pop(entry_id, None)
+                self._order.pop(entry_id, None)
+
+    # --- QUERIES ---
+    def _term_scores(self, term):
+        scores = {}
+        i = bisect.bisect_left(self._vocab, term)
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            token = self._vocab[i]
+            factor = EXACT_MATCH_BONUS if token == term else 1
+            for entry_id, weight in self._postings[token].items():
+                scores[entry_id] = max(scores.get(entry_id, 0), weight * factor)
+            i += 1
+        return scores
+
+    def search(self, query):
+        """
+        Returns [(entry, score)] for entries matching every word of `query`, best first.
+
+        Each word matches whole tokens or token prefixes ("wol" finds "Wolf"); whole-word
+        matches and matches in titles/art names rank higher. Ties keep catalog order.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            scores = None
+            # Rarest-looking (longest) terms first so the candidate set shrinks quickly
+            for term in sorted(terms, key=len, reverse=True):
+                term_scores = self._term_scores(term)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {eid: scores[eid] + s for eid, s in term_scores.items() if eid in scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self._order[item[0]]))
+            return [(self._entries[entry_id], score) for entry_id, score in ranked]
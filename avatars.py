@@ -0,0 +1,579 @@
+"""
+Discord avatar lookups with a per-user cache in front of the Discord API.
+
+The viewer asks for the artist's avatar every time an image is opened, so
+without a cache a popular artist means the same `GET /users/{id}` over and
+over, and Discord starts answering 429. `DiscordAvatarCache` keeps each
+user's avatar for a TTL and:
+
+- caches "unknown user" (404) answers for a shorter TTL,
+- coalesces concurrent misses for one user into a single upstream call
+  (the other requests wait for it and share its answer),
+- honours `Retry-After` on a 429: no upstream calls are made until it has
+  passed, and expired entries keep being served (stale) meanwhile, as they are
+  when Discord is down.
+
+The cache lives in each worker process's memory. `AvatarPrefetch` warms it
+for every artist in the catalog on a background thread (a few lookups at a
+time, waiting out rate limits), and keeps it warm by repeating that before
+the entries expire, so opening the viewer doesn't wait on Discord. Every
+worker starts a prefetcher, but a lock file lets only one process run each
+pass (the others skip it), so Discord sees one lookup per artist per pass
+rather than one per worker; the other workers share its mirrored avatars.
+
+`AvatarMirror` keeps local copies of the avatars (resized WebP, next to the
+uploaded artist pictures), so browsers load them from our own origin with
+long-lived caching instead of going to Discord's CDN on every viewer open.
+Mirrored files are named after the avatar hash: a changed avatar gets new
+files (downloaded in the background) and the old ones are removed.
+
+Requests to Discord's API and CDN go through their own pooled clients (see
+httpclient.py), `DISCORD_API_CLIENT` and `DISCORD_CDN_CLIENT`.
+"""
+
+import io
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps, ImageSequence
+from requests.exceptions import RequestException
+
+from httpclient import DEFAULT_TIMEOUT, CircuitOpenError, UpstreamClient
+from thumbnails import save_atomic
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process prefetches on its own
+    fcntl = None
+
+DISCORD_API_BASE = "https://discord.com/api/v10"
+DISCORD_CDN_BASE = "https://cdn.discordapp.com"
+DISCORD_USER_AGENT = "DiscordAvatarFetcher (https://world.zcraftelite.net, v1)"
+DISCORD_TIMEOUT = (DEFAULT_TIMEOUT[0], 10)
+
+# Separate clients, so an unreachable CDN doesn't open the API's circuit (and the other way round)
+DISCORD_API_CLIENT = UpstreamClient("discord-api", timeout=DISCORD_TIMEOUT, headers={"User-Agent": DISCORD_USER_AGENT})
+DISCORD_CDN_CLIENT = UpstreamClient("discord-cdn", timeout=DISCORD_TIMEOUT, headers={"User-Agent": DISCORD_USER_AGENT})
+
+AVATAR_TTL = 6 * 60 * 60
+AVATAR_NEGATIVE_TTL = 10 * 60
+# Backoff after a 429 that carries no usable Retry-After
+DEFAULT_RETRY_AFTER = 5
+
+# Mirrored avatar sizes: the viewer shows them at 56px (1x and 2x)
+AVATAR_SIZES = (56, 112)
+AVATAR_QUALITY = 85
+# A mirror download that hasn't produced files after this many seconds may be queued again
+AVATAR_MIRROR_REQUEUE = 10 * 60
+# Most users the cache (and the mirror's queued downloads) keep track of; the oldest are dropped first
+AVATAR_CACHE_MAX_ENTRIES = 2000
+
+# Upstream lookups run at a time for batch requests and the prefetch
+LOOKUP_CONCURRENCY = 4
+# How often the prefetch retries one user that keeps getting rate limited
+PREFETCH_ATTEMPTS = 5
+# Lock (holding the time of the last finished pass) that keeps prefetch passes to one process
+PREFETCH_LOCK_NAME = ".avatars.prefetch.lock"
+
+_SAFE_ID = re.compile(r"^[0-9]+$")
+_SAFE_HASH = re.compile(r"^[0-9A-Za-z_]+$")
+
+
+class AvatarLookupError(Exception):
+    """
+    A lookup that produced no avatar.
+
+    :param status: HTTP status to answer with (404, 429, 500 or 503).
+    :param message: Error message for the client.
+    :param retry_after: Seconds until Discord accepts requests again (429), or until it is
+        tried again after repeated failures (503).
+    """
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+def valid_discord_id(discord_id):
+    """True if `discord_id` looks like a Discord snowflake (digits only), so it is safe in API paths and file names."""
+    return isinstance(discord_id, str) and bool(_SAFE_ID.match(discord_id))
+
+
+def avatar_info(discord_id, avatar_hash, cdn_base=DISCORD_CDN_BASE):
+    """Builds the avatar dict returned to clients from a user's avatar hash (None for the default avatar)."""
+    if avatar_hash:
+        # Animated avatars (GIF) have hashes starting with 'a_'
+        is_animated = avatar_hash.startswith("a_")
+        extension = "gif" if is_animated else "png"
+        return {
+            "discordID": discord_id,
+            "avatarURL": f"{cdn_base}/avatars/{discord_id}/{avatar_hash}.{extension}?size=128",
+            "avatarHash": avatar_hash,
+            "isAnimated": is_animated,
+        }
+
+    # The default avatar is picked by the user ID modulo 6 (embed/avatars/0.png through 5.png)
+    try:
+        default_url = f"{cdn_base}/embed/avatars/{int(discord_id) % 6}.png"
+    except ValueError:
+        # Fallback for non-integer discordID (should not happen for User IDs)
+        default_url = "https://discord.com/assets/26d246c433c2a637ba23c914b434b9d0.png"
+    return {
+        "discordID": discord_id,
+        "avatarURL": default_url,
+        "avatarHash": None,
+        "isAnimated": False,
+        "note": "User has the default avatar.",
+    }
+
+
+def _retry_after(response):
+    """Seconds to wait after a 429, from the Retry-After header or Discord's JSON body."""
+    for value in (response.headers.get("Retry-After"), _json_field(response, "retry_after")):
+        try:
+            return max(float(value), 0.0)
+        except (TypeError, ValueError):
+            continue
+    return DEFAULT_RETRY_AFTER
+
+
+def _json_field(response, field):
+    try:
+        return response.json().get(field)
+    except ValueError:
+        return None
+
+
+def lookup_discord_avatar(discord_id, api_key, api_base=DISCORD_API_BASE, cdn_base=DISCORD_CDN_BASE,
+                          client=DISCORD_API_CLIENT):
+    """
+    Looks a user up on the Discord API (uncached).
+
+    :param discord_id: The Discord user ID.
+    :param api_key: The bot token.
+    :param api_base: API root, e.g. 'https://discord.com/api/v10'.
+    :param cdn_base: CDN root the avatar URLs point at.
+    :param client: The `UpstreamClient` to send the request with.
+    :return: The avatar dict from `avatar_info()`.
+    :raises AvatarLookupError: For invalid IDs, unknown users, rate limits and API or network errors.
+    """
+    if not valid_discord_id(discord_id):
+        raise AvatarLookupError(400, f"Invalid Discord ID '{discord_id}'.")
+    try:
+        response = client.get(f"{api_base}/users/{discord_id}", headers={"Authorization": f"Bot {api_key}"})
+    except CircuitOpenError as e:
+        raise AvatarLookupError(503, "Discord API is unavailable. Try again later.", e.retry_after)
+    except RequestException as e:
+        logging.error(f"HTTP request failed: {e}")
+        raise AvatarLookupError(500, "Internal server error during API request to Discord.")
+
+    if response.status_code == 200:
+        return avatar_info(discord_id, response.json().get("avatar"), cdn_base)
+    if response.status_code == 404:
+        raise AvatarLookupError(404, f"Discord user with ID '{discord_id}' not found.")
+    if response.status_code == 429:
+        raise AvatarLookupError(429, "Rate limit hit on Discord API. Try again later.", _retry_after(response))
+    logging.error(f"Discord API error for ID {discord_id}: {response.status_code} - {response.text}")
+    raise AvatarLookupError(500, f"Failed to fetch from Discord API. Status: {response.status_code}")
+
+
+class _Flight:
+    """One in-progress upstream lookup that concurrent misses for the same user wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DiscordAvatarCache:
+    """
+    TTL cache of avatar lookups, keyed by Discord user ID.
+
+    :param fetch: Callable(discord_id) returning the avatar dict or raising `AvatarLookupError`.
+    :param ttl: Seconds an avatar is served before it is looked up again.
+    :param negative_ttl: Seconds an unknown user (404) is remembered.
+    :param clock: Monotonic clock (seconds), replaceable for tests.
+    :param max_entries: Most users kept; the least recently looked up ones are dropped beyond that.
+    """
+
+    def __init__(self, fetch, ttl=AVATAR_TTL, negative_ttl=AVATAR_NEGATIVE_TTL, clock=time.monotonic,
+                 max_entries=AVATAR_CACHE_MAX_ENTRIES):
+        self._fetch = fetch
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        # discord_id: {"value": dict or None, "error": AvatarLookupError or None, "expires": float}, oldest first
+        self._entries = OrderedDict()
+        self._flights = {}    # discord_id: _Flight
+        self._blocked_until = 0.0
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0, "upstream": 0, "evictions": 0}
+
+    def get(self, discord_id):
+        """
+        Returns a user's avatar, from the cache when it is still fresh.
+
+        :return: The avatar dict (see `avatar_info()`).
+        :raises AvatarLookupError: For invalid IDs (never sent upstream), unknown users (cached
+            too), and for rate limits or upstream errors when there is no earlier answer to fall back on.
+        """
+        if not valid_discord_id(discord_id):
+            raise AvatarLookupError(400, f"Invalid Discord ID '{discord_id}'.")
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(discord_id)
+            if entry and entry["expires"] > now:
+                self._entries.move_to_end(discord_id)
+                self._stats["hits"] += 1
+                return self._answer(entry)
+            if self._blocked_until > now:
+                return self._fallback(entry, AvatarLookupError(
+                    429, "Rate limit hit on Discord API. Try again later.", self._blocked_until - now
+                ))
+            flight = self._flights.get(discord_id)
+            leader = flight is None
+            if leader:
+                flight = self._flights[discord_id] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._refresh(discord_id, entry)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[discord_id]
+            flight.done.set()
+
+    def get_many(self, discord_ids, concurrency=LOOKUP_CONCURRENCY):
+        """
+        Looks up several users, `concurrency` upstream calls at a time (cache hits cost nothing).
+
+        :return: ({discord_id: avatar}, {discord_id: AvatarLookupError})
+        """
+        avatars, errors = {}, {}
+
+        def lookup(discord_id):
+            try:
+                avatars[discord_id] = self.get(discord_id)
+            except AvatarLookupError as e:
+                errors[discord_id] = e
+
+        discord_ids = list(dict.fromkeys(discord_ids))
+        if len(discord_ids) <= 1:
+            for discord_id in discord_ids:
+                lookup(discord_id)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="avatar-lookup") as pool:
+                list(pool.map(lookup, discord_ids))
+        return avatars, errors
+
+    def _refresh(self, discord_id, entry):
+        """Looks the user up upstream (as the single caller for this ID) and stores the answer."""
+        with self._lock:
+            self._stats["upstream"] += 1
+        try:
+            value = self._fetch(discord_id)
+        except AvatarLookupError as e:
+            with self._lock:
+                now = self._clock()
+                if e.status == 404:
+                    self._store(discord_id, {"value": None, "error": e, "expires": now + self.negative_ttl})
+                    raise
+                if e.status == 429:
+                    self._blocked_until = max(self._blocked_until, now + (e.retry_after or DEFAULT_RETRY_AFTER))
+                    logging.warning(f"Discord rate limit hit; no avatar lookups for {e.retry_after or DEFAULT_RETRY_AFTER:.1f}s")
+                return self._fallback(entry, e)
+
+        with self._lock:
+            self._store(discord_id, {"value": value, "error": None, "expires": self._clock() + self.ttl})
+        return value
+
+    def _store(self, discord_id, entry):
+        """Stores an answer (lock held), dropping the least recently used users beyond `max_entries`."""
+        self._entries[discord_id] = entry
+        self._entries.move_to_end(discord_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _answer(self, entry):
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["value"]
+
+    def _fallback(self, entry, error):
+        """Returns the expired avatar while Discord can't be asked, or raises `error` if there is none."""
+        if entry and entry["value"] is not None:
+            self._stats["stale"] += 1
+            return entry["value"]
+        raise error
+
+    def invalidate(self, discord_id=None):
+        """Drops one user's cached answer, or all of them."""
+        with self._lock:
+            if discord_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(discord_id, None)
+
+    def stats(self):
+        """Returns the cache size, counters and remaining rate-limit backoff (seconds)."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "retryAfter": max(self._blocked_until - self._clock(), 0.0),
+                **self._stats,
+            }
+
+
+class AvatarMirror:
+    """
+    Local copies of Discord avatars: `<discord id>-<size>-<avatar hash or 'default'>.webp`.
+
+    :param mirror_dir: Directory to keep the files in.
+    :param sizes: Square sizes (px) to store every avatar at.
+    :param client: The `UpstreamClient` to download the avatars with.
+    :param max_queued: Most downloads remembered as queued; the oldest are forgotten first.
+    """
+
+    def __init__(self, mirror_dir, sizes=AVATAR_SIZES, client=DISCORD_CDN_CLIENT, max_queued=AVATAR_CACHE_MAX_ENTRIES):
+        self.mirror_dir = Path(mirror_dir)
+        self.sizes = tuple(sizes)
+        self.client = client
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._queued = OrderedDict()    # file key: monotonic time the download was queued, oldest first
+
+    @staticmethod
+    def version(avatar):
+        """The part of the file names that changes with the avatar: its hash, or 'default'."""
+        return avatar.get("avatarHash") or "default"
+
+    def files(self, avatar):
+        """
+        Returns {size: path} of an avatar's mirrored files (which may not exist yet),
+        or None if its ID or hash can't be used in a file name.
+        """
+        discord_id, version = str(avatar.get("discordID") or ""), self.version(avatar)
+        if not valid_discord_id(discord_id) or not _SAFE_HASH.match(version):
+            return None
+        return {size: self.mirror_dir / f"{discord_id}-{size}-{version}.webp" for size in self.sizes}
+
+    def ensure(self, avatar, enqueue):
+        """
+        Returns an avatar's mirrored files if they are all there; otherwise queues their
+        download (once per AVATAR_MIRROR_REQUEUE) and returns None.
+
+        :param avatar: The avatar dict from `avatar_info()`.
+        :param enqueue: Callable(avatar) that schedules `mirror(avatar)` in the background.
+        :return: {size: path} or None.
+        """
+        files = self.files(avatar)
+        if files is None:
+            return None
+        if all(path.is_file() for path in files.values()):
+            return files
+
+        key = files[self.sizes[0]].name
+        now = time.monotonic()
+        with self._lock:
+            if now - self._queued.get(key, -AVATAR_MIRROR_REQUEUE) < AVATAR_MIRROR_REQUEUE:
+                return None
+            self._queued[key] = now
+            self._queued.move_to_end(key)
+            # Entries past the requeue window no longer hold anything back
+            while self._queued and (len(self._queued) > self.max_queued
+                                    or now - next(iter(self._queued.values())) >= AVATAR_MIRROR_REQUEUE):
+                self._queued.popitem(last=False)
+        enqueue(avatar)
+        return None
+
+    def mirror(self, avatar):
+        """
+        Downloads an avatar, stores it at every size (animated avatars stay animated)
+        and removes the files of the user's previous avatars.
+
+        :return: Names of the files written.
+        :raises requests.exceptions.RequestException: If the download fails.
+        """
+        files = self.files(avatar)
+        if files is None:
+            raise ValueError(f"Can't mirror the avatar of Discord user {avatar.get('discordID')!r}")
+        if all(path.is_file() for path in files.values()):
+            # Another worker queued (and ran) the same download
+            return sorted(path.name for path in files.values())
+
+        response = self.client.get(avatar["avatarURL"])
+        response.raise_for_status()
+        with Image.open(io.BytesIO(response.content)) as im:
+            frames = [frame.convert("RGBA") for frame in ImageSequence.Iterator(im)]
+            durations = [frame.info.get("duration", 100) for frame in ImageSequence.Iterator(im)]
+
+        self.mirror_dir.mkdir(parents=True, exist_ok=True)
+        for size, path in files.items():
+            resized = [ImageOps.fit(frame, (size, size), Image.LANCZOS) for frame in frames]
+            params = {"format": "WEBP", "quality": AVATAR_QUALITY}
+            if len(resized) > 1:
+                params.update(save_all=True, append_images=resized[1:], duration=durations, loop=0)
+            save_atomic(resized[0], path, **params)
+
+        current = {path.name for path in files.values()}
+        for path in self.mirror_dir.glob(f"{avatar['discordID']}-*.webp"):
+            if path.name not in current:
+                path.unlink(missing_ok=True)
+        return sorted(current)
+
+
+class AvatarPrefetch:
+    """
+    Warms a `DiscordAvatarCache` for every Discord user in the catalog.
+
+    :param cache: The `DiscordAvatarCache` to fill.
+    :param concurrency: Upstream lookups at a time.
+    :param on_avatar: Optional callable(avatar) run for every avatar found (e.g. to mirror it).
+    :param state_dir: Directory for the lock that keeps passes to one process (not publicly
+        served), or None to run every pass in this process regardless of the others.
+    :param fresh_for: Seconds after a finished pass (by any process) during which another is skipped
+        (defaults to half the cache TTL).
+    """
+
+    def __init__(self, cache, concurrency=LOOKUP_CONCURRENCY, on_avatar=None, state_dir=None, fresh_for=None):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.on_avatar = on_avatar
+        self.lock_path = Path(state_dir) / PREFETCH_LOCK_NAME if state_dir is not None else None
+        self.fresh_for = cache.ttl / 2 if fresh_for is None else fresh_for
+        self._status = {"state": "idle"}
+        self._status_lock = threading.Lock()
+
+    def status(self):
+        """Returns a snapshot of the current or last pass (state, counts, timings)."""
+        with self._status_lock:
+            return dict(self._status)
+
+    def _warm(self, discord_id):
+        """Looks one user up, waiting out rate limits. Returns True if an avatar was found."""
+        for _ in range(PREFETCH_ATTEMPTS):
+            try:
+                avatar = self.cache.get(discord_id)
+            except AvatarLookupError as e:
+                if e.status != 429:
+                    return False
+                time.sleep(e.retry_after or DEFAULT_RETRY_AFTER)
+                continue
+            if self.on_avatar is not None:
+                try:
+                    self.on_avatar(avatar)
+                except Exception:
+                    logging.exception(f"Avatar prefetch callback failed for {discord_id}")
+            return True
+        return False
+
+    def _try_lock(self):
+        """
+        Returns an fd holding the prefetch lock, or None if another process is running a pass
+        or finished one less than `fresh_for` seconds ago.
+        """
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        try:
+            finished = float(os.pread(fd, 64, 0) or 0)
+        except ValueError:
+            finished = 0.0
+        if time.time() - finished < self.fresh_for:
+            self._unlock(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def _unlock(fd, finished=None):
+        """Releases the prefetch lock, first recording the (wall clock) time a pass finished."""
+        if finished is not None:
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, repr(finished).encode("ascii"), 0)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def run(self, discord_ids):
+        """
+        Looks up every user (a pass takes about as long as its slowest lookups, plus any
+        Retry-After waits) and returns the final status.
+
+        Returns right away with state 'skipped' if another process is running a pass or
+        has just run one.
+        """
+        started = time.monotonic()
+        lock_fd = self._try_lock() if self.lock_path is not None else None
+        if self.lock_path is not None and lock_fd is None:
+            with self._status_lock:
+                self._status = {"state": "skipped", "reason": "another process is prefetching avatars"}
+            return self.status()
+
+        finished = None
+        try:
+            discord_ids = list(dict.fromkeys(discord_ids))
+            with self._status_lock:
+                self._status = {"state": "running", "total": len(discord_ids), "found": 0, "failed": 0}
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix="avatar-prefetch") as pool:
+                for found in pool.map(self._warm, discord_ids):
+                    with self._status_lock:
+                        self._status["found" if found else "failed"] += 1
+            finished = time.time()
+        finally:
+            if lock_fd is not None:
+                self._unlock(lock_fd, finished)
+        with self._status_lock:
+            self._status.update(state="done", seconds=round(time.monotonic() - started, 3))
+        return self.status()
+
+    def start(self, load_ids, interval=None):
+        """
+        Runs passes on a daemon thread so the caller can start serving immediately.
+
+        :param load_ids: Callable returning the Discord IDs to warm (called before every pass).
+        :param interval: Seconds between passes (e.g. a little under the cache TTL), or None for one pass.
+        :return: The started thread.
+        """
+        def work():
+            while True:
+                try:
+                    status = self.run(load_ids())
+                    if status["state"] == "done":
+                        logging.info(f"Avatar prefetch: {status['found']}/{status['total']} avatars in {status['seconds']}s")
+                except Exception:
+                    logging.exception("Avatar prefetch failed")
+                if interval is None:
+                    return
+                time.sleep(interval)
+
+        thread = threading.Thread(target=work, name="avatar-prefetch", daemon=True)
+        thread.start()
+        return thread
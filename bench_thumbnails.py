@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the thumbnailer's decoding against the old full-resolution path.
+
+Every image in static/images is rendered (280px thumbnail plus the responsive
+derivatives) once per strategy, each run in a fresh process so its peak RSS can
+be measured:
+
+- full: decode at native resolution, then LANCZOS-resize every output (the old path)
+- fast: `thumbnails.render_thumbnail()` (JPEG draft mode, reduce-then-resample)
+
+The thumbnails of both strategies are also compared pixel by pixel, so any
+quality cost shows up next to the speed-up.
+
+Usage:
+    python bench_thumbnails.py [--images static/images] [--thumbs-only] [--limit N]
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageOps, ImageStat
+
+from thumbnails import DERIVATIVE_QUALITY, THUMB_QUALITY, THUMB_SIZE, ImageProfile, render_thumbnail
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+
+
+# ---- STRATEGIES (run inside the child process) ----
+def render_full(src_file, out_dir, profile):
+    """The pre-draft thumbnailer: one native-resolution decode, plain LANCZOS resizes."""
+    with Image.open(src_file) as im:
+        im = ImageOps.exif_transpose(im)
+        hsize = int(float(im.height) * (THUMB_SIZE[0] / float(im.width)))
+        im.resize((THUMB_SIZE[0], hsize), Image.LANCZOS).save(out_dir / "thumb.webp", format="WEBP", quality=THUMB_QUALITY)
+
+        widths = [w for w in profile.widths if w < im.width]
+        if widths and im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+        current = im
+        for width in reversed(widths):
+            current = current.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+            for fmt in profile.formats:
+                current.save(out_dir / f"d-{width}.{fmt}", format=fmt.upper(), quality=DERIVATIVE_QUALITY[fmt])
+
+
+def render_fast(src_file, out_dir, profile):
+    render_thumbnail(src_file, out_dir / "thumb.webp", src_file.name, profile)
+
+
+def run_child(strategy, src_file, out_dir, thumbs_only):
+    out_dir = Path(out_dir)
+    profile = ImageProfile(derived_dir=None if thumbs_only else out_dir)
+    started = time.perf_counter()
+    if strategy == "full":
+        render_full(Path(src_file), out_dir, profile)
+    elif strategy == "fast":
+        render_fast(Path(src_file), out_dir, profile)
+    seconds = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    print(json.dumps({"seconds": seconds, "maxrssMB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+# ---- DRIVER ----
+def measure(strategy, src_file, out_dir, thumbs_only):
+    cmd = [sys.executable, __file__, "--child", strategy, str(src_file), str(out_dir)]
+    if thumbs_only:
+        cmd.append("--thumbs-only")
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def thumb_difference(a, b):
+    """Mean absolute per-channel difference (0-255) between two thumbnails."""
+    with Image.open(a) as im_a, Image.open(b) as im_b:
+        im_a, im_b = im_a.convert("RGBA"), im_b.convert("RGBA")
+        if im_a.size != im_b.size:
+            im_b = im_b.resize(im_a.size)
+        return sum(ImageStat.Stat(ImageChops.difference(im_a, im_b)).mean) / 4
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thumbnail decoding strategies")
+    parser.add_argument("--images", type=Path, default=Path("static/images"), help="Directory of source images")
+    parser.add_argument("--thumbs-only", action="store_true", help="Only render the 280px thumbnails")
+    parser.add_argument("--limit", type=int, default=None, help="Only benchmark the N largest images")
+    parser.add_argument("--child", nargs=3, metavar=("STRATEGY", "SRC", "OUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.thumbs_only)
+        return
+
+    sources = sorted(
+        (p for p in args.images.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS),
+        key=lambda p: p.stat().st_size, reverse=True
+    )[:args.limit]
+    baseline = measure("noop", sources[0], tempfile.mkdtemp(), True)["maxrssMB"]
+
+    print(f"{'image':<42} {'px':>6} {'full s':>7} {'fast s':>7} {'full MB':>8} {'fast MB':>8} {'diff':>5}")
+    totals = {"full": [0.0, 0.0], "fast": [0.0, 0.0]}
+    for src_file in sources:
+        with Image.open(src_file) as im:
+            megapixels = im.width * im.height / 1e6
+        row = {}
+        with tempfile.TemporaryDirectory() as full_dir, tempfile.TemporaryDirectory() as fast_dir:
+            for strategy, out_dir in (("full", full_dir), ("fast", fast_dir)):
+                row[strategy] = measure(strategy, src_file, out_dir, args.thumbs_only)
+                totals[strategy][0] += row[strategy]["seconds"]
+                totals[strategy][1] = max(totals[strategy][1], row[strategy]["maxrssMB"] - baseline)
+            diff = thumb_difference(Path(full_dir) / "thumb.webp", Path(fast_dir) / "thumb.webp")
+        print(
+            f"{src_file.name[:42]:<42} {megapixels:>5.1f}M "
+            f"{row['full']['seconds']:>7.2f} {row['fast']['seconds']:>7.2f} "
+            f"{row['full']['maxrssMB'] - baseline:>8.0f} {row['fast']['maxrssMB'] - baseline:>8.0f} {diff:>5.2f}"
+        )
+
+    print(f"\nInterpreter baseline RSS: {baseline:.0f} MB (subtracted above)")
+    print(f"Total wall time: full {totals['full'][0]:.2f}s, fast {totals['fast'][0]:.2f}s "
+          f"({totals['full'][0] / max(totals['fast'][0], 1e-9):.1f}x)")
+    print(f"Worst peak RSS:  full {totals['full'][1]:.0f} MB, fast {totals['fast'][1]:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
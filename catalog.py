@@ -0,0 +1,337 @@
+"""
+In-process cache for the catalogs (art.json and characters.json).
+
+Every worker keeps one parsed copy of each catalog in memory and only re-reads
+it when it actually changed in storage (checked with a cheap `os.stat`, or the
+revision counter for the SQLite backend, see storage.py).
+
+Saves are atomic (write to a temp file, fsync, rename) and serialized across
+processes with a lock file next to the catalog, so gunicorn workers and artmgr
+can't lose each other's updates or see a half-written file.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from storage import JSONStorage
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, fall back to in-process locking only
+    fcntl = None
+
+
+class Catalog:
+    """
+    A JSON list kept in storage, parsed once and kept in memory.
+
+    The list returned by `get()` is shared by every caller in the process, so
+    treat it as read-only unless you hand it back to `save()` afterwards.
+
+    Read-modify-write cycles must run inside `transaction()` so no other
+    process can save in between the read and the write.
+
+    :param path: Path to the JSON file.
+    :param indent: Indentation used when writing the file back.
+    :param index_factory: Optional callable building a lookup index from the list (see `get_index()`).
+    :param coalesce: Seconds to hold back writes so back-to-back saves become one
+        fsync'd write. The inter-process lock stays held until the write lands, so
+        other processes never read around a pending save. 0 writes immediately.
+    :param storage: Optional storage backend (see storage.py); overrides `path` and `indent`.
+    """
+
+    def __init__(self, path=None, indent=4, index_factory=None, coalesce=0, storage=None):
+        self.storage = storage or JSONStorage(path, indent)
+        self.path = self.storage.path
+        self.index_factory = index_factory
+        self.coalesce = coalesce
+        self.lock_path = self.storage.lock_path
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.writes = 0
+        self.coalesced = 0
+        self._lock = threading.RLock()
+        self._lock_fd = None
+        self._txn_depth = 0
+        self._pending = None
+        self._pending_changes = None
+        self._flush_timer = None
+        self._data = None
+        self._stamp = None
+        self._index = None
+        self._index_for = None
+        self._derived = {}
+        self._building = {}
+        self._listeners = []
+        _catalogs.append(self)
+
+    def get(self):
+        """
+        Returns the parsed list, re-reading storage only if it changed since the last read.
+
+        :raises FileNotFoundError: If the catalog does not exist.
+        """
+        stamp = self.storage.stamp()
+        with self._lock:
+            if self._data is not None and stamp is not None and stamp == self._stamp:
+                self.hits += 1
+                return self._data
+
+            if self._data is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+
+            # Stamp before reading so a write racing with us shows up as a new stamp next time
+            self._data = self.storage.read()
+            self._stamp = stamp
+            self.version += 1
+            self._notify()
+            return self._data
+
+    def add_listener(self, listener):
+        """
+        Registers `listener(data)` to be called whenever the list is (re)loaded from disk or saved.
+
+        Listener errors are logged, never raised, so they can't break reads or saves.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self):
+        for listener in self._listeners:
+            try:
+                listener(self._data)
+            except Exception:
+                logging.exception(f"Catalog listener failed for {self.storage}")
+
+    def get_index(self):
+        """
+        Returns the index for the current list, building it only when the list was (re)loaded.
+
+        Mutations made through the index update the cached list in place, so the
+        index survives a `save()` of that same list.
+        """
+        data = self.get()
+        with self._lock:
+            if self._index is None or self._index_for is not data:
+                self._index = self.index_factory(data)
+                self._index_for = data
+            return self._index
+
+    def derive(self, name, builder):
+        """
+        Returns `builder(list)`, computed once per catalog version and then served from memory.
+
+        The builder runs outside the catalog lock, so a slow one (e.g. the preview atlas)
+        doesn't stall `get()` in other threads. Callers wanting a value that is already
+        being built for the same version wait for that build instead of starting their own.
+
+        :param name: Key the derived value is cached under.
+        :param builder: Callable taking the current list.
+        """
+        with self._lock:
+            data = self.get()
+            version = self.version
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            # Holding the lock means this thread is inside a transaction (which keeps the lock);
+            # it must not wait for a build that may itself need the lock
+            in_transaction = self._txn_depth > 0
+            build = self._building.get(name)
+            leader = build is None or build.version != version
+            if leader:
+                build = self._building[name] = _Build(version)
+
+        if not leader:
+            if not in_transaction:
+                build.done.wait()
+                if build.error is None:
+                    return build.value
+            return builder(data)
+
+        try:
+            build.value = builder(data)
+        except BaseException as e:
+            build.error = e
+            raise
+        finally:
+            build.done.set()
+            with self._lock:
+                if self._building.get(name) is build:
+                    del self._building[name]
+                if build.error is None and self.version == version:
+                    self._derived[name] = (version, build.value)
+        return build.value
+
+    # --- INTER-PROCESS LOCKING ---
+    def _lock_file(self):
+        if self._lock_fd is not None:
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        self._lock_fd = fd
+
+    def _unlock_file(self):
+        if self._lock_fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    def _release_if_idle(self):
+        if self._txn_depth == 0 and self._pending is None:
+            self._unlock_file()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Holds the catalog lock (across threads and processes) for a read-modify-write cycle.
+
+        `get()` inside the block always sees the latest file on disk; call `save()`
+        before leaving it. Transactions nest.
+        """
+        with self._lock:
+            self._lock_file()
+            self._txn_depth += 1
+            try:
+                yield
+            finally:
+                self._txn_depth -= 1
+                self._release_if_idle()
+
+    # --- WRITING ---
+    def _changes_for(self, data):
+        """
+        Returns (changed_ids, removed_ids) recorded by the index since the last save,
+        or None when they can't be trusted (the list wasn't built into the current index).
+        """
+        if self._index is None or self._index_for is not data or not hasattr(self._index, "pop_changes"):
+            return None
+        return self._index.pop_changes()
+
+    def save(self, data):
+        """
+        Writes the list back to disk and makes it the cached copy.
+
+        With `coalesce` set, the write is deferred and merged with any saves that
+        follow within the window; the cached copy is updated immediately either way.
+
+        :param data: The full list to save.
+        """
+        with self._lock:
+            self._lock_file()
+            try:
+                changes = self._changes_for(data)
+                if self.coalesce:
+                    if self._pending is not None:
+                        self.coalesced += 1
+                        changes = _merge_changes(self._pending_changes, changes)
+                    self._pending = data
+                    self._pending_changes = changes
+                    self._data = data
+                    self.version += 1
+                    if self._flush_timer is None:
+                        self._flush_timer = threading.Timer(self.coalesce, self.flush)
+                        self._flush_timer.daemon = True
+                        self._flush_timer.start()
+                    return
+                self._commit(data, changes)
+            except BaseException:
+                # The cached list may have been mutated in place, so force a re-read
+                self._pending = None
+                self._pending_changes = None
+                self.invalidate()
+                raise
+            finally:
+                self._release_if_idle()
+
+    def _commit(self, data, changes=None):
+        self.storage.write(data, changes)
+        self.writes += 1
+        self._data = data
+        self._stamp = self.storage.stamp()
+        self.version += 1
+        self._notify()
+
+    def flush(self):
+        """Writes out a pending coalesced save now (no-op if there is none)."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            data, self._pending = self._pending, None
+            changes, self._pending_changes = self._pending_changes, None
+            try:
+                if data is not None:
+                    self._commit(data, changes)
+            except Exception:
+                self.invalidate()
+                logging.exception(f"Failed to write {self.storage}")
+                raise
+            finally:
+                self._release_if_idle()
+
+    def invalidate(self):
+        """Drops the cached copy so the next `get()` re-reads storage."""
+        with self._lock:
+            self._data = None
+            self._stamp = None
+            self._index = None
+            self._index_for = None
+
+    def stats(self):
+        """Returns the cache counters for this catalog."""
+        return {
+            "path": str(self.storage),
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "pending": self._pending is not None,
+            "cached": self._data is not None,
+            "derived": sorted(self._derived),
+        }
+
+
+class _Build:
+    """A derived value being built for one catalog version, which other callers can wait on."""
+
+    def __init__(self, version):
+        self.version = version
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _merge_changes(a, b):
+    """Combines two (changed_ids, removed_ids) pairs; None (rewrite everything) wins."""
+    if a is None or b is None:
+        return None
+    changed = (a[0] - b[1]) | b[0]
+    removed = (a[1] - b[0]) | b[1]
+    return changed, removed
+
+
+# ---- FLUSH PENDING WRITES ON EXIT ----
+_catalogs = []
+
+
+def _flush_all():
+    for catalog in _catalogs:
+        try:
+            catalog.flush()
+        except Exception:
+            pass
+
+
+atexit.register(_flush_all)
@@ -0,0 +1,126 @@
+"""
+Incremental change feed for the art catalog.
+
+Keeps a monotonically increasing version and a bounded log of which top-level
+entries were added, updated or removed, persisted next to art.json so every
+worker (and artmgr) agrees on the version numbers. Changes are detected by
+comparing per-entry fingerprints, so edits made through any code path (or by
+hand) end up in the log the next time the catalog is saved or reloaded.
+"""
+
+import hashlib
+import json
+
+from catalog import Catalog
+
+CHANGE_LOG_LIMIT = 500
+
+
+def fingerprint(entry):
+    """Returns a short, stable hash of an entry (including its alternates)."""
+    raw = json.dumps(entry, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+class ChangeFeed:
+    """
+    Version counter plus bounded change log for one catalog.
+
+    The state file holds:
+    - version:      the current catalog version
+    - floor:        the oldest version the log can still answer `since` queries from
+    - fingerprints: {id: fingerprint} as of `version`
+    - log:          [{"version": int, "op": "added"|"updated"|"removed", "id": int}]
+
+    :param path: Path to the state file (e.g. data/art.changes.json).
+    :param limit: Maximum number of log records kept before the oldest are dropped.
+    """
+
+    def __init__(self, path, limit=CHANGE_LOG_LIMIT):
+        self.limit = limit
+        self._state = Catalog(path, indent=None)
+
+    def _load_state(self):
+        try:
+            return self._state.get()
+        except FileNotFoundError:
+            return None
+
+    @property
+    def version(self):
+        """The current catalog version (0 before anything was recorded)."""
+        state = self._load_state()
+        return state["version"] if state else 0
+
+    def sync(self, art_list):
+        """
+        Records any differences between `art_list` and the last recorded state.
+        Meant to be registered with `Catalog.add_listener()`.
+        """
+        current = {str(entry["id"]): fingerprint(entry) for entry in art_list}
+        with self._state.transaction():
+            self._record(current)
+
+    def _record(self, current):
+        state = self._load_state()
+
+        if state is None:
+            # First run: take a baseline, there is nothing to diff against yet
+            self._state.save({"version": 1, "floor": 1, "fingerprints": current, "log": []})
+            return
+
+        previous = state["fingerprints"]
+        changes = []
+        for entry_id, fp in current.items():
+            if entry_id not in previous:
+                changes.append(("added", entry_id))
+            elif previous[entry_id] != fp:
+                changes.append(("updated", entry_id))
+        for entry_id in previous:
+            if entry_id not in current:
+                changes.append(("removed", entry_id))
+
+        if not changes:
+            return
+
+        version = state["version"] + 1
+        log = state["log"] + [{"version": version, "op": op, "id": int(entry_id)} for op, entry_id in changes]
+        floor = state["floor"]
+        if len(log) > self.limit:
+            log = log[-self.limit:]
+            # The oldest surviving version may have lost some of its records, so only
+            # clients already at (or past) it can still be answered from the log
+            floor = log[0]["version"]
+
+        self._state.save({"version": version, "floor": floor, "fingerprints": current, "log": log})
+
+    def since(self, version):
+        """
+        Returns the net changes after `version`.
+
+        :return: (current_version, changes) where changes maps each touched ID to
+            'added', 'updated' or 'removed', or (current_version, None) when the
+            log no longer reaches back to `version` and the client must resync.
+        """
+        state = self._load_state()
+        if state is None:
+            return 0, None
+        if version < state["floor"] or version > state["version"]:
+            return state["version"], None
+
+        first_op, last_op = {}, {}
+        for record in state["log"]:
+            if record["version"] <= version:
+                continue
+            first_op.setdefault(record["id"], record["op"])
+            last_op[record["id"]] = record["op"]
+
+        changes = {}
+        for entry_id, op in last_op.items():
+            if op == "removed":
+                changes[entry_id] = "removed"
+            elif first_op[entry_id] == "added":
+                changes[entry_id] = "added"
+            else:
+                changes[entry_id] = "updated"
+        return state["version"], changes
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Checks the Discord avatar cache (see avatars.py) against a local stub Discord API.
+
+A small HTTP server on 127.0.0.1 stands in for `GET /api/v10/users/{id}`:
+it knows a few users, counts the requests it gets, can answer slowly, and can
+be switched to rate-limiting (429 with Retry-After). The checks then drive
+`DiscordAvatarCache` (with a fake clock, so TTLs pass instantly) and the
+/api/v1/fetch/discord-avatar route through Flask's test client:
+
+- a second lookup is served from the cache,
+- concurrent misses for one user make a single upstream call,
+- unknown users (404) are cached for the negative TTL, malformed IDs are
+  refused without asking Discord,
+- the cache and the mirror's queued downloads stay within their bounds,
+- a 429 stops upstream calls until Retry-After has passed, serving the
+  expired avatar meanwhile (or a 429 with Retry-After if there is none),
+- the route answers with Cache-Control, and passes Retry-After on,
+- the batch route answers for image and Discord IDs at once, reporting
+  failures per ID, and only looks up the catalog's artists,
+- the prefetch warms every user a few at a time, waiting out 429s, and
+  prefetchers sharing a lock (one per worker process) make one pass between them,
+- avatars (animated ones too) are mirrored by the background job, served
+  from our origin as immutable, and replaced when the avatar hash changes.
+
+Usage:
+    python check_avatars.py
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image
+
+# Importing the app must not start a thumbnail pass
+os.environ.setdefault("THUMBNAIL_WARMUP", "off")
+
+import app as site  # noqa: E402
+from avatars import AvatarLookupError, AvatarMirror, AvatarPrefetch, DiscordAvatarCache, lookup_discord_avatar  # noqa: E402
+from jobqueue import JobQueue  # noqa: E402
+
+API_KEY = "stub-token"
+USERS = {
+    "100000000000000001": {"id": "100000000000000001", "avatar": "0123456789abcdef"},
+    "100000000000000002": {"id": "100000000000000002", "avatar": "a_0123456789abcdef"},
+    "100000000000000003": {"id": "100000000000000003", "avatar": None},
+}
+UNKNOWN_USER = "100000000000000404"
+
+
+# ---- STUB DISCORD API ----
+class StubDiscord:
+    """What the stub server answers, and what it was asked."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.delay = 0.0
+        self.retry_after = None   # set to answer every request with 429
+        self.limit_next = 0       # answer this many more user requests with 429 (Retry-After: 0.2)
+        self.active = 0
+        self.max_active = 0
+
+    def calls(self, discord_id=None):
+        with self.lock:
+            return sum(1 for path in self.requests if discord_id is None or path.endswith(f"/{discord_id}"))
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with stub.lock:
+                stub.requests.append(self.path)
+                stub.active += 1
+                stub.max_active = max(stub.max_active, stub.active)
+            try:
+                time.sleep(stub.delay)
+                self.answer()
+            finally:
+                with stub.lock:
+                    stub.active -= 1
+
+        def answer(self):
+            if self.path.startswith("/cdn/"):
+                return self.image()
+            if self.headers.get("Authorization") != f"Bot {API_KEY}":
+                return self.reply(401, {"message": "401: Unauthorized", "code": 0})
+            if stub.retry_after is not None:
+                return self.reply(429, {"message": "You are being rate limited.", "retry_after": stub.retry_after,
+                                        "global": False}, {"Retry-After": str(stub.retry_after)})
+            with stub.lock:
+                limited, stub.limit_next = stub.limit_next > 0, max(0, stub.limit_next - 1)
+            if limited:
+                return self.reply(429, {"message": "You are being rate limited.", "retry_after": 0.2,
+                                        "global": False}, {"Retry-After": "0.2"})
+            user = USERS.get(self.path.rsplit("/", 1)[-1]) if self.path.startswith("/api/v10/users/") else None
+            if user is None:
+                return self.reply(404, {"message": "Unknown User", "code": 10013})
+            return self.reply(200, user)
+
+        def image(self):
+            """Serves a 128px avatar: a 3-frame GIF for .gif paths, a PNG otherwise."""
+            colors = ["#ff69b4", "#6ec4ff", "#adf573"]
+            frames = [Image.new("RGB", (128, 128), color) for color in colors]
+            out = io.BytesIO()
+            if ".gif" in self.path:
+                frames[0].save(out, format="GIF", save_all=True, append_images=frames[1:], duration=100, loop=0)
+            else:
+                frames[0].save(out, format="PNG")
+            data = out.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/gif" if ".gif" in self.path else "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def reply(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# ---- CHECKS ----
+def new_cache(api_base, clock, **kwargs):
+    cdn_base = api_base.replace("/api/v10", "/cdn")
+    return DiscordAvatarCache(lambda discord_id: lookup_discord_avatar(discord_id, API_KEY, api_base, cdn_base),
+                              ttl=60, negative_ttl=30, clock=clock, **kwargs)
+
+
+def expect(results, name, condition, detail=""):
+    results.append((name, bool(condition), detail))
+
+
+def check_ttl(stub, api_base, results):
+    clock = FakeClock()
+    cache = new_cache(api_base, clock)
+    user = "100000000000000001"
+    first = cache.get(user)
+    second = cache.get(user)
+    expect(results, "fresh lookup is cached", stub.calls(user) == 1 and first == second, f"{stub.calls(user)} calls")
+    expect(results, "avatar URL built from the hash",
+           first["avatarURL"].endswith(f"/avatars/{user}/0123456789abcdef.png?size=128"), first["avatarURL"])
+    clock.now += 61
+    cache.get(user)
+    expect(results, "expired entry is looked up again", stub.calls(user) == 2, f"{stub.calls(user)} calls")
+    default = cache.get("100000000000000003")
+    expect(results, "default avatar for users without one", default["avatarHash"] is None and "embed/avatars" in default["avatarURL"])
+
+
+def check_coalescing(stub, api_base, results):
+    cache = new_cache(api_base, FakeClock())
+    user = "100000000000000002"
+    stub.delay = 0.3
+    answers, errors = [], []
+
+    def lookup():
+        try:
+            answers.append(cache.get(user))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stub.delay = 0.0
+    expect(results, "20 concurrent misses make one upstream call", stub.calls(user) == 1, f"{stub.calls(user)} calls")
+    expect(results, "every waiter gets the answer",
+           len(answers) == 20 and not errors and all(a["isAnimated"] for a in answers), f"{len(answers)} answers, {errors}")
+    expect(results, "coalesced misses are counted", cache.stats()["coalesced"] == 19, cache.stats())
+
+
+def check_negative(stub, api_base, results):
+    clock = FakeClock()
+    cache = new_cache(api_base, clock)
+    statuses = []
+    for _ in range(3):
+        try:
+            cache.get(UNKNOWN_USER)
+        except AvatarLookupError as e:
+            statuses.append(e.status)
+    expect(results, "unknown user is cached as a 404",
+           statuses == [404, 404, 404] and stub.calls(UNKNOWN_USER) == 1, f"{statuses}, {stub.calls(UNKNOWN_USER)} calls")
+    clock.now += 31
+    try:
+        cache.get(UNKNOWN_USER)
+    except AvatarLookupError:
+        pass
+    expect(results, "negative entry expires", stub.calls(UNKNOWN_USER) == 2, f"{stub.calls(UNKNOWN_USER)} calls")
+
+    calls, statuses = stub.calls(), []
+    for discord_id in ("../../users/@me", "12345/../6789", "abc", ""):
+        try:
+            cache.get(discord_id)
+        except AvatarLookupError as e:
+            statuses.append(e.status)
+    expect(results, "malformed IDs are refused without an upstream call",
+           statuses == [400] * 4 and stub.calls() == calls and cache.stats()["entries"] == 1,
+           f"{statuses}, {stub.calls() - calls} calls, {cache.stats()}")
+
+
+def check_bounds(stub, api_base, results):
+    cache = new_cache(api_base, FakeClock(), max_entries=2)
+    first, second, third = "100000000000000001", "100000000000000002", "100000000000000003"
+    cache.get(first)
+    cache.get(second)
+    cache.get(first)    # now the most recently used
+    cache.get(third)
+    calls = stub.calls()
+    cache.get(first)
+    expect(results, "cache keeps the most recently used users", stub.calls() == calls, f"{stub.calls() - calls} calls")
+    calls = stub.calls(second)
+    cache.get(second)
+    stats = cache.stats()
+    expect(results, "cache evicts the least recently used user beyond its bound",
+           stub.calls(second) == calls + 1 and stats["entries"] == 2 and stats["evictions"] == 2, stats)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        mirror = AvatarMirror(tmp, max_queued=3)
+        queued = []
+        for n in range(10):
+            mirror.ensure({"discordID": f"3000000000000000{n:02d}", "avatarHash": None, "isAnimated": False},
+                          queued.append)
+        expect(results, "mirror remembers a bounded number of queued downloads",
+               len(queued) == 10 and len(mirror._queued) == 3, f"{len(queued)} queued, {len(mirror._queued)} remembered")
+
+
+def check_rate_limit(stub, api_base, results):
+    clock = FakeClock()
+    cache = new_cache(api_base, clock)
+    cached_user, new_user = "100000000000000001", "100000000000000002"
+    before = cache.get(cached_user)
+    clock.now += 61
+    calls = stub.calls()
+
+    stub.retry_after = 2.5
+    stale = cache.get(cached_user)
+    expect(results, "429 serves the expired avatar", stale == before)
+    try:
+        cache.get(new_user)
+        retry_after = None
+    except AvatarLookupError as e:
+        retry_after = e.retry_after if e.status == 429 else None
+    expect(results, "429 without a cached avatar carries Retry-After", retry_after and 0 < retry_after <= 2.5, retry_after)
+    cache.get(cached_user)
+    expect(results, "no upstream calls during the backoff", stub.calls() == calls + 1, f"{stub.calls() - calls} calls")
+
+    stub.retry_after = None
+    clock.now += 3
+    cache.get(cached_user)
+    expect(results, "lookups resume after Retry-After", stub.calls() == calls + 2, f"{stub.calls() - calls} calls")
+    expect(results, "stale answers are counted", cache.stats()["stale"] == 2, cache.stats())
+
+
+def check_route(stub, api_base, results):
+    entry = next((e for e in site.load_images() if e.get("discordID")), None)
+    if entry is None:
+        expect(results, "route (no catalog entry with a discordID to test with)", True)
+        return
+    USERS[entry["discordID"]] = {"id": entry["discordID"], "avatar": "fedcba9876543210"}
+    site.DISCORD_API_KEY = API_KEY
+    site.DISCORD_AVATARS = new_cache(api_base, FakeClock())
+    client = site.app.test_client()
+
+    responses = [client.get(f"/api/v1/fetch/discord-avatar?id={entry['id']}") for _ in range(3)]
+    expect(results, "route answers from the cache",
+           all(r.status_code == 200 for r in responses) and stub.calls(entry["discordID"]) == 1,
+           f"{[r.status_code for r in responses]}, {stub.calls(entry['discordID'])} calls")
+    expect(results, "route sets Cache-Control",
+           responses[0].headers.get("Cache-Control") == site.DISCORD_AVATAR_CACHE_CONTROL, responses[0].headers.get("Cache-Control"))
+
+    site.DISCORD_AVATARS = new_cache(api_base, FakeClock())
+    stub.retry_after = 7
+    response = client.get(f"/api/v1/fetch/discord-avatar?id={entry['id']}")
+    stub.retry_after = None
+    expect(results, "route passes 429 and Retry-After on",
+           response.status_code == 429 and response.headers.get("Retry-After") == "7",
+           f"{response.status_code} Retry-After={response.headers.get('Retry-After')}")
+
+
+def check_batch(stub, api_base, results):
+    entry = next((e for e in site.load_images() if e.get("discordID")), None)
+    others = [d for d in site.catalog_discord_ids() if entry and d != entry["discordID"]]
+    if len(others) < 3:
+        expect(results, "batch route (not enough catalog artists with a discordID to test with)", True)
+        return
+    gone = others[2]    # an artist whose Discord account no longer exists
+    for discord_id in (entry["discordID"], *others[:2]):
+        USERS[discord_id] = {"id": discord_id, "avatar": "fedcba9876543210"}
+    USERS.pop(gone, None)
+    site.DISCORD_API_KEY = API_KEY
+    site.DISCORD_AVATARS = new_cache(api_base, FakeClock())
+    client = site.app.test_client()
+
+    stub.delay = 0.2
+    calls = stub.calls()
+    started = time.monotonic()
+    response = client.get(f"/api/v1/fetch/discord-avatars?id={entry['id']}&id=no-such-image"
+                          f"&discordID={others[0]},{others[1]}&discordID={gone}")
+    seconds = time.monotonic() - started
+    stub.delay = 0.0
+    body = response.get_json() or {}
+    expect(results, "batch route answers for image and Discord IDs",
+           response.status_code == 200 and body["images"] == {str(entry["id"]): entry["discordID"]}
+           and set(body["avatars"]) == {entry["discordID"], others[0], others[1]}
+           and "localURL" in body["avatars"][others[0]],
+           body)
+    expect(results, "batch route reports failures per ID",
+           body.get("errors", {}).get("no-such-image", {}).get("status") == 404
+           and body.get("errors", {}).get(gone, {}).get("status") == 404,
+           body.get("errors"))
+    expect(results, "batch route looks users up concurrently",
+           stub.calls() - calls == 4 and seconds < 0.2 * 4, f"{seconds:.2f}s for {stub.calls() - calls} lookups")
+    expect(results, "batch route sets Cache-Control",
+           response.headers.get("Cache-Control") == site.DISCORD_AVATAR_CACHE_CONTROL, response.headers.get("Cache-Control"))
+
+    calls, entries = stub.calls(), site.DISCORD_AVATARS.stats()["entries"]
+    response = client.get(f"/api/v1/fetch/discord-avatars?discordID={UNKNOWN_USER}&discordID=../../users/@me"
+                          f"&discordID=abc,{others[0]}")
+    body = response.get_json() or {}
+    errors = body.get("errors", {})
+    expect(results, "batch route only looks up the catalog's artists",
+           response.status_code == 200 and set(body.get("avatars", {})) == {others[0]}
+           and errors.get(UNKNOWN_USER, {}).get("status") == 404
+           and errors.get("../../users/@me", {}).get("status") == 400 and errors.get("abc", {}).get("status") == 400
+           and stub.calls() == calls and site.DISCORD_AVATARS.stats()["entries"] == entries,
+           f"{body}, {stub.calls() - calls} calls")
+
+    too_many = "&".join(f"discordID={n}" for n in range(site.DISCORD_AVATAR_BATCH_MAX + 1))
+    expect(results, "batch route refuses too many IDs",
+           client.get(f"/api/v1/fetch/discord-avatars?{too_many}").status_code == 400)
+
+
+def check_prefetch(stub, api_base, results):
+    discord_ids = [f"2000000000000000{n:02d}" for n in range(12)]
+    for discord_id in discord_ids:
+        USERS[discord_id] = {"id": discord_id, "avatar": f"{int(discord_id):032x}"}
+    cache = new_cache(api_base, time.monotonic)
+    seen = []
+    prefetch = AvatarPrefetch(cache, concurrency=3, on_avatar=lambda avatar: seen.append(avatar["discordID"]))
+
+    stub.delay = 0.05
+    stub.max_active = 0
+    stub.limit_next = 2
+    thread = prefetch.start(lambda: discord_ids + [UNKNOWN_USER])
+    thread.join(10)
+    stub.delay = 0.0
+    status = prefetch.status()
+    expect(results, "prefetch warms every user, waiting out 429s",
+           status.get("state") == "done" and status.get("found") == 12 and status.get("failed") == 1
+           and sorted(seen) == discord_ids, status)
+    expect(results, "prefetch keeps to its concurrency", 0 < stub.max_active <= 3, f"{stub.max_active} at once")
+    calls = stub.calls()
+    for discord_id in discord_ids:
+        cache.get(discord_id)
+    expect(results, "prefetched avatars are served from the cache", stub.calls() == calls, f"{stub.calls() - calls} calls")
+
+
+def check_prefetch_lock(stub, api_base, results):
+    discord_ids = [f"2100000000000000{n:02d}" for n in range(8)]
+    for discord_id in discord_ids:
+        USERS[discord_id] = {"id": discord_id, "avatar": f"{int(discord_id):032x}"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Two workers' prefetchers: caches of their own, the lock directory in common
+        prefetches = [AvatarPrefetch(new_cache(api_base, time.monotonic), concurrency=2, state_dir=tmp) for _ in range(2)]
+        stub.delay = 0.05
+        threads = [prefetch.start(lambda: discord_ids) for prefetch in prefetches]
+        for thread in threads:
+            thread.join(10)
+        # A worker starting a little later doesn't repeat the pass either
+        late = AvatarPrefetch(new_cache(api_base, time.monotonic), state_dir=tmp).run(discord_ids)
+        stub.delay = 0.0
+        calls = [stub.calls(discord_id) for discord_id in discord_ids]
+        states = sorted(prefetch.status().get("state") for prefetch in prefetches)
+        expect(results, "two prefetchers make one pass: each user is looked up once",
+               calls == [1] * len(discord_ids) and states == ["done", "skipped"] and late["state"] == "skipped",
+               f"{calls}, {states}, late: {late['state']}")
+
+        stale = AvatarPrefetch(new_cache(api_base, time.monotonic), state_dir=tmp, fresh_for=0).run(discord_ids)
+        expect(results, "the next pass runs once the last one is no longer fresh",
+               stale["state"] == "done" and [stub.calls(d) for d in discord_ids] == [2] * len(discord_ids), stale)
+
+
+def check_mirror(stub, api_base, results):
+    entry = next((e for e in site.load_images() if e.get("discordID")), None)
+    if entry is None:
+        expect(results, "mirror (no catalog entry with a discordID to test with)", True)
+        return
+    discord_id = entry["discordID"]
+    url = f"/api/v1/fetch/discord-avatar?id={entry['id']}"
+    clock = FakeClock()
+    site.DISCORD_API_KEY = API_KEY
+    site.DISCORD_AVATARS = new_cache(api_base, clock)
+    site.DISCORD_AVATAR_MIRROR = type(site.DISCORD_AVATAR_MIRROR)(site.DISCORD_AVATAR_MIRROR.mirror_dir)
+    client = site.app.test_client()
+
+    queue = site.JOB_QUEUE
+    queue.run_pending()    # whatever earlier checks queued
+    try:
+        USERS[discord_id] = {"id": discord_id, "avatar": "a_00000000000000000000000000000001"}
+        first = client.get(url).get_json()
+        client.get(url)
+        expect(results, "first answer points at Discord's CDN and queues one download",
+               first["localURL"] is None and queue.stats()["queued"] == 1, f"{first}, {queue.stats()}")
+        queue.run_pending()
+        second = client.get(url).get_json()
+        expect(results, "mirrored avatar is served from our origin",
+               (second["localURL"] or "").startswith("/static/images/artists/discord/") and " 2x" in (second["localSrcset"] or ""),
+               second)
+        response = client.get(second["localURL"])
+        expect(results, "mirrored avatar is cached as immutable",
+               response.status_code == 200 and response.headers.get("Cache-Control") == site.IMMUTABLE_CACHE_CONTROL,
+               f"{response.status_code} {response.headers.get('Cache-Control')}")
+        with Image.open(io.BytesIO(response.get_data())) as im:
+            expect(results, "animated avatar stays animated at the display size",
+                   im.format == "WEBP" and im.size == (56, 56) and getattr(im, "n_frames", 1) == 3,
+                   f"{im.format} {im.size} {getattr(im, 'n_frames', 1)} frames")
+
+        USERS[discord_id] = {"id": discord_id, "avatar": "00000000000000000000000000000002"}
+        clock.now += 61
+        client.get(url)
+        queue.run_pending()
+        third = client.get(url).get_json()
+        names = sorted(p.name for p in site.DISCORD_AVATAR_MIRROR.mirror_dir.glob(f"{discord_id}-*.webp"))
+        expect(results, "changed avatar is mirrored again and the old files removed",
+               third["localURL"] and third["localURL"] != second["localURL"]
+               and names == [f"{discord_id}-{size}-00000000000000000000000000000002.webp" for size in (112, 56)],
+               names)
+    finally:
+        for path in site.DISCORD_AVATAR_MIRROR.mirror_dir.glob(f"{discord_id}-*.webp"):
+            path.unlink()
+
+
+def main():
+    stub = StubDiscord()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}/api/v10"
+
+    results = []
+    tmp = tempfile.TemporaryDirectory()
+    # A queue of our own, so the app's worker thread doesn't pick the mirror downloads up
+    site.JOB_QUEUE = JobQueue(Path(tmp.name) / "jobs.json")
+    site.JOB_QUEUE.register("avatar-mirror", site.avatar_mirror_job)
+    try:
+        for check in (check_ttl, check_coalescing, check_negative, check_bounds, check_rate_limit, check_route,
+                      check_batch, check_prefetch, check_prefetch_lock, check_mirror):
+            check(stub, api_base, results)
+    finally:
+        tmp.cleanup()
+        server.shutdown()
+
+    for name, ok, detail in results:
+        print(f"{'✅' if ok else '❌'} {name}" + ("" if ok or detail == "" else f": {detail}"))
+    failed = sum(1 for _, ok, _ in results if not ok)
+    print(f"\n{len(results) - failed}/{len(results)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
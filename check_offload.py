@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Checks the file offload headers (see offload.py) without a proxy in front.
+
+The app is driven through Flask's test client once per offload mode. For
+every catalog image (original, thumbnail and derivatives) and artist picture,
+the check asserts that:
+
+- the response is an empty 200 with the image's Content-Type,
+- X-Accel-Redirect / X-Sendfile is set and resolves back to that exact file
+  (for nginx: the prefix mapped onto static/, as the internal location does),
+- a fingerprinted URL keeps its immutable Cache-Control.
+
+It also checks that non-image static files are still served by Flask, that
+missing files and path traversal get a 404 without an offload header, and that
+with offloading off the images are streamed as before.
+
+Usage:
+    python check_offload.py [--mode nginx|sendfile|off|all] [--prefix /_protected] [--limit N] [-v]
+"""
+
+import argparse
+import mimetypes
+import os
+import sys
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+# Importing the app must not start a thumbnail pass
+os.environ.setdefault("THUMBNAIL_WARMUP", "off")
+
+import app as site  # noqa: E402
+from offload import DEFAULT_ACCEL_PREFIX, FileOffload  # noqa: E402
+from thumbnails import iter_images, thumb_path  # noqa: E402
+
+STATIC_DIR = site.BASE_DIR / "static"
+OFFLOAD_HEADERS = ("X-Accel-Redirect", "X-Sendfile")
+
+
+def static_url(path):
+    return "/static/" + quote(Path(path).relative_to(STATIC_DIR).as_posix())
+
+
+def resolve(offload, response):
+    """Maps the response's offload header back to the file the proxy would send (or None)."""
+    if offload.mode == "nginx":
+        uri = unquote(response.headers.get("X-Accel-Redirect", ""))
+        if not uri.startswith(offload.prefix + "/"):
+            return None
+        return (STATIC_DIR / uri[len(offload.prefix) + 1:]).resolve()
+    value = response.headers.get("X-Sendfile")
+    return Path(unquote(value)).resolve() if value else None
+
+
+def image_files(limit=None):
+    """Yields (file, fingerprint) for the catalog's originals, thumbnails and derivatives plus the artist pictures."""
+    for item in list(iter_images(site.load_images()))[:limit]:
+        fingerprint = item.get("fingerprint")
+        yield site.STATIC_IMAGES_DIR / item["filename"], fingerprint
+        yield thumb_path(site.THUMBS_DIR, item["filename"]), fingerprint
+        derivatives = item.get("derivatives") or {}
+        for width in derivatives.get("widths", []):
+            for fmt in derivatives.get("formats", []):
+                yield site.STATIC_IMAGES_DIR / f"{derivatives['path']}-{width}.{fmt}", fingerprint
+    for path in sorted(site.ARTISTS_DIR.iterdir())[:limit]:
+        if path.is_file():
+            yield path, None
+
+
+# ---- CHECKS ----
+def check_offloaded(client, offload, path, fingerprint):
+    url = static_url(path)
+    if fingerprint:
+        url += f"?v={fingerprint}"
+    response = client.get(url)
+    problems = []
+    if response.status_code != 200:
+        problems.append(f"status {response.status_code}")
+    if response.get_data():
+        problems.append("body is not empty")
+    if resolve(offload, response) != path.resolve():
+        problems.append(f"header points at {resolve(offload, response)}")
+    if response.mimetype != (mimetypes.guess_type(path.name)[0] or "application/octet-stream"):
+        problems.append(f"Content-Type {response.mimetype}")
+    if fingerprint and response.headers.get("Cache-Control") != site.IMMUTABLE_CACHE_CONTROL:
+        problems.append(f"Cache-Control {response.headers.get('Cache-Control')}")
+    return url, problems
+
+
+def check_not_offloaded(client, url, status, body=None):
+    response = client.get(url)
+    problems = []
+    if response.status_code != status:
+        problems.append(f"status {response.status_code} (expected {status})")
+    if any(header in response.headers for header in OFFLOAD_HEADERS):
+        problems.append("offload header set")
+    if body is not None and response.get_data() != body:
+        problems.append("body differs from the file")
+    return url, problems
+
+
+def run_mode(client, mode, prefix, limit):
+    offload = FileOffload(mode, STATIC_DIR, prefix)
+    site.FILE_OFFLOAD = offload
+    results = []
+    images = [(path, fingerprint) for path, fingerprint in image_files(limit) if path.is_file()]
+
+    if offload.enabled:
+        for path, fingerprint in images:
+            results.append(check_offloaded(client, offload, path, fingerprint))
+    else:
+        for path, _ in images[:5]:
+            results.append(check_not_offloaded(client, static_url(path), 200, path.read_bytes()))
+
+    css = STATIC_DIR / "css" / "style.css"
+    results.append(check_not_offloaded(client, static_url(css), 200, css.read_bytes()))
+    results.append(check_not_offloaded(client, "/static/images/does-not-exist.png", 404))
+    results.append(check_not_offloaded(client, "/static/images/..%2F..%2Fapp.py", 404))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the X-Accel-Redirect / X-Sendfile offload headers")
+    parser.add_argument("--mode", choices=("nginx", "sendfile", "off", "all"), default="all")
+    parser.add_argument("--prefix", default=DEFAULT_ACCEL_PREFIX, help="nginx internal location prefix")
+    parser.add_argument("--limit", type=int, default=None, help="Only check the first N catalog images")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List passing requests too")
+    args = parser.parse_args()
+
+    client = site.app.test_client()
+    failed = 0
+    for mode in (("off", "nginx", "sendfile") if args.mode == "all" else (args.mode,)):
+        results = run_mode(client, mode, args.prefix, args.limit)
+        for url, problems in results:
+            if problems:
+                print(f"❌ [{mode}] {url}: {', '.join(problems)}")
+            elif args.verbose:
+                print(f"✅ [{mode}] {url}")
+        mode_failed = sum(1 for _, problems in results if problems)
+        failed += mode_failed
+        print(f"[{mode}] {len(results) - mode_failed}/{len(results)} requests OK")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Checks the outbound HTTP client (see httpclient.py) against a local stub server.
+
+A small HTTP/1.1 server on 127.0.0.1 counts the connections it accepts and
+the requests it gets, and its paths answer slowly, fail a few times before
+succeeding, or always fail. The checks drive `UpstreamClient` (with a fake
+clock for the circuit breaker and no sleeping between retries):
+
+- sequential requests reuse one keep-alive connection,
+- a read timeout ends a slow request instead of waiting for it,
+- GETs are retried on 503 and connection errors, POSTs are not,
+- 4xx answers are returned as they are, without retries,
+- repeated failures open the circuit (requests fail without being sent),
+  and after the reset timeout one trial request closes it again,
+- the stats count requests, retries, errors, statuses and latencies,
+- the OIDC callback and the Discord lookup go through their clients.
+
+Usage:
+    python check_upstreams.py
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# Importing the app must not start a thumbnail pass
+os.environ.setdefault("THUMBNAIL_WARMUP", "off")
+
+import app as site  # noqa: E402
+from avatars import AvatarLookupError, lookup_discord_avatar  # noqa: E402
+from httpclient import CircuitBreaker, CircuitOpenError, UpstreamClient  # noqa: E402
+
+
+# ---- STUB UPSTREAM ----
+class StubUpstream:
+    """What the stub server answers, and what it was asked."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []
+        self.failures_left = {}   # path: 503s to answer before succeeding
+
+    def calls(self, path=None):
+        with self.lock:
+            return sum(1 for (_, p) in self.requests if path is None or p == path)
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with stub.lock:
+                stub.connections += 1
+
+        def do_GET(self):
+            self.answer()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.answer()
+
+        def answer(self):
+            with stub.lock:
+                stub.requests.append((self.command, self.path))
+                failures = stub.failures_left.get(self.path, 0)
+                if failures:
+                    stub.failures_left[self.path] = failures - 1
+            if self.path == "/slow":
+                time.sleep(1.0)
+            if failures or self.path.startswith("/down"):
+                return self.reply(503, {"error": "unavailable"})
+            if self.path == "/missing":
+                return self.reply(404, {"error": "not found"})
+            if self.path == "/token":
+                return self.reply(200, {"access_token": "stub-access-token"})
+            if self.path == "/userinfo":
+                return self.reply(200, {"preferred_username": "stub-admin"})
+            return self.reply(200, {"ok": True})
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except BrokenPipeError:
+                pass    # the client timed out
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# ---- CHECKS ----
+def new_client(name="stub", clock=None, **kwargs):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock or FakeClock())
+    return UpstreamClient(name, breaker=breaker, sleep=lambda seconds: None, **kwargs)
+
+
+def expect(results, name, condition, detail=""):
+    results.append((name, bool(condition), detail))
+
+
+def check_keep_alive(stub, base, results):
+    client = new_client()
+    before = stub.connections
+    statuses = [client.get(f"{base}/ok").status_code for _ in range(10)]
+    expect(results, "10 requests share one keep-alive connection",
+           statuses == [200] * 10 and stub.connections - before == 1, f"{stub.connections - before} connections")
+    client.close()
+
+
+def check_timeout(stub, base, results):
+    client = new_client(timeout=(1, 0.2), retries=0)
+    started = time.monotonic()
+    try:
+        client.get(f"{base}/slow")
+        raised = None
+    except requests.exceptions.Timeout as e:
+        raised = e
+    seconds = time.monotonic() - started
+    expect(results, "read timeout ends a slow request", raised is not None and seconds < 0.8, f"{seconds:.2f}s")
+    client.close()
+
+
+def check_retries(stub, base, results):
+    client = new_client()
+    stub.failures_left["/flaky"] = 2
+    response = client.get(f"{base}/flaky")
+    expect(results, "GET is retried on 503 until it succeeds",
+           response.status_code == 200 and stub.calls("/flaky") == 3, f"{response.status_code}, {stub.calls('/flaky')} calls")
+
+    stub.failures_left["/flaky-post"] = 1
+    response = client.post(f"{base}/flaky-post", data={"code": "once"})
+    expect(results, "POST is not retried",
+           response.status_code == 503 and stub.calls("/flaky-post") == 1, f"{response.status_code}, {stub.calls('/flaky-post')} calls")
+
+    response = client.get(f"{base}/missing")
+    expect(results, "4xx is returned without retries",
+           response.status_code == 404 and stub.calls("/missing") == 1, f"{response.status_code}, {stub.calls('/missing')} calls")
+
+    unreachable = new_client()
+    try:
+        unreachable.get("http://127.0.0.1:9/")
+        raised = None
+    except requests.exceptions.ConnectionError as e:
+        raised = e
+    stats = unreachable.stats()
+    expect(results, "connection errors are retried, then raised",
+           raised is not None and stats["requests"] == 3 and stats["retries"] == 2, stats)
+    client.close()
+
+
+def check_circuit(stub, base, results):
+    clock = FakeClock()
+    client = new_client(clock=clock, retries=0)
+    for _ in range(3):
+        client.get(f"{base}/down")
+    calls = stub.calls("/down")
+    try:
+        client.get(f"{base}/down")
+        retry_after = None
+    except CircuitOpenError as e:
+        retry_after = e.retry_after
+    expect(results, "repeated failures open the circuit",
+           retry_after == 30 and stub.calls("/down") == calls and client.stats()["circuit"] == "open",
+           f"retry_after={retry_after}, {client.stats()['circuit']}")
+
+    clock.now += 31
+    expect(results, "circuit is half-open after the reset timeout", client.stats()["circuit"] == "half-open")
+    client.get(f"{base}/down")
+    expect(results, "a failed trial request reopens it", client.stats()["circuit"] == "open", client.stats()["circuit"])
+
+    clock.now += 31
+    response = client.get(f"{base}/ok")
+    expect(results, "a successful trial request closes it",
+           response.status_code == 200 and client.stats()["circuit"] == "closed", client.stats()["circuit"])
+
+    stats = client.stats()
+    expect(results, "stats count requests, errors, rejections and statuses",
+           stats["requests"] == 5 and stats["errors"] == 4 and stats["rejected"] == 1
+           and stats["statuses"] == {"503": 4, "200": 1} and stats["circuitOpened"] == 2
+           and stats["latencyMs"]["p50"] is not None, stats)
+    client.close()
+
+
+def check_app(stub, base, results):
+    calls = stub.calls()
+    site.OIDC_CLIENT = new_client("oidc")
+    site.OIDC_TOKEN_ENDPOINT = f"{base}/token"
+    site.OIDC_USERINFO_ENDPOINT = f"{base}/userinfo"
+    client = site.app.test_client()
+    with client.session_transaction() as session:
+        session["oauth_state"] = "stub-state"
+    response = client.get("/api/v1/oauth/callback?code=stub-code&state=stub-state")
+    with client.session_transaction() as session:
+        username = session.get("username")
+    expect(results, "OIDC callback goes through the OIDC client",
+           response.status_code == 302 and username == "stub-admin" and site.OIDC_CLIENT.stats()["requests"] == 2
+           and stub.calls() == calls + 2, f"{response.status_code} {username} {site.OIDC_CLIENT.stats()}")
+
+    clock = FakeClock()
+    discord = new_client("discord-api", clock=clock, retries=0)
+    for _ in range(3):
+        try:
+            lookup_discord_avatar("100000000000000001", "stub-token", f"{base}/down", base, client=discord)
+        except AvatarLookupError:
+            pass
+    try:
+        lookup_discord_avatar("100000000000000001", "stub-token", f"{base}/down", base, client=discord)
+        error = None
+    except AvatarLookupError as e:
+        error = e
+    discord.close()
+    expect(results, "Discord lookups answer 503 with Retry-After while the circuit is open",
+           error is not None and error.status == 503 and error.retry_after == 30,
+           error and (error.status, error.retry_after))
+
+
+def main():
+    # The OIDC check drives a login session; no APP_SECRET_KEY is needed for that
+    site.app.secret_key = site.app.secret_key or "check-upstreams"
+    stub = StubUpstream()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    results = []
+    try:
+        for check in (check_keep_alive, check_timeout, check_retries, check_circuit, check_app):
+            check(stub, base, results)
+    finally:
+        server.shutdown()
+
+    for name, ok, detail in results:
+        print(f"{'✅' if ok else '❌'} {name}" + ("" if ok or detail == "" else f": {detail}"))
+    failed = sum(1 for _, ok, _ in results if not ok)
+    print(f"\n{len(results) - failed}/{len(results)} checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
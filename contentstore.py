@@ -0,0 +1,201 @@
+"""
+Content-addressed storage for uploaded images, shared by app.py and artmgr.py.
+
+Uploads are streamed into static/images while being hashed (SHA-256). If a
+file with the same contents is already there, the upload is dropped and the
+existing file (with its thumbnail and derivatives, which are keyed by file
+name) is reused instead of being saved again as `name_1.png`.
+
+The thumbnail manifest doubles as the hash index: it already records the
+SHA-256, size and mtime of every rendered source, so only files of the same
+size as the upload are looked at, and only files the manifest doesn't know
+(or that changed since) are hashed again.
+"""
+
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from thumbnails import file_sha256
+
+CHUNK_SIZE = 1 << 20
+
+
+class StoredUpload:
+    """
+    Where an upload ended up.
+
+    :param filename: Name of the file in the images directory.
+    :param sha256: Hex SHA-256 of the contents.
+    :param size: Size in bytes.
+    :param duplicate: True if an existing file with the same contents was reused.
+    """
+
+    def __init__(self, filename, sha256, size, duplicate=False):
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+        self.duplicate = duplicate
+
+
+def _known_hashes(manifest):
+    """Returns {source filename: manifest record} for hash lookups."""
+    if manifest is None:
+        return {}
+    return {record["source"]: record for record in manifest.records().values()}
+
+
+def _content_hash(path, st, known):
+    """Returns the SHA-256 of `path`, from the manifest when its size and mtime still match."""
+    record = known.get(path.name)
+    if record and record.get("size") == st.st_size and record.get("mtimeNs") == st.st_mtime_ns and record.get("sha256"):
+        return record["sha256"]
+    return file_sha256(path)
+
+
+def find_by_hash(images_dir, sha256, size, manifest=None):
+    """
+    Returns the name of a file in `images_dir` with the given contents, or None.
+
+    :param sha256: Hex SHA-256 to look for.
+    :param size: Size in bytes (files of any other size are skipped without hashing).
+    :param manifest: Optional `ThumbnailManifest` to take known hashes from.
+    """
+    known = None
+    for path in sorted(Path(images_dir).iterdir()):
+        if path.name.startswith(".") or not path.is_file():
+            continue
+        st = path.stat()
+        if st.st_size != size:
+            continue
+        if known is None:
+            known = _known_hashes(manifest)
+        if _content_hash(path, st, known) == sha256:
+            return path.name
+    return None
+
+
+def _unique_path(images_dir, filename):
+    """Returns a path for `filename` that doesn't exist yet, appending _1, _2... to the stem."""
+    path = Path(images_dir) / filename
+    counter = 1
+    while path.exists():
+        path = Path(images_dir) / f"{Path(filename).stem}_{counter}{Path(filename).suffix}"
+        counter += 1
+    return path
+
+
+class StagedUpload:
+    """
+    An upload streamed to a temporary file in the images directory, not placed yet.
+
+    :param path: The temporary file.
+    :param sha256: Hex SHA-256 of the contents.
+    :param size: Size in bytes.
+    """
+
+    def __init__(self, path, sha256, size):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+
+@contextmanager
+def staged_upload(stream, images_dir):
+    """
+    Streams an upload to a temporary file while hashing it, and removes the file on exit
+    unless `store_upload()` placed it.
+
+    This is the slow part of an upload, so it runs before taking the catalog lock.
+
+    :param stream: Binary file-like object to read the upload from.
+    :param images_dir: Directory the images live in (the temporary file is created there,
+        so placing it is a rename).
+    :return: A `StagedUpload`.
+    """
+    images_dir = Path(images_dir)
+    tmp_path = images_dir / f".upload.{uuid.uuid4().hex}.tmp"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        yield StagedUpload(tmp_path, digest.hexdigest(), size)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def store_upload(staged, images_dir, filename, manifest=None):
+    """
+    Places a staged upload in `images_dir`, or reuses an existing file with the same contents.
+
+    Callers should hold the art catalog's transaction so two identical uploads
+    can't both miss each other.
+
+    :param staged: The `StagedUpload` from `staged_upload()`.
+    :param images_dir: Directory the images live in.
+    :param filename: The (already sanitized) name to store a new file under.
+    :param manifest: Optional `ThumbnailManifest` to take known hashes from.
+    :return: A `StoredUpload`.
+    """
+    existing = find_by_hash(images_dir, staged.sha256, staged.size, manifest)
+    if existing is not None:
+        return StoredUpload(existing, staged.sha256, staged.size, duplicate=True)
+
+    path = _unique_path(images_dir, filename)
+    os.chmod(staged.path, 0o644)
+    os.replace(staged.path, path)
+    return StoredUpload(path.name, staged.sha256, staged.size)
+
+
+def catalog_items(art_list):
+    """Yields (display ID, item) for every entry and alternate, e.g. (12, entry) or ('12-001', alt)."""
+    for entry in art_list:
+        yield entry["id"], entry
+        for alt in entry.get("alternates", []):
+            yield f"{entry['id']}-{alt['id']}", alt
+
+
+def items_by_file(art_list):
+    """Returns {file name: [display IDs of the entries and alternates using it]}."""
+    by_file = {}
+    for item_id, item in catalog_items(art_list):
+        if item.get("filename"):
+            by_file.setdefault(item["filename"], []).append(item_id)
+    return by_file
+
+
+def shared_files(art_list, images_dir, manifest=None):
+    """
+    Finds catalog items that show the same image: the same file, or files with identical contents.
+
+    :param art_list: The art catalog.
+    :param images_dir: Directory the images live in.
+    :param manifest: Optional `ThumbnailManifest` to take known hashes from.
+    :return: [{"sha256", "size", "files": [names], "items": [display IDs]}] for every
+        set of contents used by more than one item, largest sets first.
+    """
+    by_file = items_by_file(art_list)
+    known = _known_hashes(manifest)
+    groups = {}
+    for filename, item_ids in by_file.items():
+        path = Path(images_dir) / filename
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        group = groups.setdefault(_content_hash(path, st, known), {"size": st.st_size, "files": [], "items": []})
+        group["files"].append(filename)
+        group["items"].extend(item_ids)
+
+    shared = [
+        {"sha256": sha256, **group}
+        for sha256, group in groups.items() if len(group["items"]) > 1
+    ]
+    shared.sort(key=lambda group: -len(group["items"]))
+    return shared
@@ -0,0 +1,241 @@
+"""
+Outbound HTTP for the app's upstreams (Discord, the OIDC provider).
+
+Each upstream gets one `UpstreamClient`: a `requests.Session` whose
+keep-alive connection pools (one per host) are reused across requests and
+threads, so only the first call to a host pays for the TCP and TLS
+handshakes. On top of the session every request gets:
+
+- connect and read timeouts, so a slow upstream can't hold a worker
+  indefinitely,
+- bounded retries with full jitter for idempotent requests that failed to
+  connect, timed out, or got a 502/503/504 (never for POST, whose effects,
+  like redeeming an authorization code, may not be repeatable),
+- a circuit breaker: after a run of consecutive failures, requests fail
+  right away with `CircuitOpenError` until the upstream has had some time
+  to recover, then a single trial request decides whether it is back,
+- latency, status and error counters per upstream (see `stats()`).
+
+4xx answers (429 included) are passed back to the caller: they are answers,
+not failures of the upstream, and rate limits are handled by the callers.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+# Extra attempts after the first, for idempotent requests
+DEFAULT_RETRIES = 2
+# Retry delays are drawn from [0, RETRY_BACKOFF * 2**attempt), capped at RETRY_BACKOFF_MAX
+RETRY_BACKOFF = 0.25
+RETRY_BACKOFF_MAX = 2.0
+RETRY_STATUSES = frozenset((502, 503, 504))
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+# Connections kept alive per host
+POOL_SIZE = 10
+# Consecutive failures that open the circuit, and seconds it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+# Latencies kept for the percentiles in stats()
+LATENCY_SAMPLES = 200
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    A request refused without being sent, because its upstream keeps failing.
+
+    :param upstream: The upstream's name.
+    :param retry_after: Seconds until a trial request is let through.
+    """
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"{upstream} is unavailable (circuit open for another {retry_after:.1f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed (requests go through) until `failure_threshold` consecutive failures, then open
+    for `reset_timeout` seconds, then half-open: one trial request closes it again on success
+    or reopens it on failure.
+
+    :param clock: Monotonic clock (seconds), replaceable for tests.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """
+        Returns 0 if a request may be sent, else the seconds until one may.
+        In the half-open state only one caller at a time gets through.
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return 0
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return 0
+            remaining = self._opened_at + self.reset_timeout - self._clock()
+            # A trial request is still running: try again in a moment
+            return remaining if remaining > 0 else 1.0
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        """Counts a failure; returns True if it opened the circuit."""
+        with self._lock:
+            self._failures += 1
+            reopen = self._trial or (self._opened_at is None and self._failures >= self.failure_threshold)
+            self._trial = False
+            if reopen:
+                self._opened_at = self._clock()
+                self.opened += 1
+            return reopen
+
+
+class UpstreamClient:
+    """
+    A pooled, timeout-bounded HTTP client for one upstream.
+
+    :param name: Name used in logs and stats, e.g. 'discord-api'.
+    :param timeout: Default (connect, read) timeout in seconds.
+    :param retries: Extra attempts for idempotent requests.
+    :param pool_size: Keep-alive connections per host.
+    :param headers: Headers sent with every request (e.g. a User-Agent).
+    :param verify: TLS verification for every request (False or a CA bundle path).
+    :param breaker: The `CircuitBreaker` to use (a default one if None).
+    :param sleep: Sleep function between retries, replaceable for tests.
+    """
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, pool_size=POOL_SIZE,
+                 headers=None, verify=True, breaker=None, sleep=time.sleep):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.headers.update(headers or {})
+        # Retries are ours (with jitter and breaker bookkeeping), not urllib3's
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._stats = {"requests": 0, "retries": 0, "errors": 0, "rejected": 0, "statuses": {}}
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, retry=None, **kwargs):
+        """
+        Sends a request through the session (see `requests.Session.request()` for `kwargs`).
+
+        :param retry: Whether failed attempts are retried (default: for idempotent methods).
+        :return: The `requests.Response` (any status; 4xx and final 5xx answers included).
+        :raises CircuitOpenError: If the upstream's circuit is open.
+        :raises requests.exceptions.RequestException: If the last attempt failed to connect or timed out.
+        """
+        method = method.upper()
+        attempts = 1 + (self.retries if (method in IDEMPOTENT_METHODS if retry is None else retry) else 0)
+        kwargs.setdefault("timeout", self.timeout)
+
+        for attempt in range(attempts):
+            wait = self.breaker.allow()
+            if wait:
+                with self._lock:
+                    self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, wait)
+
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record(time.monotonic() - started, None)
+                self._failed(f"{method} {url} failed: {e}")
+                if attempt + 1 >= attempts:
+                    raise
+            else:
+                self._record(time.monotonic() - started, response.status_code)
+                if response.status_code < 500:
+                    self.breaker.success()
+                    return response
+                self._failed(f"{method} {url} answered {response.status_code}")
+                if attempt + 1 >= attempts or response.status_code not in RETRY_STATUSES:
+                    return response
+                response.close()
+
+            with self._lock:
+                self._stats["retries"] += 1
+            self._sleep(random.uniform(0, min(RETRY_BACKOFF * 2 ** attempt, RETRY_BACKOFF_MAX)))
+
+    def _record(self, seconds, status):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._latencies.append(seconds)
+            key = str(status) if status is not None else "error"
+            self._stats["statuses"][key] = self._stats["statuses"].get(key, 0) + 1
+
+    def _failed(self, message):
+        with self._lock:
+            self._stats["errors"] += 1
+        if self.breaker.failure():
+            logging.warning(f"{self.name}: {message}; circuit open for {self.breaker.reset_timeout}s")
+        else:
+            logging.debug(f"{self.name}: {message}")
+
+    def stats(self):
+        """Returns request/retry/error counters, status counts, recent latencies (ms) and the circuit state."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {**self._stats, "statuses": dict(self._stats["statuses"])}
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+        return {
+            **stats,
+            "latencyMs": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+            "circuit": self.breaker.state,
+            "circuitOpened": self.breaker.opened,
+        }
+
+    def close(self):
+        self.session.close()
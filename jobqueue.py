@@ -0,0 +1,248 @@
+"""
+Persistent background job queue for work that shouldn't block a request.
+
+Jobs live in a small JSON file (data/jobs.json) saved through `Catalog`, so
+every gunicorn worker and artmgr sees the same queue, and a restart loses
+nothing: queued jobs are picked up by the next worker thread, and jobs that
+were running in a process that has since died are put back in the queue.
+
+Each process runs one daemon worker thread. Jobs are claimed under the
+catalog's file lock, so each one runs in exactly one process, and failed jobs
+are retried with a growing delay before they are marked as failed.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from catalog import Catalog
+
+JOB_POLL_INTERVAL = 2.0
+JOB_MAX_ATTEMPTS = 3
+# Seconds before a failed job is retried (multiplied by the number of attempts so far)
+JOB_RETRY_DELAY = 5
+# Finished and failed jobs are dropped after this many seconds
+JOB_RETENTION = 24 * 60 * 60
+
+# Fields returned by `JobQueue.get()` (the claim bookkeeping stays internal)
+PUBLIC_FIELDS = ("id", "kind", "status", "attempts", "createdAt", "startedAt", "finishedAt", "error", "result")
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    A file-backed queue of {kind, args} jobs run by handlers registered per kind.
+
+    Job statuses: 'queued' -> 'running' -> 'done' | 'failed'
+    (a failing job goes back to 'queued' until it runs out of attempts).
+
+    :param path: Path to the state file (e.g. data/jobs.json).
+    :param poll_interval: Seconds between checks for jobs queued by other processes.
+    :param max_attempts: How often a job is tried before it is marked as failed.
+    """
+
+    def __init__(self, path, poll_interval=JOB_POLL_INTERVAL, max_attempts=JOB_MAX_ATTEMPTS):
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.host = socket.gethostname()
+        # Tells this process's claims apart from a dead process that had the same PID
+        self.token = uuid.uuid4().hex
+        self._catalog = Catalog(path, indent=None)
+        self._handlers = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, kind, handler):
+        """
+        Registers the handler for a job kind. Only processes that registered a
+        kind run jobs of that kind.
+
+        :param kind: The job kind (e.g. 'thumbnails').
+        :param handler: Callable(**args) returning a JSON-serializable result (or None).
+        """
+        self._handlers[kind] = handler
+
+    # --- STATE ---
+    def _jobs(self):
+        """Returns a shallow copy of {job id: job}; replace jobs instead of mutating them."""
+        try:
+            return dict(self._catalog.get())
+        except FileNotFoundError:
+            return {}
+
+    def _prune(self, jobs, now):
+        expired = [
+            job_id for job_id, job in jobs.items()
+            if job["status"] in ("done", "failed") and now - (job["finishedAt"] or 0) > JOB_RETENTION
+        ]
+        for job_id in expired:
+            del jobs[job_id]
+        return bool(expired)
+
+    def _recover(self, jobs, now):
+        """Re-queues running jobs whose process on this host is gone."""
+        recovered = False
+        for job_id, job in jobs.items():
+            owner = job.get("owner")
+            if job["status"] != "running" or not owner or owner["token"] == self.token or owner["host"] != self.host:
+                continue
+            if owner["pid"] != os.getpid() and _process_alive(owner["pid"]):
+                continue
+            logging.warning(f"Re-queueing job {job_id} ({job['kind']}); its worker process is gone")
+            jobs[job_id] = self._failed(job, "worker process exited while the job was running", now)
+            recovered = True
+        return recovered
+
+    def _failed(self, job, error, now):
+        """Returns the job re-queued for a retry, or marked failed once it is out of attempts."""
+        if job["attempts"] < self.max_attempts:
+            return {**job, "status": "queued", "owner": None, "error": error,
+                    "runAfter": now + JOB_RETRY_DELAY * job["attempts"]}
+        return {**job, "status": "failed", "owner": None, "error": error, "finishedAt": now}
+
+    # --- QUEUEING ---
+    def enqueue(self, kind, **args):
+        """
+        Adds a job and wakes this process's worker.
+
+        :param kind: The job kind; a handler must be registered for it in at least one process.
+        :param args: Keyword arguments for the handler (must be JSON-serializable).
+        :return: The new job (see `get()`).
+        """
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "args": args,
+            "status": "queued",
+            "attempts": 0,
+            "createdAt": now,
+            "startedAt": None,
+            "finishedAt": None,
+            "runAfter": now,
+            "owner": None,
+            "error": None,
+            "result": None,
+        }
+        with self._catalog.transaction():
+            jobs = self._jobs()
+            self._prune(jobs, now)
+            jobs[job["id"]] = job
+            self._catalog.save(jobs)
+        self._wake.set()
+        return {field: job[field] for field in PUBLIC_FIELDS}
+
+    def get(self, job_id):
+        """Returns the public fields of a job, or None if it is unknown (or expired)."""
+        job = self._jobs().get(job_id)
+        if job is None:
+            return None
+        return {field: job[field] for field in PUBLIC_FIELDS}
+
+    def stats(self):
+        """Returns the number of jobs per status."""
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in self._jobs().values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    # --- WORKER ---
+    def _claim(self):
+        """Marks the oldest runnable job as running in this process and returns it (or None)."""
+        now = time.time()
+
+        def runnable(job):
+            return job["status"] == "queued" and job["kind"] in self._handlers and job["runAfter"] <= now
+
+        # Cheap unlocked look first; most polls find nothing to do
+        if not any(runnable(job) or job["status"] == "running" for job in self._jobs().values()):
+            return None
+
+        with self._catalog.transaction():
+            jobs = self._jobs()
+            changed = self._recover(jobs, now)
+            changed = self._prune(jobs, now) or changed
+            candidates = sorted((job for job in jobs.values() if runnable(job)), key=lambda job: job["createdAt"])
+            claimed = None
+            if candidates:
+                claimed = {
+                    **candidates[0],
+                    "status": "running",
+                    "attempts": candidates[0]["attempts"] + 1,
+                    "startedAt": now,
+                    "owner": {"host": self.host, "pid": os.getpid(), "token": self.token},
+                }
+                jobs[claimed["id"]] = claimed
+            if changed or claimed:
+                self._catalog.save(jobs)
+            return claimed
+
+    def _finish(self, job_id, result=None, error=None):
+        now = time.time()
+        with self._catalog.transaction():
+            jobs = self._jobs()
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            if error is None:
+                jobs[job_id] = {**job, "status": "done", "owner": None, "error": None,
+                                "result": result, "finishedAt": now}
+            else:
+                jobs[job_id] = self._failed(job, error, now)
+            self._catalog.save(jobs)
+
+    def run_pending(self):
+        """
+        Runs runnable jobs in the calling thread until there are none left.
+
+        :return: The number of jobs run.
+        """
+        count = 0
+        while True:
+            job = self._claim()
+            if job is None:
+                return count
+            count += 1
+            started = time.monotonic()
+            try:
+                result = self._handlers[job["kind"]](**job["args"])
+            except Exception as e:
+                logging.exception(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}")
+                self._finish(job["id"], error=str(e) or type(e).__name__)
+            else:
+                self._finish(job["id"], result=result)
+                logging.info(f"Job {job['id']} ({job['kind']}) done in {time.monotonic() - started:.2f}s")
+
+    def start(self):
+        """
+        Starts this process's worker thread (once).
+
+        :return: The worker thread.
+        """
+        if self._thread is not None:
+            return self._thread
+
+        def work():
+            while True:
+                try:
+                    self.run_pending()
+                except Exception:
+                    logging.exception("Job queue worker error")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=work, name="job-queue", daemon=True)
+        self._thread.start()
+        return self._thread
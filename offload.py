@@ -0,0 +1,66 @@
+"""
+Hands file transfers off to the front proxy instead of streaming them through a worker.
+
+With offloading on, a request for a file gets an empty response carrying a
+header that tells the proxy which file to send; the proxy then pushes the
+bytes (and handles ranges), while the gunicorn worker is free again right away:
+
+- nginx: `X-Accel-Redirect: <prefix>/<path>`, served by an internal location
+  that maps the prefix back onto the same directory:
+
+      location /_protected/ {
+          internal;
+          alias /srv/zsfursonasite/static/;
+      }
+
+- sendfile: `X-Sendfile: <absolute path>` for Apache's mod_xsendfile (or
+  lighttpd). The path is percent-encoded, which mod_xsendfile decodes by
+  default (XSendFileUnescape On).
+
+Response headers set by the app (Content-Type, Cache-Control) are kept by
+both proxies.
+"""
+
+from pathlib import Path
+from urllib.parse import quote
+
+OFFLOAD_MODES = ("off", "nginx", "sendfile")
+DEFAULT_ACCEL_PREFIX = "/_protected"
+
+
+class FileOffload:
+    """
+    Builds the offload headers for files under one root directory.
+
+    :param mode: 'off', 'nginx' (X-Accel-Redirect) or 'sendfile' (X-Sendfile).
+    :param root: Directory the proxy's internal location (or sendfile whitelist) points at.
+    :param prefix: URI prefix of the nginx internal location for `root`.
+    """
+
+    def __init__(self, mode="off", root=".", prefix=DEFAULT_ACCEL_PREFIX):
+        mode = (mode or "off").strip().lower()
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"Unknown file offload mode {mode!r} (expected one of {', '.join(OFFLOAD_MODES)})")
+        self.mode = mode
+        self.root = Path(root).resolve()
+        self.prefix = "/" + prefix.strip("/")
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def headers(self, path):
+        """
+        Returns the headers that make the proxy send `path`.
+
+        :param path: The file to send; must be inside `root`.
+        :return: {"X-Accel-Redirect": uri} or {"X-Sendfile": path} ({} when offloading is off).
+        :raises ValueError: If `path` is outside `root`.
+        """
+        path = Path(path).resolve()
+        relative = path.relative_to(self.root)
+        if self.mode == "nginx":
+            return {"X-Accel-Redirect": quote(f"{self.prefix}/{relative.as_posix()}")}
+        if self.mode == "sendfile":
+            return {"X-Sendfile": quote(str(path))}
+        return {}
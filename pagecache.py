@@ -0,0 +1,72 @@
+"""
+In-memory cache of rendered pages.
+
+The OpenGraph share and embed pages are fetched by every unfurl bot (Discord,
+Twitter, Telegram, ...) each time a link is posted, often many times within a
+few seconds. Their HTML only depends on the catalog entry and a few request
+properties, so `PageCache` keeps the rendered bytes (with their ETag) in a
+bounded LRU keyed by whatever the page depends on, and tagged with the
+catalog version they were rendered from: after any catalog change an entry is
+rendered again on its next request instead of being served stale.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+PAGE_CACHE_SIZE = 512
+
+
+class PageCache:
+    """
+    A thread-safe LRU of rendered pages.
+
+    :param maxsize: Most pages kept; the least recently used one is dropped beyond that.
+    """
+
+    def __init__(self, maxsize=PAGE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()    # key: (version, body, etag)
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+    def get_or_render(self, key, version, render):
+        """
+        Returns the cached page for `key`, rendering (and caching) it if it is missing or
+        was rendered from another catalog version.
+
+        :param key: Hashable key of everything the page depends on.
+        :param version: Catalog version the page is rendered from.
+        :param render: Callable returning the page as str or bytes.
+        :return: (body_bytes, etag) where the ETag is a hash of the body.
+        """
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is not None and cached[0] == version:
+                self._pages.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached[1], cached[2]
+            self._stats["stale" if cached is not None else "misses"] += 1
+
+        # Rendered outside the lock; concurrent misses render twice, which is harmless
+        body = render()
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        etag = hashlib.sha256(body).hexdigest()[:32]
+
+        with self._lock:
+            self._pages[key] = (version, body, etag)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+                self._stats["evictions"] += 1
+        return body, etag
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        """Returns the number of cached pages and the hit/miss counters."""
+        with self._lock:
+            return {"entries": len(self._pages), "maxsize": self.maxsize, **self._stats}
@@ -0,0 +1,158 @@
+"""
+Perceptual hashes and a near-duplicate index for the image library.
+
+Every rendered thumbnail also gets a 64-bit difference hash (dHash): the image
+is flattened onto white, shrunk to 9x8 grayscale and each bit records whether
+a pixel is brighter than its right-hand neighbour. Re-exports, recompressions,
+resizes and small edits keep most bits, so the Hamming distance between two
+hashes says how alike two images look.
+
+The hashes live in the thumbnail manifest. `BKTree` indexes them by Hamming
+distance, so looking up everything within a few bits of a hash only visits a
+small part of the library instead of comparing against every image.
+"""
+
+from PIL import Image
+
+HASH_SIZE = 8
+# Hashes at most this many bits (of 64) apart are reported as likely duplicates
+NEAR_DUPLICATE_DISTANCE = 10
+
+
+def dhash(im):
+    """
+    Returns the 64-bit difference hash of an image as 16 hex digits.
+
+    Computed from a thumbnail-sized image; the result doesn't depend on the input size.
+    """
+    if im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info:
+        im = im.convert("RGBA")
+        im = Image.alpha_composite(Image.new("RGBA", im.size, "white"), im)
+    pixels = im.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX).tobytes()
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes (ints)."""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes, keyed by Hamming distance.
+
+    Each node keeps its children by their distance to it, so by the triangle
+    inequality a search within `d` of a query only has to descend into children
+    whose key is within `d` of the query's distance to the node.
+    """
+
+    def __init__(self):
+        self._root = None   # [hash, [items], {distance: child node}]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value, item):
+        """
+        Adds an item under a hash.
+
+        :param value: The hash, as an int.
+        :param item: Anything identifying the image (items with equal hashes share a node).
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value, max_distance):
+        """
+        Returns [(distance, item)] for every item whose hash is within `max_distance` of `value`.
+        """
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                found.extend((distance, item) for item in node[1])
+            for key, child in node[2].items():
+                if distance - max_distance <= key <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+def build_tree(records):
+    """
+    Indexes the hashes in thumbnail manifest records.
+
+    :param records: {thumbnail name: manifest record}
+    :return: (BKTree over source file names, {source file name: hash as int})
+    """
+    tree = BKTree()
+    hashes = {}
+    for record in records.values():
+        if record.get("dhash") and record["source"] not in hashes:
+            hashes[record["source"]] = int(record["dhash"], 16)
+            tree.add(hashes[record["source"]], record["source"])
+    return tree, hashes
+
+
+def near_duplicates(tree, hashes, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """
+    Lists every pair of files whose hashes are within `max_distance` bits.
+
+    :param tree: The BKTree from `build_tree()`.
+    :param hashes: {file name: hash} from `build_tree()`.
+    :return: [(distance, file_a, file_b)], closest first.
+    """
+    pairs = []
+    for filename, value in hashes.items():
+        for distance, other in tree.search(value, max_distance):
+            if other > filename:
+                pairs.append((distance, filename, other))
+    pairs.sort()
+    return pairs
+
+
+def describe_pairs(pairs, items_by_file):
+    """
+    Turns `near_duplicates()` pairs into report rows, skipping files no catalog item uses.
+
+    :param items_by_file: {file name: [artwork IDs / 'NNNNN-001' alternate IDs]}
+    :return: [{"distance", "images": [{"filename", "items"}, {"filename", "items"}], "sameArtwork"}]
+        where sameArtwork says the two files already belong to the same artwork (e.g. an alternate).
+    """
+    def parents(items):
+        return {str(item_id).split("-")[0] for item_id in items}
+
+    report = []
+    for distance, file_a, file_b in pairs:
+        items_a, items_b = items_by_file.get(file_a), items_by_file.get(file_b)
+        if not items_a or not items_b:
+            continue
+        report.append({
+            "distance": distance,
+            "images": [{"filename": file_a, "items": items_a}, {"filename": file_b, "items": items_b}],
+            "sameArtwork": bool(parents(items_a) & parents(items_b)),
+        })
+    return report
@@ -0,0 +1,88 @@
+"""
+Sprite atlases of gallery thumbnails.
+
+The homepage preview strip shows a few random cards out of the whole SFW
+catalog. Instead of one request per thumbnail, the thumbnails are packed into
+a single WebP grid (cropped to the 3:4 card shape, the same crop the gallery's
+`object-fit: cover` makes) and the page positions each card's background in it.
+
+Atlases are named after a hash of their tiles' IDs and thumbnail files, so an
+unchanged set is never rendered twice (across restarts and workers alike), and
+the URL of a given atlas never changes contents.
+"""
+
+import hashlib
+import math
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from thumbnails import THUMB_QUALITY, THUMB_SIZE, save_atomic
+
+# Gallery cards are THUMB_SIZE wide at a 3:4 aspect ratio (see .thumb in style.css)
+ATLAS_TILE_SIZE = (THUMB_SIZE[0], round(THUMB_SIZE[0] * 4 / 3))
+ATLAS_QUALITY = THUMB_QUALITY
+# Older atlases are kept around for a while, for pages still holding their coordinate maps
+ATLAS_KEEP = 3
+
+
+def atlas_key(tiles, tile_size=ATLAS_TILE_SIZE):
+    """
+    Returns a short hash of the tiles and their thumbnails' size and mtime.
+
+    :param tiles: [(tile ID, thumbnail path)] of existing thumbnails, in atlas order.
+    """
+    digest = hashlib.sha256(f"{tile_size[0]}x{tile_size[1]}:{ATLAS_QUALITY}".encode("utf-8"))
+    for tile_id, thumb_file in tiles:
+        st = Path(thumb_file).stat()
+        digest.update(f"|{tile_id}:{Path(thumb_file).name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _prune(out_dir, name, keep):
+    atlases = sorted(Path(out_dir).glob(f"{name}-*.webp"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in atlases[keep:]:
+        path.unlink(missing_ok=True)
+
+
+def build_atlas(tiles, out_dir, name="preview", tile_size=ATLAS_TILE_SIZE):
+    """
+    Packs thumbnails into a grid atlas, unless an atlas of the same tiles already exists.
+
+    :param tiles: [(tile ID, thumbnail path)] in atlas order; missing thumbnails are skipped.
+    :param out_dir: Directory to write `<name>-<key>.webp` to.
+    :param name: Atlas name (several atlases can share a directory).
+    :param tile_size: (width, height) every thumbnail is cropped to.
+    :return: {"file", "key", "columns", "rows", "tileWidth", "tileHeight",
+        "tiles": [{"id", "column", "row"}]}, or None if there are no thumbnails.
+    """
+    tiles = [(tile_id, Path(thumb_file)) for tile_id, thumb_file in tiles if Path(thumb_file).is_file()]
+    if not tiles:
+        return None
+
+    key = atlas_key(tiles, tile_size)
+    columns = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    atlas_file = Path(out_dir) / f"{name}-{key}.webp"
+
+    if not atlas_file.exists():
+        atlas = Image.new("RGBA", (columns * tile_size[0], rows * tile_size[1]), (0, 0, 0, 0))
+        for position, (_, thumb_file) in enumerate(tiles):
+            with Image.open(thumb_file) as thumb:
+                tile = ImageOps.fit(thumb.convert("RGBA"), tile_size, Image.LANCZOS)
+            atlas.paste(tile, ((position % columns) * tile_size[0], (position // columns) * tile_size[1]))
+        save_atomic(atlas, atlas_file, format="WEBP", quality=ATLAS_QUALITY)
+        _prune(out_dir, name, ATLAS_KEEP)
+
+    return {
+        "file": atlas_file.name,
+        "key": key,
+        "columns": columns,
+        "rows": rows,
+        "tileWidth": tile_size[0],
+        "tileHeight": tile_size[1],
+        "tiles": [
+            {"id": tile_id, "column": position % columns, "row": position // columns}
+            for position, (tile_id, _) in enumerate(tiles)
+        ],
+    }
@@ -221,6 +221,44 @@ function setStatus(el, type, msg) {
     el.style.display = 'block';
 }
 
+/**
+ * Poll a background job (thumbnail rendering after an upload) and report
+ * its progress after the upload's own success message.
+ * @param {string} jobId
+ * @param {HTMLElement} el   status element already showing the upload result
+ */
+async function watchJob(jobId, el) {
+    const baseMsg = el.textContent;
+    const labels  = { queued: 'thumbnails queued…', running: 'rendering thumbnails…' };
+    for (;;) {
+        let job;
+        try {
+            const res = await fetch(`/api/v1/admin/jobs/${encodeURIComponent(jobId)}`);
+            if (!res.ok) return;
+            job = await res.json();
+        } catch (err) {
+            console.error(err);
+            return;
+        }
+        // Stop quietly if the status element has been reused for something else
+        if (!el.textContent.startsWith(baseMsg)) return;
+        if (job.status === 'done') {
+            const similar = (job.result && job.result.similar) || [];
+            const lookalikes = similar.flatMap(s => s.items).map(id => `#${id}`).join(', ');
+            setStatus(el, 'success', lookalikes
+                ? `${baseMsg} — thumbnails ready. Looks very similar to ${lookalikes}.`
+                : `${baseMsg} — thumbnails ready.`);
+            return;
+        }
+        if (job.status === 'failed') {
+            setStatus(el, 'error', `${baseMsg} — thumbnail generation failed: ${job.error}`);
+            return;
+        }
+        setStatus(el, 'success', `${baseMsg} — ${labels[job.status] || job.status}`);
+        await new Promise(resolve => setTimeout(resolve, 1500));
+    }
+}
+
 uploadForm.addEventListener('submit', async e => {
     e.preventDefault();
 
@@ -273,11 +311,13 @@ uploadForm.addEventListener('submit', async e => {
         const data = await res.json();
 
         if (res.ok && data.success) {
-            const msg = data.parentId
+            let msg = data.parentId
                 ? `✓ Alternate added to artwork #${data.parentId}! Alt ID: ${data.id}`
                 : `✓ Uploaded successfully! ID: ${data.id}`;
-            setStatus(uploadStatus, 'success', msg);
+            if (data.duplicateOf) msg += ` (same image as ${data.duplicateOf}, reusing that file)`;
             resetUploadForm();
+            setStatus(uploadStatus, 'success', msg);
+            if (data.jobId) watchJob(data.jobId, uploadStatus);
         } else {
             setStatus(uploadStatus, 'error', data.error || 'Upload failed.');
         }
@@ -465,8 +505,8 @@ function renderAltList(alts, parentId) {
         // Thumbnail
         const thumb = document.createElement('img');
         thumb.className = 'alt-thumb';
-        thumb.src = `/static/images/thumbs/${(alt.strippedFilename || alt.filename.replace(/\.[^.]+$/, ''))}.webp`;
-        thumb.onerror = () => { thumb.src = `/static/images/${alt.filename}`; };
+        thumb.src = versionedUrl(`/static/images/thumbs/${(alt.strippedFilename || alt.filename.replace(/\.[^.]+$/, ''))}.webp`, alt);
+        thumb.onerror = () => { thumb.src = versionedUrl(`/static/images/${alt.filename}`, alt); };
         row.appendChild(thumb);
 
         // Label input
@@ -611,7 +651,10 @@ function _bindAltAddSection(parentId) {
             const data = await res.json();
 
             if (res.ok && data.success) {
-                setStatus(statusEl, 'success', `✓ Alternate added (ID: ${data.id})`);
+                setStatus(statusEl, 'success', data.duplicateOf
+                    ? `✓ Alternate added (ID: ${data.id}, reusing ${data.duplicateOf})`
+                    : `✓ Alternate added (ID: ${data.id})`);
+                if (data.jobId) watchJob(data.jobId, statusEl);
                 // Append new row to existing list
                 const list = document.getElementById('edit-alt-list');
                 // Clear "no alternates" placeholder if present
@@ -273,3 +273,20 @@ function showPopup({
         overlay.remove();
     }
 }
+
+
+// ---- IMAGE URL FUNCTIONS ----
+// --- FINGERPRINTED IMAGE URL ---
+/**
+ * Appends an image's fingerprint to one of its static URLs (original, thumbnail or
+ * derivative), so the server can let browsers cache that URL as immutable.
+ *
+ * @param {string} url - The static URL.
+ * @param {object} img - Artwork or alternate object the URL belongs to.
+ * @return {string} The URL with `?v=<fingerprint>`, or unchanged if the image has none yet.
+ *
+ * @function versionedUrl
+ */
+function versionedUrl(url, img) {
+    return img && img.fingerprint ? `${url}?v=${img.fingerprint}` : url;
+}
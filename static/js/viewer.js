@@ -28,6 +28,43 @@ async function _getCharacterAccents() {
     return Object.fromEntries(_cachedCharacters.map(c => [c.name, c.accentColor]));
 }
 
+/* ---- RESPONSIVE IMAGES ---- */
+// Rendered widths of a gallery thumb and the viewer image (mirrors style.css)
+const THUMB_SIZES = "(max-width: 400px) 100vw, (max-width: 560px) 47vw, (max-width: 750px) 45vw, 280px";
+const VIEWER_SIZES = "(max-width: 768px) 95vw, 60vw";
+
+// AVIF support is probed once with a 1x1 image; WebP derivatives are used until it answers
+let supportsAvif = false;
+(() => {
+    const probe = new Image();
+    probe.onload = () => { supportsAvif = probe.width > 0; };
+    probe.src = "data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADrbWV0YQAAAAAAAAAhaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAAAAAAAOcGl0bQAAAAAAAQAAAB5pbG9jAAAAAEQAAAEAAQAAAAEAAAETAAAAJQAAAChpaW5mAAAAAAABAAAAGmluZmUCAAAAAAEAAGF2MDFDb2xvcgAAAABqaXBycAAAAEtpcGNvAAAAFGlzcGUAAAAAAAAAAQAAAAEAAAAQcGl4aQAAAAADCAgIAAAADGF2MUOBAAwAAAAAE2NvbHJuY2x4AAEADQAGgAAAABdpcG1hAAAAAAAAAAEAAQQBAoMEAAAALW1kYXQSAAoIGAAGiAhoNCAyFxTHh4ZlAgggnlAAAAD2b2M9SPG6ZHSs";
+})();
+
+/**
+ * Builds a `srcset` from an image's "derivatives" (the resized copies generated on the server).
+ * @param {object} img - Artwork or alternate object.
+ * @param {boolean} [includeOriginal=false] - Whether to offer the full-size original as the largest candidate.
+ * @returns {string} The srcset, or an empty string if the image has no derivatives.
+ */
+function buildSrcset(img, includeOriginal = false) {
+    const derivatives = img.derivatives;
+    if (!derivatives || !derivatives.widths || derivatives.widths.length === 0) return "";
+
+    const format = supportsAvif && derivatives.formats.includes("avif") ? "avif" : "webp";
+    if (!derivatives.formats.includes(format)) return "";
+
+    // Filenames can contain spaces and commas, which would break the srcset syntax
+    const srcsetUrl = url => encodeURI(url).replace(/,/g, "%2C");
+    const candidates = derivatives.widths.map(
+        width => `${srcsetUrl(versionedUrl(`/static/images/${derivatives.path}-${width}.${format}`, img))} ${width}w`
+    );
+    if (includeOriginal && derivatives.sourceWidth) {
+        candidates.push(`${srcsetUrl(versionedUrl(`/static/images/${img.filename}`, img))} ${derivatives.sourceWidth}w`);
+    }
+    return candidates.join(", ");
+}
+
 /* ---- VALUE CLEANING FUNCTIONS ---- */
 /**
  * Clean an artist name by removing any trailing "(Prompt)" and trimming.
@@ -67,43 +104,25 @@ function hasAllCharacters(imgChars = [], requiredChars = []) {
 
 /* ---- FILTER OPTIONS FETCHER ---- */
 /**
- * Fetches and returns the list of unique artists, forms, and characters from the art
- * JSON. The lists are sorted alphabetically, ignoring case.
+ * Fetches and returns the list of unique artists, forms, and characters from the
+ * precomputed facets endpoint. The lists are sorted alphabetically, ignoring case.
  * @returns {Promise<{artists: string[], forms: string[], characters: string[]}>}
  *     A promise that resolves to an object containing the lists of unique
- *     artists, forms, and characters. If there is an error fetching the art JSON,
+ *     artists, forms, and characters. If there is an error fetching the facets,
  *     the promise resolves to an object with empty lists.
  */
 async function getFilterOptions() {
     try {
-        const res = await fetch("/art.json");
-        const images = await res.json();
-
-        const artistSet = new Set();
-        const formSet = new Set();
-        const charSet = new Set();
+        const res = await fetch("/api/v1/art/facets");
+        const facets = await res.json();
 
-        images.forEach(img => {
-            const rawArtist = img.artist;
-            const artist = cleanArtistName(rawArtist);
-            if (artist) artistSet.add(artist);
+        const names = list => (list || []).map(f => f.name);
 
-            const rawForm = img.shapeshiftForm;
-            const form = cleanFormName(rawForm);
-            if (form) formSet.add(form);
-
-            if (Array.isArray(img.characters)) {
-                img.characters.forEach(c => {
-                    if (c && String(c).trim()) charSet.add(String(c).trim());
-                });
-            }
-        });
-
-        const artists = Array.from(artistSet).sort((a,b) => a.localeCompare(b, undefined, {sensitivity: "base"}));
-        const forms = Array.from(formSet).sort((a,b) => a.localeCompare(b, undefined, {sensitivity: "base"}));
-        const characters = Array.from(charSet).sort((a,b) => a.localeCompare(b, undefined, {sensitivity: "base"}));
-
-        return { artists, forms, characters };
+        return {
+            artists: names(facets.artists),
+            forms: names(facets.forms),
+            characters: names(facets.characters)
+        };
     } catch (err) {
         console.error("Error fetching filter options:", err);
         return { artists: [], forms: [], characters: [] };
@@ -112,6 +131,37 @@ async function getFilterOptions() {
 
 
 /* ---- GALLERY LOAD FUNCTION ---- */
+/**
+ * Creates a small gradient badge for a gallery thumbnail.
+ * @param {string} type - The badge type, a key of `badgeSVG` ('ai', 'nsfw', 'discord').
+ * @returns {HTMLElement} The badge element.
+ */
+function createBadge(type) {
+    const badgeElement = document.createElement("div");
+    badgeElement.className = "badge";
+    badgeElement.setAttribute('badge-size', 'small');
+    badgeElement.setAttribute('badge-style', 'gradient');
+    badgeElement.setAttribute('badge', type);
+    badgeElement.innerHTML = badgeSVG[type];
+    return badgeElement;
+}
+
+/**
+ * Creates the badge showing how many versions (main image + alternates) an artwork has.
+ * @param {number} versions - The number of versions.
+ * @returns {HTMLElement} The badge element.
+ */
+function createVersionsBadge(versions) {
+    const vcBadge = document.createElement("div");
+    vcBadge.className = "badge";
+    vcBadge.setAttribute('badge-size', 'small');
+    vcBadge.setAttribute('badge-style', 'gradient');
+    vcBadge.setAttribute('badge', 'versions');
+    vcBadge.textContent = versions;
+    vcBadge.title = `${versions} versions available`;
+    return vcBadge;
+}
+
 /**
  * Loads a gallery of thumbnails based on the provided filters and settings.
  * @param {string} elementId - The id of the HTML element to render the gallery in.
@@ -124,6 +174,7 @@ async function getFilterOptions() {
  *     - `characters`: string[] - The list of characters to filter by (all characters must be present)
  *     - `isNSFW`: boolean - The NSFW filter (three-state: true, false, null)
  *     - `isAI`: boolean - The AI filter (three-state: true, false, null)
+ *     - `isDiscEmoji`: boolean - The Discord emoji filter (three-state: true, false, null)
  *     - `artNameQuery`: string - The substring to search for in the art name (case-insensitive)
  * @returns {Promise<void>} - A promise that resolves when the gallery has finished loading.
  * 
@@ -134,98 +185,34 @@ async function loadGallery(elementId, count = 0, randomize = false, filters = {}
     try {
         ensureDefaultCookies();
 
-        const res = await fetch("/art.json");
-        let images = await res.json();
-
-        // read cookie settings
-        const showAI = getCookie("showAI") === "True";
+        // read cookie settings (showAI/showNSFW are applied server-side from the same cookies)
         const showNSFW = getCookie("showNSFW") === "True";
         const blurNSFW = getCookie("blurNSFW") === "True";
 
-        // filter based on cookie preferences first
-        images = images.filter(img => {
-            if (img.isAI && !showAI) return false;
-            if (img.isNSFW && !showNSFW) return false;
-            return true;
-        });
-
-        // normalize incoming filters
-        const fArtist = filters.artist ? String(filters.artist).trim() : null;
-        const fForm = filters.form ? String(filters.form).trim() : null;
-        const fCharacters = Array.isArray(filters.characters) ? filters.characters.filter(Boolean) : [];
-        const fIsNSFW = (typeof filters.isNSFW === "boolean") ? filters.isNSFW : null;
-        const fIsAI = (typeof filters.isAI === "boolean") ? filters.isAI : null;
-        const fisDiscEmoji = (typeof filters.isDiscEmoji === "boolean") ? filters.isDiscEmoji : null;
-        const fArtName = filters.artNameQuery ? String(filters.artNameQuery).trim().toLowerCase() : null;
-
-        // apply additional filters (artist/form/characters/NSFW/AI/artName)
-        images = images.filter(img => {
-            // Artist exact match (ignore trailing " (Prompt)" in data)
-            if (fArtist) {
-                const imgArtistClean = cleanArtistName(img.artist || "");
-                if (imgArtistClean !== fArtist) return false;
-            }
-
-            // Form exact match (ignore trailing " Form")
-            if (fForm) {
-                const imgFormClean = cleanFormName(img.shapeshiftForm || "");
-                if (imgFormClean !== fForm) return false;
-            }
-
-            // Characters (require all selected)
-            if (fCharacters && fCharacters.length > 0) {
-                if (!hasAllCharacters(img.characters, fCharacters)) return false;
-            }
-
-            // NSFW filter (three-state)
-            if (fIsNSFW !== null) {
-                const imgNSFW = Boolean(img.isNSFW);
-                if (imgNSFW !== fIsNSFW) return false;
-            }
-
-            // AI filter (three-state)
-            if (fIsAI !== null) {
-                const imgAI = Boolean(img.isAI);
-                if (imgAI !== fIsAI) return false;
-            }
-
-            // Discord filter (three-state)
-            if (fisDiscEmoji !== null) {
-                const imgDiscord = Boolean(img.isDiscEmoji);
-                if (imgDiscord !== fisDiscEmoji) return false;
-            }
-
-            // artNameQuery: substring, case-insensitive
-            if (fArtName) {
-                const artName = String(img.artName || "").toLowerCase();
-                if (!artName.includes(fArtName)) return false;
-            }
-
-            return true;
+        // translate filters into /api/v1/art query params; sorting and filtering happen server-side
+        const params = new URLSearchParams();
+        if (filters.artist) params.set("artist", String(filters.artist).trim());
+        if (filters.form) params.set("form", String(filters.form).trim());
+        (Array.isArray(filters.characters) ? filters.characters.filter(Boolean) : [])
+            .forEach(c => params.append("characters", c));
+        ["isNSFW", "isAI", "isDiscEmoji"].forEach(flag => {
+            if (typeof filters[flag] === "boolean") params.set(flag, String(filters[flag]));
         });
+        if (filters.artNameQuery) params.set("artNameQuery", String(filters.artNameQuery).trim());
+        if (randomize) params.set("order", "random");
+        params.set("limit", count > 0 ? Math.min(count, 200) : 200);
+
+        // follow cursors until we have `count` images (or everything when count is 0)
+        let images = [];
+        let cursor = null;
+        do {
+            if (cursor) params.set("cursor", cursor);
+            const res = await fetch(`/api/v1/art?${params}`);
+            const page = await res.json();
+            images = images.concat(page.items || []);
+            cursor = page.nextCursor;
+        } while (cursor && (count === 0 || images.length < count));
 
-        // shuffle if requested
-        if (randomize) {
-            for (let i = images.length - 1; i > 0; i--) {
-                const j = Math.floor(Math.random() * (i + 1));
-                [images[i], images[j]] = [images[j], images[i]];
-            }
-        } else {
-            // sort by shapeshift form: pinned forms first, then alphabetically
-            const PINNED_FORMS = ["Main Form", "True Form", "Humanoid Form"];
-            images.sort((a, b) => {
-                const fa = cleanFormName(a.shapeshiftForm || "");
-                const fb = cleanFormName(b.shapeshiftForm || "");
-                const ia = PINNED_FORMS.findIndex(p => cleanFormName(p) === fa);
-                const ib = PINNED_FORMS.findIndex(p => cleanFormName(p) === fb);
-                if (ia !== -1 && ib !== -1) return ia - ib;
-                if (ia !== -1) return -1;
-                if (ib !== -1) return 1;
-                return fa.localeCompare(fb, undefined, { sensitivity: "base" });
-            });
-        }
-
-        // slice if count specified (> 0)
         if (count > 0) images = images.slice(0, count);
 
         const gallery = document.getElementById(elementId);
@@ -234,16 +221,6 @@ async function loadGallery(elementId, count = 0, randomize = false, filters = {}
             return;
         }
 
-        function createBadge(type) {
-            const badgeElement = document.createElement("div");
-            badgeElement.className = "badge";
-            badgeElement.setAttribute('badge-size', 'small');
-            badgeElement.setAttribute('badge-style', 'gradient');
-            badgeElement.setAttribute('badge', type);
-            badgeElement.innerHTML = badgeSVG[type];
-            return badgeElement;
-        }
-
         gallery.innerHTML = "";
 
         function buildThumb(img) {
@@ -259,15 +236,39 @@ async function loadGallery(elementId, count = 0, randomize = false, filters = {}
                 : "";
 
             // create the thumbnail <img> - use webLink if provided, otherwise predictable webp thumb
+            // (plus the larger derivatives for high-DPI and wide single-column layouts)
             const imgEl = document.createElement("img");
+            const srcset = img.webLink ? "" : buildSrcset(img);
+            if (srcset) {
+                imgEl.srcset = srcset;
+                imgEl.sizes = THUMB_SIZES;
+            }
             imgEl.src = img.webLink
                 ? img.webLink
-                : `/static/images/thumbs/${img.strippedFilename}.webp`;
+                : versionedUrl(`/static/images/thumbs/${img.strippedFilename}.webp`, img);
             imgEl.alt = img.title || "";
             imgEl.loading = "lazy";
             imgEl.decoding = "async";
             imgEl.className = "thumb-img";
 
+            // paint the tiny placeholder (or the dominant color) until the thumbnail arrives
+            const info = img.webLink ? null : img.imageInfo;
+            if (info) {
+                imgEl.width = info.width;
+                imgEl.height = info.height;
+                thumb.classList.add("has-placeholder");
+                thumb.style.backgroundColor = info.dominantColor;
+                if (info.placeholder) thumb.style.backgroundImage = `url("${info.placeholder}")`;
+                // transparent art must not show the placeholder through it once loaded
+                const clearPlaceholder = () => {
+                    thumb.classList.remove("has-placeholder");
+                    thumb.style.backgroundColor = "";
+                    thumb.style.backgroundImage = "";
+                };
+                if (imgEl.complete && imgEl.naturalWidth) clearPlaceholder();
+                else imgEl.addEventListener("load", clearPlaceholder, { once: true });
+            }
+
             // apply NSFW blur if cookie is set
             if (img.isNSFW && blurNSFW) {
                 imgEl.classList.add("blurred-nsfw");
@@ -292,16 +293,7 @@ async function loadGallery(elementId, count = 0, randomize = false, filters = {}
 
             // Version count badge: count main + NSFW-filtered alternates
             const visibleAltCount = (img.alternates || []).filter(a => !a.isNSFW || showNSFW).length;
-            if (visibleAltCount > 0) {
-                const vcBadge = document.createElement("div");
-                vcBadge.className = "badge";
-                vcBadge.setAttribute('badge-size', 'small');
-                vcBadge.setAttribute('badge-style', 'gradient');
-                vcBadge.setAttribute('badge', 'versions');
-                vcBadge.textContent = visibleAltCount + 1;
-                vcBadge.title = `${visibleAltCount + 1} versions available`;
-                badgeContainer.appendChild(vcBadge);
-            }
+            if (visibleAltCount > 0) badgeContainer.appendChild(createVersionsBadge(visibleAltCount + 1));
 
             thumb.appendChild(imgEl);
             thumb.appendChild(thumbText);
@@ -354,12 +346,143 @@ async function loadGallery(elementId, count = 0, randomize = false, filters = {}
         } else {
             images.forEach(img => gallery.appendChild(buildThumb(img)));
         }
+
+        prefetchDiscordAvatars(images);
     } catch (err) {
         console.error("Error loading gallery:", err);
     }
 }
 
 
+/* ---- DISCORD AVATARS ---- */
+// Avatar answers by Discord user ID, filled in one batch request per gallery load
+const _discordAvatars = new Map();
+// Most users per batch request (mirrors DISCORD_AVATAR_BATCH_MAX in app.py)
+const DISCORD_AVATAR_BATCH_MAX = 100;
+
+/**
+ * Fetches the Discord avatars of every artist shown in a gallery ahead of time, so
+ * opening the viewer doesn't wait on a lookup. Failures are left to `openViewer`,
+ * which asks for a single avatar when no prefetched answer is there.
+ * @param {Object[]} images - The gallery's entries.
+ * @returns {Promise<void>} - A promise that resolves when the avatars have been fetched.
+ *
+ * @function prefetchDiscordAvatars
+ */
+async function prefetchDiscordAvatars(images) {
+    const discordIDs = [...new Set(images
+        .filter(img => img.artistPic === "discord" && img.discordID)
+        .map(img => img.discordID))]
+        .filter(id => !_discordAvatars.has(id));
+
+    for (let i = 0; i < discordIDs.length; i += DISCORD_AVATAR_BATCH_MAX) {
+        const params = new URLSearchParams();
+        discordIDs.slice(i, i + DISCORD_AVATAR_BATCH_MAX).forEach(id => params.append("discordID", id));
+        try {
+            const res = await fetch(`/api/v1/fetch/discord-avatars?${params}`);
+            if (!res.ok) return;
+            const data = await res.json();
+            Object.entries(data.avatars || {}).forEach(([id, avatar]) => _discordAvatars.set(id, avatar));
+        } catch (err) {
+            console.error("Error prefetching Discord avatars:", err);
+            return;
+        }
+    }
+}
+
+
+/* ---- HOMEPAGE PREVIEW STRIP ---- */
+// Atlas map from /api/v1/art/preview-atlas, fetched (and shuffled) once per page
+let _previewAtlas = null;
+
+/**
+ * Renders random SFW, non-AI artworks from the server's thumbnail sprite atlas, so the
+ * strip costs one JSON and one image request however many cards it shows. Re-rendering
+ * (e.g. on resize) reuses the atlas and shows more or fewer of the same shuffled cards.
+ * Falls back to `loadGallery` while no thumbnails exist yet.
+ * @param {string} elementId - The id of the HTML element to render the strip in.
+ * @param {number} [count=0] - The number of cards to show. If 0, all of them will be shown.
+ * @returns {Promise<void>} - A promise that resolves when the strip has been rendered.
+ *
+ * @function loadPreviewStrip
+ */
+async function loadPreviewStrip(elementId, count = 0) {
+    try {
+        if (!_previewAtlas) {
+            _previewAtlas = fetch("/api/v1/art/preview-atlas")
+                .then(res => res.json())
+                .then(atlas => {
+                    for (let i = atlas.tiles.length - 1; i > 0; i--) {
+                        const j = Math.floor(Math.random() * (i + 1));
+                        [atlas.tiles[i], atlas.tiles[j]] = [atlas.tiles[j], atlas.tiles[i]];
+                    }
+                    return atlas;
+                });
+        }
+        const atlas = await _previewAtlas;
+        if (!atlas.image) return loadGallery(elementId, count, true);
+
+        const gallery = document.getElementById(elementId);
+        if (!gallery) {
+            console.error(`Gallery element with id "${elementId}" not found.`);
+            return;
+        }
+
+        ensureDefaultCookies();
+        const showNSFW = getCookie("showNSFW") === "True";
+
+        // Percentages keep the sprite aligned at whatever size the card is rendered
+        const offset = (index, total) => total > 1 ? `${index / (total - 1) * 100}%` : "0%";
+
+        gallery.innerHTML = "";
+        (count > 0 ? atlas.tiles.slice(0, count) : atlas.tiles).forEach(tile => {
+            const thumb = document.createElement("div");
+            thumb.className = "thumb";
+
+            // the atlas only carries what the card shows; the viewer needs the full entry
+            thumb.addEventListener("click", async () => {
+                const res = await fetch(`/api/v1/art/${tile.id}`);
+                if (res.ok) openViewer((await res.json()).entry);
+            });
+
+            const sprite = document.createElement("div");
+            sprite.className = "thumb-sprite";
+            sprite.setAttribute("role", "img");
+            sprite.setAttribute("aria-label", tile.title || "");
+            sprite.style.backgroundImage = `url("${atlas.image}")`;
+            sprite.style.backgroundSize = `${atlas.columns * 100}% ${atlas.rows * 100}%`;
+            sprite.style.backgroundPosition = `${offset(tile.column, atlas.columns)} ${offset(tile.row, atlas.rows)}`;
+
+            const characters = (tile.characters && tile.characters.length > 0)
+                ? `<span class="character-list">${tile.characters.join(" x ")}</span>`
+                : "";
+            const thumbText = document.createElement("div");
+            thumbText.className = "thumb-text";
+            thumbText.innerHTML = `
+                ${characters}
+                <span class="form-name">${tile.shapeshiftForm || ""}</span>
+                <span class="art-title">${tile.artName || ""}</span>
+                <span class="artist-name">${tile.artist || ""}</span>
+            `;
+
+            const badgeContainer = document.createElement("div");
+            badgeContainer.className = "badge-container";
+            if (tile.isDiscEmoji) badgeContainer.appendChild(createBadge('discord'));
+            const visibleAltCount = showNSFW ? tile.alternates : tile.sfwAlternates;
+            if (visibleAltCount > 0) badgeContainer.appendChild(createVersionsBadge(visibleAltCount + 1));
+
+            thumb.appendChild(sprite);
+            thumb.appendChild(thumbText);
+            thumb.appendChild(badgeContainer);
+            gallery.appendChild(thumb);
+        });
+    } catch (err) {
+        _previewAtlas = null;
+        console.error("Error loading preview strip:", err);
+    }
+}
+
+
 /* ---- ROW GALLERY DISPLAY PREDICTOR ---- */
 /**
  * Predict the number of thumbnails that will fit in a row in a flexbox container
@@ -613,7 +736,9 @@ function _switchVisibleVersion(visibleIndex, visibleAlts, img) {
         viewerLoader.classList.add('hidden');
     };
     viewerImage.onerror = () => viewerLoader.classList.add('hidden');
-    viewerImage.src = `/static/images/${versionData.filename}`;
+    viewerImage.sizes = VIEWER_SIZES;
+    viewerImage.srcset = buildSrcset(versionData, true);
+    viewerImage.src = versionedUrl(`/static/images/${versionData.filename}`, versionData);
 
     _applyVersionDisplay(versionData);
 
@@ -648,6 +773,8 @@ function switchToVersion(index) {
  * @property {string} [img.creationDate] - Creation date of the art.
  * @property {boolean} [img.isAI] - Whether the image is AI-generated.
  * @property {boolean} [img.isNSFW] - Whether the image is NSFW.
+ * @property {object} [img.derivatives] - Resized copies for srcset ({path, widths, formats, sourceWidth}).
+ * @property {object} [img.imageInfo] - Measured on the server ({width, height, aspectRatio, dominantColor, placeholder}).
  * 
  * @function openViewer
  * @since v23
@@ -665,8 +792,10 @@ function openViewer(img) {
     const showNSFW = getCookie("showNSFW") === "True";
     const blurNSFW = getCookie("blurNSFW") === "True";
     
+    viewerImage.srcset = '';
     viewerImage.src = '';
     viewerImage.onload = null;
+    viewerArtistPic.srcset = '';
     viewerArtistPic.src = '';
     viewerContent.style.width = "200px";
     viewerContent.style.height = "200px";
@@ -687,19 +816,29 @@ function openViewer(img) {
         });
     };
 
-    imagePromises.push(loadImage(viewerImage, img.webLink ? img.webLink : `/static/images/${img.filename}`));
+    // The original stays the fallback src; browsers that understand srcset pick a size that fits the viewer
+    if (!img.webLink) {
+        viewerImage.sizes = VIEWER_SIZES;
+        viewerImage.srcset = buildSrcset(img, true);
+    }
+    imagePromises.push(loadImage(viewerImage, img.webLink ? img.webLink : versionedUrl(`/static/images/${img.filename}`, img)));
     
     let artistPicPromise;
     if (img.artistPic === "discord") {
-        artistPicPromise = fetch(`/api/v1/fetch/discord-avatar?id=${img.id}`)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('Failed to fetch Discord avatar');
-                }
-                return response.json();
-            })
+        const prefetched = _discordAvatars.get(img.discordID);
+        artistPicPromise = (prefetched
+            ? Promise.resolve(prefetched)
+            : fetch(`/api/v1/fetch/discord-avatar?id=${img.id}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('Failed to fetch Discord avatar');
+                    }
+                    return response.json();
+                }))
             .then(data => {
-                const avatarSrc = data.avatarURL;
+                // prefer our own mirrored copy; Discord's CDN until it has been downloaded
+                viewerArtistPic.srcset = data.localSrcset || "";
+                const avatarSrc = data.localURL || data.avatarURL;
                 return loadImage(viewerArtistPic, avatarSrc);
             })
             .catch(error => {
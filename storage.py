@@ -0,0 +1,290 @@
+"""
+Storage backends for the catalogs.
+
+- JSONStorage:   the pretty-printed data/*.json files (default).
+- SQLiteStorage: one row per entry in a WAL-mode SQLite database, with
+                 alternates in their own table keyed by parent, so saving a
+                 single edited entry only rewrites that entry's rows.
+
+Pick one with the CATALOG_BACKEND ('json' or 'sqlite') and CATALOG_DB
+environment variables; `artmgr.py db-import` / `db-export` move data between
+them, and the export is byte-identical to the JSON backend's own files.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+
+BACKENDS = ("json", "sqlite")
+
+
+# ---- JSON FILE ----
+class JSONStorage:
+    """
+    A JSON file written atomically (temp file in the same directory, fsync, rename).
+
+    :param path: Path to the JSON file.
+    :param indent: Indentation used when writing the file.
+    """
+
+    def __init__(self, path, indent=4):
+        self.path = Path(path)
+        self.indent = indent
+        self.lock_path = self.path.with_name(f".{self.path.name}.lock")
+
+    def __str__(self):
+        return str(self.path)
+
+    def stamp(self):
+        """Returns a cheap fingerprint of the file on disk, or None if it is missing."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def read(self):
+        """
+        Parses the file.
+
+        :raises FileNotFoundError: If the file does not exist.
+        """
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def write(self, data, changes=None):
+        """Atomically replaces the file with `data` (`changes` is ignored, the whole file is rewritten)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=self.indent, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        # Make the rename itself durable (not supported on Windows)
+        try:
+            dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+
+
+# ---- SQLITE ----
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS art (
+    id            INTEGER PRIMARY KEY,
+    position      INTEGER NOT NULL,
+    artist        TEXT,
+    mainCharacter TEXT,
+    isAI          INTEGER NOT NULL DEFAULT 0,
+    isNSFW        INTEGER NOT NULL DEFAULT 0,
+    isDiscEmoji   INTEGER NOT NULL DEFAULT 0,
+    data          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS art_position ON art (position);
+CREATE INDEX IF NOT EXISTS art_artist ON art (artist);
+CREATE INDEX IF NOT EXISTS art_main_character ON art (mainCharacter);
+CREATE INDEX IF NOT EXISTS art_flags ON art (isAI, isNSFW, isDiscEmoji);
+CREATE TABLE IF NOT EXISTS alternates (
+    parent_id INTEGER NOT NULL,
+    position  INTEGER NOT NULL,
+    alt_id    TEXT,
+    data      TEXT NOT NULL,
+    PRIMARY KEY (parent_id, position)
+);
+CREATE TABLE IF NOT EXISTS characters (
+    id       TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS characters_position ON characters (position);
+"""
+
+
+class SQLiteStorage:
+    """
+    One catalog ('art' or 'characters') inside a shared SQLite database.
+
+    Entries are stored as their original JSON (so key order survives a round
+    trip) plus indexed columns for the fields we filter on. Art alternates live
+    in the `alternates` table; the parent row keeps an empty "alternates"
+    placeholder so the key stays in its original position.
+
+    :param db_path: Path to the SQLite database.
+    :param kind: 'art' or 'characters'.
+    """
+
+    def __init__(self, db_path, kind):
+        if kind not in ("art", "characters"):
+            raise ValueError(f"Unknown catalog kind: {kind}")
+        self.path = Path(db_path)
+        self.kind = kind
+        self.lock_path = self.path.with_name(f".{self.path.name}.{kind}.lock")
+        self._local = threading.local()
+
+    def __str__(self):
+        return f"{self.path}:{self.kind}"
+
+    # --- CONNECTIONS ---
+    def _conn(self, create=False):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        mode = "rwc" if create else "rw"
+        try:
+            conn = sqlite3.connect(f"file:{self.path}?mode={mode}", uri=True, isolation_level=None)
+        except sqlite3.OperationalError as e:
+            raise FileNotFoundError(f"SQLite catalog not found: {self.path}") from e
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SQLITE_SCHEMA)
+        self._local.conn = conn
+        return conn
+
+    def stamp(self):
+        """Returns the catalog's revision counter, or None if it was never imported."""
+        try:
+            row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (f"revision:{self.kind}",)).fetchone()
+        except FileNotFoundError:
+            return None
+        return row[0] if row else None
+
+    # --- READING ---
+    def read(self):
+        """
+        Rebuilds the catalog list in its original order.
+
+        :raises FileNotFoundError: If the database is missing or this catalog was never imported.
+        """
+        if self.stamp() is None:
+            raise FileNotFoundError(f"No {self.kind} catalog in {self.path}; run `artmgr.py db-import` first")
+        conn = self._conn()
+        entries = [json.loads(data) for (data,) in conn.execute(f"SELECT data FROM {self.kind} ORDER BY position")]
+        if self.kind == "art":
+            alternates = {}
+            for parent_id, data in conn.execute("SELECT parent_id, data FROM alternates ORDER BY parent_id, position"):
+                alternates.setdefault(parent_id, []).append(json.loads(data))
+            for entry in entries:
+                if "alternates" in entry:
+                    entry["alternates"] = alternates.get(entry["id"], [])
+        return entries
+
+    # --- WRITING ---
+    def _upsert(self, conn, entry, position=None):
+        """Writes one entry's row(s). New rows go after the current last row unless `position` is given."""
+        if self.kind == "characters":
+            stored = json.dumps(entry, ensure_ascii=False)
+            if position is None:
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM characters").fetchone()[0]
+            conn.execute(
+                "INSERT INTO characters (id, position, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET data = excluded.data",
+                (entry["id"], position, stored)
+            )
+            return
+
+        # Keep the key (and its position in the dict) but move the contents to the alternates table
+        alternates = entry.get("alternates")
+        stored = json.dumps({**entry, "alternates": []} if "alternates" in entry else entry, ensure_ascii=False)
+        if position is None:
+            position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM art").fetchone()[0]
+        conn.execute(
+            "INSERT INTO art (id, position, artist, mainCharacter, isAI, isNSFW, isDiscEmoji, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET artist = excluded.artist, mainCharacter = excluded.mainCharacter, "
+            "isAI = excluded.isAI, isNSFW = excluded.isNSFW, isDiscEmoji = excluded.isDiscEmoji, data = excluded.data",
+            (
+                entry["id"], position, entry.get("artist"), entry.get("mainCharacter"),
+                int(bool(entry.get("isAI"))), int(bool(entry.get("isNSFW"))), int(bool(entry.get("isDiscEmoji"))),
+                stored
+            )
+        )
+        conn.execute("DELETE FROM alternates WHERE parent_id = ?", (entry["id"],))
+        conn.executemany(
+            "INSERT INTO alternates (parent_id, position, alt_id, data) VALUES (?, ?, ?, ?)",
+            [(entry["id"], i, str(alt.get("id")), json.dumps(alt, ensure_ascii=False)) for i, alt in enumerate(alternates or [])]
+        )
+
+    def _delete(self, conn, entry_id):
+        conn.execute(f"DELETE FROM {self.kind} WHERE id = ?", (entry_id,))
+        if self.kind == "art":
+            conn.execute("DELETE FROM alternates WHERE parent_id = ?", (entry_id,))
+
+    def write(self, data, changes=None):
+        """
+        Saves the catalog in one SQLite transaction.
+
+        :param data: The full list.
+        :param changes: Optional (changed_ids, removed_ids) from the index. When given,
+            only those rows are written; otherwise the whole catalog is replaced.
+        """
+        conn = self._conn(create=True)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if changes is None:
+                conn.execute(f"DELETE FROM {self.kind}")
+                if self.kind == "art":
+                    conn.execute("DELETE FROM alternates")
+                for position, entry in enumerate(data):
+                    self._upsert(conn, entry, position)
+            else:
+                changed, removed = changes
+                by_id = {}
+                if changed:
+                    # Only the touched entries are serialized; the scan just collects references
+                    by_id = {entry["id"]: entry for entry in data if entry["id"] in changed}
+                for entry_id in removed:
+                    self._delete(conn, entry_id)
+                for entry_id in changed:
+                    if entry_id in by_id:
+                        self._upsert(conn, by_id[entry_id])
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, 1) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + 1",
+                (f"revision:{self.kind}",)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+# ---- BACKEND SELECTION ----
+def open_storage(kind, json_path, indent, backend="json", db_path=None):
+    """
+    Returns the storage for a catalog.
+
+    :param kind: 'art' or 'characters'.
+    :param json_path: Path of the JSON file (used by the JSON backend).
+    :param indent: Indentation of the JSON file.
+    :param backend: 'json' or 'sqlite'.
+    :param db_path: Path of the SQLite database (used by the SQLite backend).
+    """
+    if backend == "json":
+        return JSONStorage(json_path, indent)
+    if backend == "sqlite":
+        return SQLiteStorage(db_path, kind)
+    raise ValueError(f"Unknown CATALOG_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
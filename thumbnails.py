@@ -0,0 +1,692 @@
+"""
+Thumbnail generation for the art catalog, shared by app.py and artmgr.py.
+
+`create_thumbnail()` renders one image and is safe to run in a worker process.
+`ThumbnailWarmup` renders every missing thumbnail over a process pool, guarded
+by a lock file so only one process (a single gunicorn worker, or
+`artmgr.py thumbs`) does the job while everyone else keeps serving.
+
+`ThumbnailManifest` (data/thumbs.manifest.json) records the source size, mtime and
+SHA-256 plus the encoder settings behind every thumbnail, so a replaced source
+image (or changed settings) gets re-rendered and an unchanged library is
+checked with nothing more than a stat per image.
+
+Alongside each thumbnail, an `ImageProfile` can ask for responsive derivatives
+(several widths in WebP and optionally AVIF) rendered from the same decode; their
+widths are copied into the catalog so the gallery and viewer can emit `srcset`.
+Every render also measures the image (dimensions, dominant color and a tiny
+inline WebP placeholder), which is copied into the catalog as "imageInfo" so
+the gallery can paint something before the thumbnail arrives. A perceptual
+hash of the thumbnail goes into the manifest for near-duplicate lookups (see
+perceptual.py). Each source's SHA-256 and settings also make up a short
+"fingerprint" in the catalog, which clients append to image URLs (?v=) so
+those URLs can be cached as immutable.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from PIL import ExifTags, Image, ImageOps, features
+
+from catalog import Catalog
+from perceptual import dhash
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process warms up on its own
+    fcntl = None
+
+THUMB_SIZE = (280, 0)
+THUMB_QUALITY = 85
+# Runtime state kept next to the catalog, never in the publicly served thumbnails directory
+MANIFEST_NAME = "thumbs.manifest.json"
+WARMUP_LOCK_NAME = ".thumbs.warmup.lock"
+
+# Responsive derivatives (static/images/derived/<stem>-<width>.<format>) for srcset
+DERIVATIVE_WIDTHS = (280, 560, 1200, 2048)
+DERIVATIVE_FORMATS = ("webp",)
+DERIVATIVE_QUALITY = {"webp": 80, "avif": 55}
+
+# Inline placeholder (LQIP): fits in a box this size, as a low-quality WebP data URI
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 30
+# Colors the thumbnail is quantized to when picking its dominant color
+DOMINANT_COLOR_PALETTE = 8
+
+# Decoding: keep at least this many times the target width before the LANCZOS pass
+# (Pillow's docs: 3.0 is practically indistinguishable from a full-resolution resample)
+REDUCING_GAP = 3.0
+# Refuse to decode bitmaps larger than this per job (JPEGs are checked at their draft size)
+MAX_DECODE_PIXELS = int(os.getenv("THUMBNAIL_MAX_DECODE_PIXELS", str(100_000_000)))
+
+
+def thumb_path(thumbs_dir, filename):
+    """Returns the thumbnail path for a source filename (same stem, .webp)."""
+    return Path(thumbs_dir) / (Path(filename).stem + ".webp")
+
+
+def supported_formats(formats):
+    """Filters `formats` down to the ones this Pillow build can encode (WebP always stays)."""
+    supported = []
+    for fmt in formats:
+        if fmt == "webp" or (fmt == "avif" and features.check("avif")):
+            supported.append(fmt)
+        else:
+            logging.warning(f"Pillow can't encode {fmt}; skipping {fmt} derivatives")
+    return tuple(supported)
+
+
+class ImageProfile:
+    """
+    Everything that decides which files are rendered for a source image, and how.
+
+    :param thumb_size: tuple (width, height) for thumbnails. Height=0 keeps aspect ratio.
+    :param derived_dir: Directory for the responsive derivatives (None disables them).
+    :param widths: Derivative widths; widths at or above the source width are skipped.
+    :param formats: Derivative formats ('webp', 'avif').
+    """
+
+    def __init__(self, thumb_size=THUMB_SIZE, derived_dir=None, widths=DERIVATIVE_WIDTHS, formats=DERIVATIVE_FORMATS):
+        self.thumb_size = tuple(thumb_size)
+        self.derived_dir = Path(derived_dir) if derived_dir else None
+        self.widths = tuple(sorted(widths)) if derived_dir else ()
+        self.formats = tuple(formats) if derived_dir else ()
+
+    def settings(self):
+        """Returns everything that affects the rendered pixels; a change invalidates the outputs."""
+        return {
+            "size": list(self.thumb_size), "format": "WEBP", "quality": THUMB_QUALITY, "resample": "LANCZOS",
+            "reducingGap": REDUCING_GAP,
+            "placeholder": {"size": PLACEHOLDER_SIZE, "quality": PLACEHOLDER_QUALITY},
+            "derivatives": {
+                "widths": list(self.widths),
+                "formats": list(self.formats),
+                "quality": {fmt: DERIVATIVE_QUALITY[fmt] for fmt in self.formats},
+            },
+        }
+
+    def derivative_path(self, filename, width, fmt):
+        return self.derived_dir / f"{Path(filename).stem}-{width}.{fmt}"
+
+    @classmethod
+    def from_env(cls, derived_dir, thumb_size=THUMB_SIZE):
+        """
+        Builds the profile from IMAGE_DERIVATIVE_WIDTHS (e.g. '280,560,1200,2048') and
+        IMAGE_DERIVATIVE_FORMATS (e.g. 'webp,avif'; AVIF is much slower to encode).
+        """
+        widths = os.getenv("IMAGE_DERIVATIVE_WIDTHS", ",".join(map(str, DERIVATIVE_WIDTHS)))
+        formats = os.getenv("IMAGE_DERIVATIVE_FORMATS", ",".join(DERIVATIVE_FORMATS))
+        return cls(
+            thumb_size, derived_dir,
+            widths=[int(w) for w in widths.split(",") if w.strip()],
+            formats=supported_formats([f.strip().lower() for f in formats.split(",") if f.strip()])
+        )
+
+
+def file_sha256(path):
+    """Returns the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_record(filename, st, sha256, profile, derivatives=None, image_info=None, perceptual_hash=None):
+    """Builds the manifest record for the files rendered from a source with stat `st`."""
+    return {
+        "source": filename,
+        "size": st.st_size,
+        "mtimeNs": st.st_mtime_ns,
+        "sha256": sha256,
+        "settings": profile.settings(),
+        "derivatives": derivatives,
+        "imageInfo": image_info,
+        "dhash": perceptual_hash,
+    }
+
+
+def record_fingerprint(record):
+    """
+    Returns a short hash of a source's contents and the settings its outputs were rendered
+    with, for cache-busting URLs: it changes whenever the original, its thumbnail or
+    its derivatives do.
+    """
+    raw = f"{record['sha256']}:{json.dumps(record.get('settings'), sort_keys=True)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def thumb_dhash(thumb_file):
+    """Returns the perceptual hash of an existing thumbnail (for records made before hashes were stored)."""
+    with Image.open(thumb_file) as thumb:
+        return dhash(thumb)
+
+
+def save_atomic(im, path, **params):
+    """Saves an image under a temp name and renames it into place, so a request never gets a half-written file."""
+    path = Path(path)
+    tmp_file = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        im.save(tmp_file, **params)
+        os.replace(tmp_file, path)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+
+def _oriented_size(im):
+    """Returns (width, height) as displayed, i.e. after EXIF orientation, without decoding pixels."""
+    width, height = im.size
+    if im.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def _decode_scaled(src, needed_width):
+    """
+    Decodes `src` (EXIF-transposed) at no less than `needed_width` wide, as cheaply as possible.
+
+    - JPEG: draft mode lets libjpeg decode straight at 1/2, 1/4 or 1/8 scale, so
+      the full-resolution bitmap never exists.
+    - Everything else: full decode, then `reduce()` (a fast box filter) by an integer
+      factor that keeps at least REDUCING_GAP x the target width for the LANCZOS
+      passes, so the full-resolution copy can be dropped straight away.
+
+    :raises ValueError: If the bitmap to decode exceeds MAX_DECODE_PIXELS.
+    """
+    scale = needed_width / _oriented_size(src)[0]
+    if src.format == "JPEG" and scale < 0.5:
+        src.draft(src.mode, (max(1, int(src.width * scale)), max(1, int(src.height * scale))))
+
+    pixels = src.width * src.height
+    if pixels > MAX_DECODE_PIXELS:
+        raise ValueError(f"Image is too large to decode ({pixels / 1e6:.0f} MP > {MAX_DECODE_PIXELS / 1e6:.0f} MP)")
+
+    ImageOps.exif_transpose(src, in_place=True)  # respect EXIF orientation
+    im = src
+    if im.mode in ("1", "P"):
+        # These modes can't be reduced or resampled smoothly
+        im = im.convert("RGBA" if "transparency" in im.info else "RGB")
+    factor = int(im.width / (needed_width * REDUCING_GAP))
+    if factor >= 2:
+        try:
+            im = im.reduce(factor)
+        except ValueError:  # modes reduce() doesn't support (e.g. I;16): LANCZOS copes on its own
+            pass
+    return im
+
+
+def _render_thumb(im, thumb_file, thumb_size):
+    """Writes the WebP thumbnail and returns the resized image."""
+    if thumb_size[1] == 0:
+        wpercent = thumb_size[0] / float(im.width)
+        hsize = int(float(im.height) * float(wpercent))
+        im = im.resize((thumb_size[0], hsize), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+    else:
+        im = im.copy()
+        im.thumbnail(thumb_size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+    save_atomic(im, thumb_file, format="WEBP", quality=THUMB_QUALITY)
+    return im
+
+
+def _dominant_color(im):
+    """Returns the most common color of an RGBA image as '#rrggbb', ignoring (mostly) transparent pixels."""
+    mask = im.getchannel("A").point(lambda a: 255 if a >= 128 else 0)
+    if mask.getbbox() is None:  # fully transparent: count everything
+        mask = None
+    quantized = im.convert("RGB").quantize(DOMINANT_COLOR_PALETTE, method=Image.Quantize.MEDIANCUT)
+    counts = quantized.histogram(mask)
+    index = max(range(len(counts)), key=counts.__getitem__)
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def image_info(thumb, width, height):
+    """
+    Measures an image for the catalog, from its (already small) thumbnail.
+
+    :param thumb: The rendered thumbnail.
+    :param width: Width of the original, as displayed (after EXIF orientation).
+    :param height: Height of the original, as displayed.
+    :return: {"width", "height", "aspectRatio", "dominantColor", "placeholder"}, where
+        placeholder is a data URI of a PLACEHOLDER_SIZE px WebP meant to be shown blurred.
+    """
+    rgba = thumb.convert("RGBA")
+    small = rgba.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.LANCZOS)
+    if small.getextrema()[3][0] == 255:
+        small = small.convert("RGB")  # no transparency: a smaller file
+    buf = io.BytesIO()
+    small.save(buf, format="WEBP", quality=PLACEHOLDER_QUALITY)
+    return {
+        "width": width,
+        "height": height,
+        "aspectRatio": round(width / height, 4),
+        "dominantColor": _dominant_color(rgba),
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+    }
+
+
+def create_thumbnail(src_file, thumb_file, thumb_size=THUMB_SIZE):
+    """
+    Renders one WebP thumbnail, replacing `thumb_file` atomically.
+
+    :param src_file: Path to the source image.
+    :param thumb_file: Path of the thumbnail to write.
+    :param thumb_size: tuple (width, height). Height=0 keeps aspect ratio.
+    :return: The thumbnail's file name.
+    """
+    with Image.open(src_file) as src:
+        _render_thumb(_decode_scaled(src, thumb_size[0]), thumb_file, thumb_size).close()
+    return Path(thumb_file).name
+
+
+def _render_derivatives(im, filename, profile, widths, source_width):
+    """
+    Renders the responsive derivatives from an already-decoded (possibly reduced) image.
+
+    :param widths: The widths to render, largest last.
+    :param source_width: Width of the original, for the catalog.
+    :return: {"path", "widths", "formats", "sourceWidth"} for the catalog, or None.
+    """
+    if not widths:
+        return None
+
+    if im.mode not in ("RGB", "RGBA"):
+        im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "PA") else "RGB")
+    # Downscale from the largest derivative to the smallest, each step from the previous result
+    current = im
+    for width in reversed(widths):
+        height = max(1, round(im.height * width / im.width))
+        current = current.resize((width, height), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        for fmt in profile.formats:
+            save_atomic(
+                current, profile.derivative_path(filename, width, fmt),
+                format=fmt.upper(), quality=DERIVATIVE_QUALITY[fmt]
+            )
+
+    return {
+        "path": f"{profile.derived_dir.name}/{Path(filename).stem}",
+        "widths": widths,
+        "formats": list(profile.formats),
+        "sourceWidth": source_width,
+    }
+
+
+def render_thumbnail(src_file, thumb_file, filename, profile=None):
+    """
+    Renders one image's thumbnail and derivatives, measures it (see `image_info()`)
+    and returns its manifest record (worker-process entry point).
+
+    The source is decoded once, at the smallest scale the largest output needs
+    (see `_decode_scaled()`). Animated images get no derivatives (a still would
+    lose the animation), and neither do widths at or above the source width;
+    the original is used as is there.
+
+    The source is stat'ed before reading, so if it is replaced mid-render the
+    record won't match next time and the image is checked again.
+    """
+    profile = profile or ImageProfile()
+    st = os.stat(src_file)
+    sha256 = file_sha256(src_file)
+    src = Image.open(src_file)
+    im = None
+    try:
+        source_width, source_height = _oriented_size(src)
+        animated = getattr(src, "is_animated", False)
+        widths = [] if animated else [w for w in profile.widths if w < source_width]
+        im = _decode_scaled(src, max([profile.thumb_size[0], *widths]))
+        if im is not src:
+            # Release the full-size bitmap before encoding anything
+            src.close()
+        thumb = _render_thumb(im, thumb_file, profile.thumb_size)
+        info = image_info(thumb, source_width, source_height)
+        perceptual_hash = dhash(thumb)
+        thumb.close()
+        derivatives = _render_derivatives(im, filename, profile, widths, source_width)
+    finally:
+        src.close()
+        if im is not None:
+            im.close()
+    return source_record(filename, st, sha256, profile, derivatives, info, perceptual_hash)
+
+
+def _outputs_exist(record, thumb_file, profile):
+    if not thumb_file.exists():
+        return False
+    derivatives = record.get("derivatives")
+    if not derivatives:
+        return True
+    return all(
+        profile.derivative_path(record["source"], width, fmt).exists()
+        for width in derivatives["widths"] for fmt in derivatives["formats"]
+    )
+
+
+def iter_images(art_list):
+    """Yields every top-level entry and alternate (each has its own image file)."""
+    for entry in art_list:
+        yield entry
+        yield from entry.get("alternates", [])
+
+
+# Manifest record fields copied onto the catalog entries rendered from that source
+CATALOG_FIELDS = ("derivatives", "imageInfo")
+
+
+def apply_records(art_list, records):
+    """
+    Copies the derivative sets, image info and URL fingerprint from manifest records onto
+    the entries and alternates rendered from those sources, so clients can build `srcset`s,
+    placeholders and cache-busting URLs straight from the catalog.
+
+    :return: IDs of the items in `art_list` that changed (or contain a changed alternate).
+    """
+    by_source = {
+        record["source"]: {
+            **{field: record.get(field) for field in CATALOG_FIELDS},
+            "fingerprint": record_fingerprint(record) if record.get("sha256") else None,
+        }
+        for record in records.values()
+    }
+    changed = []
+    for entry in art_list:
+        for item in [entry, *entry.get("alternates", [])]:
+            fields = by_source.get(item.get("filename"))
+            if fields is None:
+                continue
+            for field, value in fields.items():
+                if value and item.get(field) != value:
+                    item[field] = value
+                elif not value and field in item:
+                    del item[field]
+                else:
+                    continue
+                if entry["id"] not in changed:
+                    changed.append(entry["id"])
+    return changed
+
+
+def asset_fingerprints(art_list):
+    """
+    Maps the static paths of every catalog image, thumbnail and derivative to the
+    fingerprint of the source they were rendered from (see `record_fingerprint()`).
+
+    :return: {path relative to static/ (e.g. 'images/thumbs/foo.webp'): fingerprint}
+    """
+    fingerprints = {}
+    for item in iter_images(art_list):
+        fingerprint, filename = item.get("fingerprint"), item.get("filename")
+        if not fingerprint or not filename:
+            continue
+        fingerprints[f"images/{filename}"] = fingerprint
+        fingerprints[f"images/thumbs/{Path(filename).stem}.webp"] = fingerprint
+        derivatives = item.get("derivatives")
+        if derivatives:
+            for width in derivatives["widths"]:
+                for fmt in derivatives["formats"]:
+                    fingerprints[f"images/{derivatives['path']}-{width}.{fmt}"] = fingerprint
+    return fingerprints
+
+
+def manifest_path(state_dir, thumbs_dir=None):
+    """
+    Returns the manifest path in `state_dir`, first moving a manifest left in the
+    thumbnails directory by older versions there (so nothing is re-verified).
+    """
+    path = Path(state_dir) / MANIFEST_NAME
+    if thumbs_dir is not None:
+        legacy = Path(thumbs_dir) / "manifest.json"
+        if legacy.exists() and not path.exists():
+            os.replace(legacy, path)
+        for stale in (legacy, Path(thumbs_dir) / ".manifest.json.lock", Path(thumbs_dir) / ".warmup.lock"):
+            stale.unlink(missing_ok=True)
+    return path
+
+
+class ThumbnailManifest:
+    """
+    data/thumbs.manifest.json: {thumbnail name: record from `source_record()`}.
+
+    :param path: Path to the manifest file (outside the publicly served thumbnails directory).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._catalog = Catalog(self.path, indent=None)
+
+    def records(self):
+        """Returns a copy of the current records ({} if there is no manifest yet)."""
+        try:
+            return dict(self._catalog.get())
+        except FileNotFoundError:
+            return {}
+
+    def derive(self, name, builder):
+        """Returns `builder(records)`, rebuilt only when the manifest changed (see `Catalog.derive()`)."""
+        try:
+            return self._catalog.derive(name, builder)
+        except FileNotFoundError:
+            return builder({})
+
+    def update(self, changes):
+        """Merges {thumbnail name: record} into the manifest (locked read-modify-write)."""
+        if not changes:
+            return
+        with self._catalog.transaction():
+            records = self.records()
+            records.update(changes)
+            self._catalog.save(records)
+
+
+def pending_thumbnails(images, images_dir, thumbs_dir, force=False, manifest=None, profile=None):
+    """
+    Works out which images need their thumbnail (and derivatives) rendered.
+
+    Without a manifest, only missing thumbnails are rendered. With one, an image
+    is also re-rendered when its source changed (size/mtime differ *and* the
+    SHA-256 differs), the settings changed or one of its outputs is missing.
+    Existing thumbnails with no record yet are adopted if they are newer than
+    their source (only when no derivatives are configured, those need rendering).
+
+    :param images: list of dicts from art.json with 'filename' keys
+    :param force: if True, include images that are up to date
+    :param manifest: Optional `ThumbnailManifest`.
+    :param profile: The `ImageProfile` (defaults to thumbnails only).
+    :return: (jobs, refreshed) where jobs is [(src_file, thumb_file, filename, profile)] and
+        refreshed is {thumbnail name: record} for up-to-date images whose record
+        only needs updating.
+    """
+    profile = profile or ImageProfile()
+    records = manifest.records() if manifest is not None else {}
+    settings = profile.settings()
+    jobs, refreshed = [], {}
+    for img in images:
+        filename = img["filename"]
+        src_file = Path(images_dir) / filename
+        thumb_file = thumb_path(thumbs_dir, filename)
+        try:
+            st = os.stat(src_file)
+        except FileNotFoundError:
+            continue
+
+        if not force and thumb_file.exists():
+            if manifest is None:
+                continue
+            record = records.get(thumb_file.name)
+            if record is None:
+                if not profile.widths and os.stat(thumb_file).st_mtime_ns >= st.st_mtime_ns:
+                    refreshed[thumb_file.name] = source_record(
+                        filename, st, file_sha256(src_file), profile, perceptual_hash=thumb_dhash(thumb_file)
+                    )
+                    continue
+            elif (record.get("source") == filename and record.get("settings") == settings
+                    and _outputs_exist(record, thumb_file, profile)):
+                if record.get("size") == st.st_size and record.get("mtimeNs") == st.st_mtime_ns:
+                    if not record.get("dhash"):
+                        refreshed[thumb_file.name] = {**record, "dhash": thumb_dhash(thumb_file)}
+                    continue
+                # Touched but maybe not changed (copied, restored from backup...): compare contents
+                sha256 = file_sha256(src_file)
+                if sha256 == record.get("sha256"):
+                    refreshed[thumb_file.name] = {
+                        **record, "size": st.st_size, "mtimeNs": st.st_mtime_ns,
+                        "dhash": record.get("dhash") or thumb_dhash(thumb_file)
+                    }
+                    continue
+
+        jobs.append((src_file, thumb_file, filename, profile))
+    return jobs, refreshed
+
+
+class ThumbnailWarmup:
+    """
+    One coordinated pass that renders every missing thumbnail.
+
+    :param images_dir: Directory holding the source images.
+    :param thumbs_dir: Directory the thumbnails are written to.
+    :param state_dir: Directory for the manifest and the warm-up lock (not publicly served).
+    :param workers: Size of the process pool (defaults to the CPU count).
+    :param profile: The `ImageProfile` to render (defaults to thumbnails only).
+    """
+
+    def __init__(self, images_dir, thumbs_dir, state_dir, workers=None, profile=None):
+        self.images_dir = Path(images_dir)
+        self.thumbs_dir = Path(thumbs_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.profile = profile or ImageProfile()
+        self.lock_path = Path(state_dir) / WARMUP_LOCK_NAME
+        self.manifest = ThumbnailManifest(manifest_path(state_dir, self.thumbs_dir))
+        self._status = {"state": "idle"}
+        self._status_lock = threading.Lock()
+
+    def status(self):
+        """Returns a snapshot of the current or last pass (state, counts, timings)."""
+        with self._status_lock:
+            return dict(self._status)
+
+    def _update(self, **fields):
+        with self._status_lock:
+            self._status.update(fields)
+
+    def _try_lock(self):
+        """Returns an fd holding the warm-up lock, or None if another process has it."""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def run(self, images, force=False, progress=None):
+        """
+        Renders the missing or stale thumbnails for `images` and returns the final status.
+
+        Returns right away with state 'skipped' if another process is already warming up.
+
+        :param images: list of dicts from art.json with 'filename' keys
+        :param force: if True, re-render thumbnails that are up to date
+        :param progress: Optional callable(done, total, name_or_None, error_or_None)
+        """
+        started = time.monotonic()
+        lock_fd = self._try_lock()
+        if lock_fd is None:
+            self._update(state="skipped", reason="another process is warming up thumbnails")
+            return self.status()
+
+        try:
+            jobs, refreshed = pending_thumbnails(
+                images, self.images_dir, self.thumbs_dir, force, self.manifest, self.profile
+            )
+            workers = max(1, min(self.workers, len(jobs)))
+            self._update(
+                state="running", total=len(jobs), done=0, created=0, failed=0, refreshed=len(refreshed),
+                workers=workers, scanSeconds=round(time.monotonic() - started, 3)
+            )
+            records = dict(refreshed)
+
+            def finished(name, error, record=None):
+                if record is not None:
+                    records[name] = record
+                with self._status_lock:
+                    self._status["done"] += 1
+                    self._status["failed" if error else "created"] += 1
+                    done = self._status["done"]
+                if error:
+                    logging.error(f"Failed to generate thumbnail {name}: {error}")
+                if progress:
+                    progress(done, len(jobs), name, error)
+
+            if workers == 1:
+                for job in jobs:
+                    thumb_file = job[1]
+                    try:
+                        finished(thumb_file.name, None, render_thumbnail(*job))
+                    except Exception as e:
+                        finished(thumb_file.name, e)
+            elif jobs:
+                # spawn, not fork: this usually runs on a background thread of a threaded server
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    futures = {pool.submit(render_thumbnail, *job): job[1] for job in jobs}
+                    for future in as_completed(futures):
+                        try:
+                            finished(futures[future].name, None, future.result())
+                        except Exception as e:
+                            finished(futures[future].name, e)
+
+            self.manifest.update(records)
+            self._update(state="done", seconds=round(time.monotonic() - started, 3))
+            return self.status()
+        except Exception as e:
+            self._update(state="failed", error=str(e), seconds=round(time.monotonic() - started, 3))
+            raise
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+    def start(self, load_images, on_done=None):
+        """
+        Runs a pass on a daemon thread so the caller can start serving immediately.
+
+        :param load_images: Callable returning the images to render (called on the thread).
+        :param on_done: Optional callable(manifest records) run after a completed pass.
+        :return: The started thread.
+        """
+        def work():
+            try:
+                status = self.run(load_images(), progress=self._log_progress)
+                if status["state"] == "done" and on_done is not None:
+                    on_done(self.manifest.records())
+            except Exception:
+                logging.exception("Thumbnail warm-up failed")
+                return
+            if status["state"] == "done" and status["total"]:
+                print(
+                    f"Generated {status['created']} thumbnails ({status['failed']} failed) "
+                    f"in {status['seconds']}s with {status['workers']} workers"
+                )
+
+        thread = threading.Thread(target=work, name="thumbnail-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _log_progress(done, total, name, error):
+        # Log roughly every 10% so big libraries show progress without flooding the log
+        step = max(1, total // 10)
+        if done % step == 0 or done == total:
+            logging.info(f"Thumbnail warm-up: {done}/{total}")